@@ -0,0 +1,5 @@
+"""
+Benchmarks for the LocalizerX middleware hot path.
+
+Run them with `make benchmark` or `python -m benchmarks --help`.
+"""
@@ -0,0 +1,93 @@
+"""
+Run the LocalizerX benchmarks, optionally saving the results or comparing them against a saved baseline.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import os
+import sys
+
+import django
+from django.test.utils import setup_test_environment
+
+
+def parse_args(argv):
+    """
+    Parse the command line arguments.
+    """
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    parser.add_argument('-o', '--output', help='Save the results to this JSON file.')
+    parser.add_argument('-c', '--compare', help='Compare the results against a baseline JSON file.')
+    parser.add_argument(
+        '-t', '--threshold', type=float, default=0.1,
+        help='Flag benchmarks that got slower than the baseline by more than this ratio (default: %(default)s).',
+    )
+    parser.add_argument('-f', '--filter', help='Only run the benchmarks with names containing this string.')
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=5,
+        help='The number of timed batches per benchmark (default: %(default)s).',
+    )
+    parser.add_argument(
+        '--min-time', type=float, default=0.2,
+        help='The minimum duration of a timed batch in seconds (default: %(default)s).',
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Run the benchmarks and return the exit status, which is non-zero if a regression is detected.
+    """
+    args = parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_settings')
+    django.setup()
+    setup_test_environment()
+
+    # Import after setting up Django, so the benchmarks get registered with the configured settings.
+    from benchmarks import runner, scenarios  # pylint: disable=unused-import
+
+    print('{name:<56} {best:>15} {median:>15}'.format(name='benchmark', best='best/call', median='median/call'))
+    data = runner.run(name_filter=args.filter, repeat=args.repeat, min_time=args.min_time)
+
+    results = data['results']
+    for with_name in results:
+        if with_name.endswith('.with_localizerx'):
+            without_name = with_name.replace('.with_localizerx', '.without_localizerx')
+            if without_name in results:
+                print('Overhead of {name}: {overhead:.2f} us'.format(
+                    name=with_name.replace('.with_localizerx', ''),
+                    overhead=results[with_name]['best_us'] - results[without_name]['best_us'],
+                ))
+
+    if args.output:
+        runner.save(data, args.output)
+        print('Results saved to {path}'.format(path=args.output))
+
+    if args.compare:
+        rows = runner.compare(runner.load(args.compare), data, threshold=args.threshold)
+        print()
+        print('{name:<56} {baseline:>12} {current:>12} {change:>9}'.format(
+            name='compared to ' + args.compare, baseline='baseline', current='current', change='change',
+        ))
+        for name, baseline_us, current_us, change, is_regression in rows:
+            print('{name:<56} {baseline_us:>9.2f} us {current_us:>9.2f} us {change:>+8.1%}{flag}'.format(
+                name=name,
+                baseline_us=baseline_us,
+                current_us=current_us,
+                change=change,
+                flag='  REGRESSION' if is_regression else '',
+            ))
+
+        regressions = [row[0] for row in rows if row[4]]
+        if regressions:
+            print('{count} benchmark(s) regressed by more than {threshold:.0%}'.format(
+                count=len(regressions), threshold=args.threshold,
+            ))
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
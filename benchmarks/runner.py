@@ -0,0 +1,146 @@
+"""
+Timing, reporting and comparison helpers for the LocalizerX benchmarks.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import json
+import platform
+import time
+from collections import OrderedDict
+from timeit import default_timer
+
+import django
+from django.test import override_settings
+
+# The registered benchmarks in the order they're defined: {name: (setup, settings_overrides)}
+BENCHMARKS = OrderedDict()
+
+# Stop calibrating once a batch of calls takes that long, in seconds.
+MIN_BATCH_TIME = 0.2
+
+
+def benchmark(name, **overrides):
+    """
+    Register a benchmark.
+
+    The decorated function is called with the `overrides` settings in effect, and returns the zero-arguments
+    callable to be timed. The settings stay in effect while the callable is being timed.
+    """
+    def decorator(setup):
+        """
+        Register the setup function.
+        """
+        if name in BENCHMARKS:
+            raise ValueError('Duplicate benchmark name: {name}'.format(name=name))
+        BENCHMARKS[name] = (setup, overrides)
+        return setup
+    return decorator
+
+
+def calibrate(func, min_time=MIN_BATCH_TIME):
+    """
+    Find a number of calls to `func` that takes at least `min_time` seconds.
+    """
+    number = 1
+    while True:
+        started_at = default_timer()
+        for _ in range(number):
+            func()
+        if default_timer() - started_at >= min_time:
+            return number
+        number *= 10
+
+
+def measure(func, repeat=5, min_time=MIN_BATCH_TIME):
+    """
+    Time `func` in `repeat` batches of calls.
+
+    Return: A dict of the per-call timings in microseconds.
+    """
+    number = calibrate(func, min_time)
+
+    per_call = []
+    for _ in range(repeat):
+        started_at = default_timer()
+        for _ in range(number):
+            func()
+        per_call.append((default_timer() - started_at) / number * 1e6)
+
+    per_call.sort()
+    return OrderedDict([
+        ('best_us', per_call[0]),
+        ('median_us', per_call[len(per_call) // 2]),
+        ('number', number),
+        ('repeat', repeat),
+    ])
+
+
+def run(name_filter=None, repeat=5, min_time=MIN_BATCH_TIME, report=print):
+    """
+    Run the registered benchmarks.
+
+    Args:
+        name_filter: Only run the benchmarks with names that contain this string.
+        repeat: The number of timed batches per benchmark.
+        min_time: The minimum duration of a single batch, in seconds.
+        report: A function to report the progress with.
+    Return: A dict of the results, ready to be saved as JSON.
+    """
+    results = OrderedDict()
+    for name, (setup, overrides) in BENCHMARKS.items():
+        if name_filter and name_filter not in name:
+            continue
+
+        with override_settings(**overrides):
+            results[name] = measure(setup(), repeat=repeat, min_time=min_time)
+
+        report('{name:<56} {best_us:>12.2f} us {median_us:>12.2f} us'.format(name=name, **results[name]))
+
+    return OrderedDict([
+        ('meta', OrderedDict([
+            ('created', time.strftime('%Y-%m-%dT%H:%M:%S')),
+            ('python', platform.python_version()),
+            ('django', django.get_version()),
+            ('machine', platform.machine()),
+        ])),
+        ('results', results),
+    ])
+
+
+def save(data, path):
+    """
+    Save the results as a JSON file.
+    """
+    with open(path, 'w') as results_file:
+        json.dump(data, results_file, indent=2)
+
+
+def load(path):
+    """
+    Load the results from a JSON file.
+    """
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Compare two sets of results.
+
+    Benchmarks are compared by their best timing, which is the least sensitive to noise.
+
+    Args:
+        baseline: The results to compare against.
+        current: The new results.
+        threshold: The allowed slowdown ratio before flagging a regression e.g. 0.1 for 10%.
+    Return: A list of `(name, baseline_us, current_us, change, is_regression)` tuples.
+    """
+    rows = []
+    for name, result in current['results'].items():
+        baseline_result = baseline['results'].get(name)
+        if not baseline_result:
+            continue
+
+        change = result['best_us'] / baseline_result['best_us'] - 1
+        rows.append((name, baseline_result['best_us'], result['best_us'], change, change > threshold))
+    return rows
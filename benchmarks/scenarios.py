@@ -0,0 +1,674 @@
+"""
+Benchmarks of the LocalizerX hot path.
+
+The names follow the `<area>.<subject>.<scenario>` pattern, so related benchmarks can be selected with `--filter`.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import shutil
+import tempfile
+from itertools import cycle
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.sites.requests import RequestSite
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import Client, RequestFactory
+from django.utils.translation import trans_real
+
+from benchmarks.runner import benchmark
+from localizerx.decisions import decide
+from localizerx.helpers import (add_locale_middleware, is_api_request, is_feature_enabled, negotiate_language,
+                                parse_accept_language)
+from localizerx.middleware import CachedDarkLangMiddleware, DefaultLocaleMiddleware
+from localizerx.profiling import SamplingProfiler
+from localizerx.shared_catalogs import load_shared_translation
+from localizerx.sites import get_host_snapshot
+from localizerx.stats import LanguageStats
+from localizerx.wsgi import LocalizerXWSGIMiddleware
+from openedx.core.djangoapps.dark_lang.middleware import DarkLangMiddleware
+
+LOCALIZERX_MIDDLEWARE = 'localizerx.middleware.DefaultLocaleMiddleware'
+
+BROWSER_ACCEPT_LANGUAGE = 'en-US,en;q=0.9,ar;q=0.8'
+
+# A header close to what a browser with many configured languages sends.
+LONG_ACCEPT_LANGUAGE = ','.join(
+    ['en-US', 'en;q=0.9'] + [
+        '{language};q=0.{quality}'.format(language=language, quality=8 - index % 8)
+        for index, language in enumerate([
+            'ar', 'ar-SA', 'fr', 'fr-FR', 'de', 'de-DE', 'es', 'es-419', 'pt-BR', 'pt', 'it', 'nl', 'ru', 'tr', 'ja',
+            'ko', 'zh-CN', 'zh-TW', 'he', 'fa', 'ur', 'hi', 'id', 'ms', 'pl', 'cs', 'sv', 'da', 'fi', 'no',
+        ])
+    ]
+)
+
+# Pathological headers, thousands of short entries e.g. sent by a misbehaving client or an attacker.
+ADVERSARIAL_ACCEPT_LANGUAGE_8K = ','.join(['x-y;q=0.5'] * 800)
+ADVERSARIAL_ACCEPT_LANGUAGE_64K = ','.join(['x-y;q=0.5'] * 6400)
+
+# Dozens of prefixes, similar to what a deployment with many plugins accumulates.
+MANY_API_PREFIXES = [
+    '/api/',
+    '/user_api/',
+    '/notifier_api/',
+    '/oauth2/',
+    '/reporting/api/',
+    '/courses/*/xblock/',
+    '^/courses/[^/]+/(instructor|discussion)/api/',
+] + ['/plugin_{index}/api/'.format(index=index) for index in range(40)]
+
+# Hundreds of path rules, e.g. a site with a language per section and a few embedded pages left untouched.
+MANY_PATH_LANGUAGES = [
+    ['/embed/', 'passthrough'],
+    ['^/courses/[^/]+/about', 'ar'],
+] + [['/section-{index}/'.format(index=index), 'fr'] for index in range(300)]
+
+NUMBER_OF_SITES = 500
+
+ENABLED_SETTINGS = {
+    'ALLOWED_HOSTS': ['*'],
+    'LANGUAGE_CODE': 'eo',
+    'FEATURES': {'ENABLE_LOCALIZERX': True},
+}
+
+SUPPORTED_LANGUAGES = ('en', 'ar', 'fr', 'es-419', 'pt-br')
+
+NEGOTIATION_SETTINGS = dict(ENABLED_SETTINGS, ENV_TOKENS={'LOCALIZERX_SUPPORTED_LANGUAGES': SUPPORTED_LANGUAGES})
+
+MANY_PREFIXES_SETTINGS = dict(ENABLED_SETTINGS, ENV_TOKENS={'LOCALIZERX_API_URL_PREFIXES': MANY_API_PREFIXES})
+
+MANY_PATH_LANGUAGES_SETTINGS = dict(ENABLED_SETTINGS, ENV_TOKENS={'LOCALIZERX_PATH_LANGUAGES': MANY_PATH_LANGUAGES})
+
+WITH_LOCALIZERX = add_locale_middleware(settings.MIDDLEWARE_CLASSES)
+
+WITH_DIRECT_ACTIVATION = add_locale_middleware(settings.MIDDLEWARE_CLASSES, direct_activation=True)
+
+DIRECT_ACTIVATION_SETTINGS = dict(
+    ENABLED_SETTINGS,
+    ENV_TOKENS={'LOCALIZERX_DIRECT_ACTIVATION': True},
+    MIDDLEWARE_CLASSES=WITH_DIRECT_ACTIVATION,
+)
+
+DARK_LANG_SETTINGS = dict(
+    ENABLED_SETTINGS,
+    MOCK_DARK_LANG_CONFIG={'enabled': True, 'released_languages': 'en, ar, fr, es-419, pt-br'},
+)
+
+WITH_PAGE_CACHE = (
+    ('localizerx.cache.UpdateCacheMiddleware',)
+    + WITH_LOCALIZERX
+    + ('localizerx.cache.FetchFromCacheMiddleware',)
+)
+
+WITHOUT_LOCALIZERX = tuple(
+    class_name for class_name in settings.MIDDLEWARE_CLASSES
+    if class_name != LOCALIZERX_MIDDLEWARE
+)
+
+
+def make_request(path='/dashboard/', host='testserver', accept_language=BROWSER_ACCEPT_LANGUAGE):
+    """
+    Build a request as seen by the `DefaultLocaleMiddleware`, i.e. after the `CurrentSiteMiddleware`.
+    """
+    request = RequestFactory().get(path, HTTP_HOST=host, HTTP_ACCEPT_LANGUAGE=accept_language)
+    request.site = RequestSite(request)
+    return request
+
+
+def process_request_call(requests, accept_language=BROWSER_ACCEPT_LANGUAGE):
+    """
+    Get a callable that runs the middleware on the given requests in turn.
+
+    The browser header is restored before each call, since the middleware overrides it.
+    """
+    middleware = DefaultLocaleMiddleware()
+    requests = cycle(requests)
+
+    def call():
+        """
+        Run the middleware on the next request.
+        """
+        request = next(requests)
+        request.META['HTTP_ACCEPT_LANGUAGE'] = accept_language
+        middleware.process_request(request)
+
+    return call
+
+
+def make_environ(path='/dashboard/', accept_language=BROWSER_ACCEPT_LANGUAGE):
+    """
+    Build a WSGI environ for the `testserver` host.
+    """
+    environ = {'PATH_INFO': path, 'HTTP_HOST': 'testserver', 'HTTP_ACCEPT_LANGUAGE': accept_language}
+    setup_testing_defaults(environ)
+    return environ
+
+
+def wsgi_call(application, path, accept_language=BROWSER_ACCEPT_LANGUAGE):
+    """
+    Get a callable that requests the path through a WSGI application, on a copy of the same environ.
+    """
+    environ = make_environ(path, accept_language)
+
+    def start_response(status, headers, exc_info=None):  # pylint: disable=unused-argument
+        """
+        Ignore the response status and headers.
+        """
+
+    def call():
+        """
+        Request the path and consume the response.
+        """
+        response = application(dict(environ), start_response)
+        b''.join(response)
+        close = getattr(response, 'close', None)
+        if close is not None:
+            close()
+
+    call()  # Warm the site snapshot.
+    return call
+
+
+def environ_application(environ, start_response):  # pylint: disable=unused-argument
+    """
+    Minimal WSGI application, to time the `LocalizerXWSGIMiddleware` on its own.
+    """
+    return []
+
+
+def client_call(path, accept_language=BROWSER_ACCEPT_LANGUAGE):
+    """
+    Get a callable that requests the path through the full Django stack of the test site.
+    """
+    client = Client()
+    return lambda: client.get(path, HTTP_ACCEPT_LANGUAGE=accept_language)
+
+
+def client_cycle_call(path, accept_languages):
+    """
+    Get a callable that requests the path with each of the `Accept-Language` headers in turn.
+    """
+    client = Client()
+    accept_languages = cycle(accept_languages)
+    return lambda: client.get(path, HTTP_ACCEPT_LANGUAGE=next(accept_languages))
+
+
+@benchmark('helpers.is_api_request.page.default_prefixes', **ENABLED_SETTINGS)
+def is_api_request_page():
+    """
+    Time a regular page with the default API prefixes.
+    """
+    request = make_request('/courses/course-v1:edX+DemoX+Demo_Course/courseware/')
+    return lambda: is_api_request(request)
+
+
+@benchmark('helpers.is_api_request.api.default_prefixes', **ENABLED_SETTINGS)
+def is_api_request_api():
+    """
+    Time an API endpoint with the default API prefixes.
+    """
+    request = make_request('/notifier_api/v1/users/')
+    return lambda: is_api_request(request)
+
+
+@benchmark('helpers.is_api_request.page.many_prefixes', **MANY_PREFIXES_SETTINGS)
+def is_api_request_page_many_prefixes():
+    """
+    Time a regular page checked against dozens of prefixes.
+    """
+    request = make_request('/courses/course-v1:edX+DemoX+Demo_Course/courseware/')
+    return lambda: is_api_request(request)
+
+
+@benchmark('helpers.is_api_request.api.many_prefixes', **MANY_PREFIXES_SETTINGS)
+def is_api_request_api_many_prefixes():
+    """
+    Time an API endpoint matching one of the last prefixes.
+    """
+    request = make_request('/plugin_39/api/v1/reports/')
+    return lambda: is_api_request(request)
+
+
+@benchmark('helpers.is_feature_enabled', **ENABLED_SETTINGS)
+def is_feature_enabled_call():
+    """
+    Time the feature flag lookup.
+    """
+    return is_feature_enabled
+
+
+@benchmark('helpers.parse_accept_language.long')
+def parse_accept_language_long():
+    """
+    Time parsing the header of a browser with many configured languages.
+    """
+    return lambda: parse_accept_language(LONG_ACCEPT_LANGUAGE)
+
+
+@benchmark('helpers.parse_accept_language.adversarial_8k')
+def parse_accept_language_adversarial_8k():
+    """
+    Time parsing a pathological 8KB header, which should cost the same as a long browser header.
+    """
+    return lambda: parse_accept_language(ADVERSARIAL_ACCEPT_LANGUAGE_8K)
+
+
+@benchmark('helpers.parse_accept_language.adversarial_64k')
+def parse_accept_language_adversarial_64k():
+    """
+    Time parsing a pathological 64KB header, which should cost the same as the 8KB one.
+    """
+    return lambda: parse_accept_language(ADVERSARIAL_ACCEPT_LANGUAGE_64K)
+
+
+@benchmark('helpers.negotiate_language.cached')
+def negotiate_language_cached():
+    """
+    Time negotiating a header that has been seen before.
+    """
+    return lambda: negotiate_language(LONG_ACCEPT_LANGUAGE, SUPPORTED_LANGUAGES, 'en')
+
+
+@benchmark('decisions.decide.page', **ENABLED_SETTINGS)
+def decide_page():
+    """
+    Time the decision of a regular page, without a django request.
+    """
+    decide('testserver', '/dashboard/')  # Warm the site snapshot.
+    return lambda: decide('testserver', '/dashboard/', BROWSER_ACCEPT_LANGUAGE)
+
+
+@benchmark('decisions.decide.page.negotiation', **NEGOTIATION_SETTINGS)
+def decide_negotiation():
+    """
+    Time the decision of a page in a site that negotiates the language with the browser.
+    """
+    decide('testserver', '/dashboard/')
+    return lambda: decide('testserver', '/dashboard/', LONG_ACCEPT_LANGUAGE)
+
+
+@benchmark('decisions.decide.static', **ENABLED_SETTINGS)
+def decide_static():
+    """
+    Time the decision of a static file, which doesn't look the site up.
+    """
+    return lambda: decide('testserver', '/static/css/lms-main-v1.css', BROWSER_ACCEPT_LANGUAGE)
+
+
+@benchmark('middleware.process_request.page', **ENABLED_SETTINGS)
+def process_request_page():
+    """
+    Time a regular page that gets patched.
+    """
+    return process_request_call([make_request('/dashboard/')])
+
+
+@benchmark('middleware.process_request.api', **ENABLED_SETTINGS)
+def process_request_api():
+    """
+    Time an API endpoint that is left untouched.
+    """
+    return process_request_call([make_request('/api/courses/v1/courses/')])
+
+
+@benchmark('middleware.process_request.static', **ENABLED_SETTINGS)
+def process_request_static():
+    """
+    Time the middleware on a static file, which is bypassed before looking the site up.
+    """
+    return process_request_call([make_request('/static/css/lms-main-v1.css')])
+
+
+@benchmark('middleware.process_request.disabled', LANGUAGE_CODE='eo', ALLOWED_HOSTS=['*'])
+def process_request_disabled():
+    """
+    Time a regular page on a site with LocalizerX disabled.
+    """
+    return process_request_call([make_request('/dashboard/')])
+
+
+@benchmark('middleware.process_request.page.many_prefixes', **MANY_PREFIXES_SETTINGS)
+def process_request_many_prefixes():
+    """
+    Time a regular page checked against dozens of prefixes.
+    """
+    return process_request_call([make_request('/dashboard/')])
+
+
+@benchmark('middleware.process_request.page.many_path_languages', **MANY_PATH_LANGUAGES_SETTINGS)
+def process_request_many_path_languages():
+    """
+    Time a regular page checked against hundreds of path rules, without a matching rule.
+    """
+    return process_request_call([make_request('/dashboard/')])
+
+
+@benchmark('middleware.process_request.path_language.many_path_languages', **MANY_PATH_LANGUAGES_SETTINGS)
+def process_request_path_language():
+    """
+    Time a page matching one of the last of hundreds of path rules.
+    """
+    return process_request_call([make_request('/section-299/unit/')])
+
+
+@benchmark('middleware.process_request.page.long_accept_language', **ENABLED_SETTINGS)
+def process_request_long_accept_language():
+    """
+    Time a regular page requested by a browser with many configured languages.
+    """
+    return process_request_call([make_request('/dashboard/')], accept_language=LONG_ACCEPT_LANGUAGE)
+
+
+@benchmark('middleware.process_request.page.negotiation', **NEGOTIATION_SETTINGS)
+def process_request_negotiation():
+    """
+    Time a regular page on a site that negotiates the language with the browser.
+    """
+    return process_request_call([make_request('/dashboard/')], accept_language=LONG_ACCEPT_LANGUAGE)
+
+
+@benchmark('middleware.process_request.page.negotiation.adversarial_64k', **NEGOTIATION_SETTINGS)
+def process_request_negotiation_adversarial():
+    """
+    Time a regular page on a site that negotiates the language, requested with a pathological 64KB header.
+    """
+    return process_request_call([make_request('/dashboard/')], accept_language=ADVERSARIAL_ACCEPT_LANGUAGE_64K)
+
+
+@benchmark(
+    'middleware.process_request.page.generation_check',
+    ENV_TOKENS={'LOCALIZERX_GENERATION_CACHE': 'default'},
+    **ENABLED_SETTINGS
+)
+def process_request_generation_check():
+    """
+    Time a regular page with the cross-process invalidation, which checks the shared generation once a second.
+    """
+    return process_request_call([make_request('/dashboard/')])
+
+
+@benchmark('middleware.process_request.page.many_sites', **ENABLED_SETTINGS)
+def process_request_many_sites():
+    """
+    Time requests spread over many sites, all of them fitting in the site cache.
+    """
+    return process_request_call([
+        make_request('/dashboard/', host='site{index}.example.com'.format(index=index))
+        for index in range(NUMBER_OF_SITES)
+    ])
+
+
+@benchmark(
+    'middleware.process_request.page.many_sites_cache_misses',
+    ENV_TOKENS={'LOCALIZERX_SITE_CACHE_SIZE': NUMBER_OF_SITES // 10},
+    **ENABLED_SETTINGS
+)
+def process_request_many_sites_cache_misses():
+    """
+    Time requests spread over more sites than the site cache can hold.
+    """
+    return process_request_call([
+        make_request('/dashboard/', host='site{index}.example.com'.format(index=index))
+        for index in range(NUMBER_OF_SITES)
+    ])
+
+
+@benchmark(
+    'middleware.process_request.page.many_sites_cache_misses.by_host',
+    ENV_TOKENS={'LOCALIZERX_SITE_CACHE_SIZE': NUMBER_OF_SITES // 10, 'LOCALIZERX_SITES_BY_HOST': True},
+    MOCK_SITE_CONFIGURATIONS=[
+        {'SITE_NAME': 'site{index}.example.com'.format(index=index), 'LANGUAGE_CODE': 'ar'}
+        for index in range(NUMBER_OF_SITES)
+    ],
+    **ENABLED_SETTINGS
+)
+def process_request_cache_misses_by_host():
+    """
+    Time the site cache misses with the sites resolved by their host, out of the map of all the sites.
+    """
+    return process_request_call([
+        make_request('/dashboard/', host='site{index}.example.com'.format(index=index))
+        for index in range(NUMBER_OF_SITES)
+    ])
+
+
+def dark_lang_call(middleware, accept_language=BROWSER_ACCEPT_LANGUAGE):
+    """
+    Get a callable that runs the dark lang middleware on a request, restoring the browser header before each call.
+    """
+    request = make_request(accept_language=accept_language)
+
+    def call():
+        """
+        Run the middleware on the request.
+        """
+        request.META['HTTP_ACCEPT_LANGUAGE'] = accept_language
+        middleware.process_request(request)
+
+    return call
+
+
+@benchmark('stats.language_stats.record')
+def language_stats_record():
+    """
+    Time tallying a request in the language stats.
+    """
+    stats = LanguageStats(None, interval=3600, capacity=256)
+    return lambda: stats.record('testserver', BROWSER_ACCEPT_LANGUAGE, 'ar')
+
+
+@benchmark('stats.language_stats.record.many_sites')
+def language_stats_record_many_sites():
+    """
+    Time tallying requests spread over many more sites than the heavy hitters and the memoized indexes can hold.
+    """
+    stats = LanguageStats(None, interval=3600, capacity=256)
+    sites = cycle(['site{index}.example.com'.format(index=index) for index in range(10000)])
+    return lambda: stats.record(next(sites), BROWSER_ACCEPT_LANGUAGE, 'ar')
+
+
+def profiling_markers_call(sample_rate):
+    """
+    Get a callable that passes a request through both profiling markers, in both directions.
+    """
+    # The threshold is never reached, so nothing is written.
+    profiler = SamplingProfiler(None, sample_rate=sample_rate, threshold=3600, max_files=0, max_bytes=0)
+    request = make_request('/dashboard/')
+
+    def call():
+        """
+        Mark the request and the response, as a new request each time.
+        """
+        request.__dict__.pop('_localizerx_profile', None)
+        profiler.mark_request(request)
+        profiler.mark_request(request)
+        profiler.mark_response(request)
+        profiler.mark_response(request)
+
+    return call
+
+
+@benchmark('profiling.markers.unsampled')
+def profiling_markers_unsampled():
+    """
+    Time the profiling markers on the requests that aren't sampled, the cost most requests pay.
+    """
+    return profiling_markers_call(sample_rate=0)
+
+
+@benchmark('profiling.markers.sampled')
+def profiling_markers_sampled():
+    """
+    Time starting and stopping the profiler on a sampled request.
+    """
+    return profiling_markers_call(sample_rate=1)
+
+
+@benchmark('wsgi.middleware.page', **ENABLED_SETTINGS)
+def wsgi_middleware_page():
+    """
+    Time the `LocalizerXWSGIMiddleware` on its own, compare with `middleware.process_request.page`.
+    """
+    get_host_snapshot('testserver')
+    return wsgi_call(LocalizerXWSGIMiddleware(environ_application), '/dashboard/')
+
+
+@benchmark('wsgi.middleware.static', **ENABLED_SETTINGS)
+def wsgi_middleware_static():
+    """
+    Time the `LocalizerXWSGIMiddleware` on a static file, compare with `middleware.process_request.static`.
+    """
+    return wsgi_call(LocalizerXWSGIMiddleware(environ_application), '/static/css/lms-main-v1.css')
+
+
+@benchmark('stack.wsgi.page.django_middleware', MIDDLEWARE_CLASSES=WITH_LOCALIZERX, **ENABLED_SETTINGS)
+def stack_wsgi_page_django_middleware():
+    """
+    Time a translated page through the WSGI handler, decided by the `DefaultLocaleMiddleware`.
+    """
+    return wsgi_call(WSGIHandler(), '/')
+
+
+@benchmark('stack.wsgi.page.wsgi_middleware', MIDDLEWARE_CLASSES=WITH_LOCALIZERX, **ENABLED_SETTINGS)
+def stack_wsgi_page_wsgi_middleware():
+    """
+    Time a translated page through the WSGI handler, decided by the `LocalizerXWSGIMiddleware`.
+    """
+    return wsgi_call(LocalizerXWSGIMiddleware(WSGIHandler()), '/')
+
+
+@benchmark('middleware.dark_lang.edx', **DARK_LANG_SETTINGS)
+def dark_lang_edx():
+    """
+    Time Open edX's `DarkLangMiddleware`, emulated without the database queries of `DarkLangConfig.current()`.
+    """
+    return dark_lang_call(DarkLangMiddleware())
+
+
+@benchmark('middleware.dark_lang.cached', **DARK_LANG_SETTINGS)
+def dark_lang_cached():
+    """
+    Time the `CachedDarkLangMiddleware`.
+    """
+    return dark_lang_call(CachedDarkLangMiddleware())
+
+
+@benchmark('middleware.dark_lang.cached.long_accept_language', **DARK_LANG_SETTINGS)
+def dark_lang_cached_long_accept_language():
+    """
+    Time the `CachedDarkLangMiddleware` with a browser with many configured languages.
+    """
+    return dark_lang_call(CachedDarkLangMiddleware(), accept_language=LONG_ACCEPT_LANGUAGE)
+
+
+@benchmark('stack.page.with_localizerx', MIDDLEWARE_CLASSES=WITH_LOCALIZERX, **ENABLED_SETTINGS)
+def stack_page_with_localizerx():
+    """
+    Time a translated page through the full stack, with LocalizerX.
+    """
+    return client_call('/')
+
+
+@benchmark('stack.page.direct_activation', **DIRECT_ACTIVATION_SETTINGS)
+def stack_page_direct_activation():
+    """
+    Time a translated page through the full stack, with LocalizerX activating the language directly.
+    """
+    return client_call('/')
+
+
+@benchmark('stack.page.without_localizerx', MIDDLEWARE_CLASSES=WITHOUT_LOCALIZERX, **ENABLED_SETTINGS)
+def stack_page_without_localizerx():
+    """
+    Time a translated page through the full stack, without LocalizerX.
+    """
+    return client_call('/')
+
+
+@benchmark('stack.api.with_localizerx', MIDDLEWARE_CLASSES=WITH_LOCALIZERX, **ENABLED_SETTINGS)
+def stack_api_with_localizerx():
+    """
+    Time an API endpoint through the full stack, with LocalizerX.
+    """
+    return client_call('/api/')
+
+
+@benchmark('stack.api.without_localizerx', MIDDLEWARE_CLASSES=WITHOUT_LOCALIZERX, **ENABLED_SETTINGS)
+def stack_api_without_localizerx():
+    """
+    Time an API endpoint through the full stack, without LocalizerX.
+    """
+    return client_call('/api/')
+
+
+@benchmark(
+    'stack.page.long_accept_language.with_localizerx',
+    MIDDLEWARE_CLASSES=WITH_LOCALIZERX,
+    **ENABLED_SETTINGS
+)
+def stack_long_header_with_localizerx():
+    """
+    Time a translated page requested by a browser with many configured languages, with LocalizerX.
+    """
+    return client_call('/', accept_language=LONG_ACCEPT_LANGUAGE)
+
+
+@benchmark('stack.page.long_accept_language.direct_activation', **DIRECT_ACTIVATION_SETTINGS)
+def stack_long_header_direct_activation():
+    """
+    Time a translated page requested by a browser with many configured languages, with direct activation.
+    """
+    return client_call('/', accept_language=LONG_ACCEPT_LANGUAGE)
+
+
+@benchmark(
+    'stack.page.long_accept_language.without_localizerx',
+    MIDDLEWARE_CLASSES=WITHOUT_LOCALIZERX,
+    **ENABLED_SETTINGS
+)
+def stack_long_header_without_localizerx():
+    """
+    Time a translated page requested by a browser with many configured languages, without LocalizerX.
+    """
+    return client_call('/', accept_language=LONG_ACCEPT_LANGUAGE)
+
+
+@benchmark('stack.page.cached.many_browsers', MIDDLEWARE_CLASSES=WITH_PAGE_CACHE, **ENABLED_SETTINGS)
+def stack_cached_page_many_browsers():
+    """
+    Time a cached page requested by browsers with different languages, with the language-aware cache keys.
+    """
+    return client_cycle_call('/', [BROWSER_ACCEPT_LANGUAGE, LONG_ACCEPT_LANGUAGE, 'ar', 'fr-FR,fr;q=0.9', 'de'])
+
+
+# Messages of Django's own catalogs, all translated in Arabic.
+CATALOG_MESSAGES = ['This field is required.', 'Enter a valid URL.', 'Enter a valid email address.', 'Yes', 'No']
+
+
+def gettext_call(translation):
+    """
+    Get a callable that translates the catalog messages in turn.
+    """
+    messages = cycle(CATALOG_MESSAGES)
+    gettext = getattr(translation, 'ugettext', translation.gettext)
+    return lambda: gettext(next(messages))
+
+
+@benchmark('catalogs.gettext.django')
+def gettext_django():
+    """
+    Time a message lookup in Django's in-process catalog.
+    """
+    return gettext_call(trans_real.DjangoTranslation('ar'))
+
+
+@benchmark('catalogs.gettext.shared')
+def gettext_shared():
+    """
+    Time a message lookup in the memory-mapped shared catalog.
+    """
+    directory = tempfile.mkdtemp()
+    translation = load_shared_translation('ar', directory)
+    shutil.rmtree(directory)  # The mapping stays valid.
+    return gettext_call(translation)
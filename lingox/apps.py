@@ -5,10 +5,23 @@ localizerx Django application initialization.
 
 from __future__ import absolute_import, unicode_literals
 
+import logging
+
 from django.apps import AppConfig
 from django.conf import settings
+from django.db.models.signals import post_delete, post_save
 
+from localizerx.catalogs import is_catalog_warmup_enabled, start_catalog_warmup
+from localizerx.config import reload_settings_snapshot
+from localizerx.dark_lang import invalidate_dark_lang_snapshot
 from localizerx.helpers import add_locale_middleware
+from localizerx.instrumentation import is_instrumentation_enabled
+from localizerx.preferences import invalidate_user_preference, patch_language_preference_middleware
+from localizerx.profiling import get_profiling_scope
+from localizerx.site_warmup import warm_up_site_snapshots
+from localizerx.sites import invalidate_site_snapshot
+
+LOGGER = logging.getLogger(__name__)
 
 
 class LocalizerXConfig(AppConfig):
@@ -20,6 +33,87 @@ class LocalizerXConfig(AppConfig):
 
     def ready(self):
         """
-        Monkeypatch MIDDLEWARE_CLASSES to the LocalizerX middleware.
+        Monkeypatch MIDDLEWARE_CLASSES (or MIDDLEWARE if it's used) to the LocalizerX middleware.
+
+        Also load the translation catalogs if `LOCALIZERX_WARMUP_CATALOGS` is enabled, the site snapshots dumped by
+        the `localizerx_warmup_sites` command if they're configured, and cache the language preferences if
+        `LOCALIZERX_PREFERENCE_CACHE` is enabled.
+        """
+        # Freeze the settings the middlewares read on every request.
+        settings_snapshot = reload_settings_snapshot()
+        instrument = is_instrumentation_enabled()
+        direct_activation = settings_snapshot.direct_activation
+        cached_dark_lang = settings_snapshot.cached_dark_lang
+        sites_by_host = settings_snapshot.sites_by_host
+        profile_scope = get_profiling_scope()
+        if getattr(settings, 'MIDDLEWARE', None) is not None:
+            settings.MIDDLEWARE = add_locale_middleware(
+                settings.MIDDLEWARE,
+                setting_name='MIDDLEWARE',
+                instrument=instrument,
+                direct_activation=direct_activation,
+                cached_dark_lang=cached_dark_lang,
+                sites_by_host=sites_by_host,
+                profile_scope=profile_scope,
+            )
+        else:
+            settings.MIDDLEWARE_CLASSES = add_locale_middleware(
+                settings.MIDDLEWARE_CLASSES,
+                instrument=instrument,
+                direct_activation=direct_activation,
+                cached_dark_lang=cached_dark_lang,
+                sites_by_host=sites_by_host,
+                profile_scope=profile_scope,
+            )
+        self.connect_signals()
+        if cached_dark_lang:
+            self.connect_dark_lang_signals()
+
+        if is_catalog_warmup_enabled():
+            start_catalog_warmup()
+
+        warm_up_site_snapshots()
+
+        if settings_snapshot.preference_cache:
+            self.cache_preferences()
+
+    def connect_signals(self):
+        """
+        Invalidate the cached site snapshots when a site configuration is saved.
         """
-        settings.MIDDLEWARE_CLASSES = add_locale_middleware(settings.MIDDLEWARE_CLASSES)
+        try:
+            from openedx.core.djangoapps.site_configuration.models import SiteConfiguration
+        except ImportError:
+            LOGGER.warning('Could not import SiteConfiguration, site snapshots will be invalidated after their TTL.')
+            return
+
+        post_save.connect(invalidate_site_snapshot, sender=SiteConfiguration)
+
+    def connect_dark_lang_signals(self):  # pylint: disable=no-self-use
+        """
+        Invalidate the cached dark language configuration when a `DarkLangConfig` is saved.
+        """
+        try:
+            from openedx.core.djangoapps.dark_lang.models import DarkLangConfig
+        except ImportError:
+            LOGGER.warning('Could not import DarkLangConfig, the released languages will be refreshed after their TTL.')
+            return
+
+        post_save.connect(invalidate_dark_lang_snapshot, sender=DarkLangConfig)
+
+    def cache_preferences(self):  # pylint: disable=no-self-use
+        """
+        Serve the language preferences from the cache, and invalidate it when a preference is saved.
+        """
+        try:
+            from openedx.core.djangoapps.user_api.models import UserPreference
+        except ImportError:
+            LOGGER.warning('Could not import UserPreference, the language preferences will not be cached.')
+            return
+
+        if not patch_language_preference_middleware():
+            LOGGER.warning('Could not patch LanguagePreferenceMiddleware, the language preferences will not be cached.')
+            return
+
+        post_save.connect(invalidate_user_preference, sender=UserPreference)
+        post_delete.connect(invalidate_user_preference, sender=UserPreference)
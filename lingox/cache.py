@@ -0,0 +1,239 @@
+"""
+Language-aware cache keys for Django's cache middlewares and the `cache_page` decorator.
+
+Django keys the cached pages on the absolute URL and the request headers listed in the response's `Vary` header.
+The replacements in this module key the pages on the site, the language of the request and the absolute URL instead,
+so a page is cached once per language regardless of the browser's `Accept-Language` header.
+
+The language is the one already decided for the request, by the `LocaleMiddleware` or by the
+`DefaultLocaleMiddleware`, so it isn't computed again. `FetchFromCacheMiddleware` should be placed after both of
+them in `MIDDLEWARE_CLASSES`, which is where Django expects it anyway.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.middleware import cache as django_cache
+from django.utils.cache import cc_delim_re, get_max_age, has_vary_header, patch_response_headers
+from django.utils.decorators import decorator_from_middleware_with_args
+from django.utils.encoding import force_bytes, iri_to_uri
+from django.utils.timezone import get_current_timezone_name
+from django.utils.translation import get_language
+
+from localizerx.config import get_settings_snapshot
+from localizerx.sites import get_site_key
+
+# The language is already part of the key.
+IGNORED_HEADERS = ('HTTP_ACCEPT_LANGUAGE',)
+
+
+def get_request_language(request):
+    """
+    Get the language decided for the request.
+
+    Return: The `request.LANGUAGE_CODE` set by the locale middlewares, otherwise the language picked by the
+        `DefaultLocaleMiddleware`, otherwise the active language.
+    """
+    return (
+        getattr(request, 'LANGUAGE_CODE', None)
+        or getattr(request, 'localizerx_language', None)
+        or get_language()
+    )
+
+
+def generate_cache_key(request, method, headerlist, key_prefix):
+    """
+    Build the key of a cached page out of the site, language and path of the request.
+
+    Args:
+        request: A django request.
+        method: The request method the page was cached for i.e. `GET` or `HEAD`.
+        headerlist: The `request.META` keys of the headers the page varies on, besides the language.
+        key_prefix: The cache key prefix.
+    Return: The cache key.
+    """
+    headers = hashlib.md5()
+    for header in headerlist:
+        value = request.META.get(header)
+        if value is not None:
+            headers.update(force_bytes(value))
+
+    cache_key = 'localizerx.cache_page.{key_prefix}.{method}.{headers}'.format(
+        key_prefix=key_prefix,
+        method=method,
+        headers=headers.hexdigest(),
+    )
+    return '{cache_key}.{page}'.format(cache_key=cache_key, page=get_page_key(request))
+
+
+def generate_cache_header_key(request, key_prefix):
+    """
+    Build the key of the list of headers a page varies on.
+    """
+    return 'localizerx.cache_header.{key_prefix}.{page}'.format(key_prefix=key_prefix, page=get_page_key(request))
+
+
+def get_page_key(request):
+    """
+    Build the part of the cache keys that identifies the page: its site, language and absolute URL.
+
+    The URL includes the scheme and the host like Django's keys, so the HTTP and HTTPS pages or the pages of the
+    hosts that share a site aren't mixed up e.g. with absolute links or redirects.
+    """
+    url = hashlib.md5(force_bytes(iri_to_uri(request.build_absolute_uri())))
+    page_key = '{site}.{language}.{url}'.format(
+        site=get_site_key(request),
+        language=get_request_language(request),
+        url=url.hexdigest(),
+    )
+
+    if get_settings_snapshot().use_tz:
+        # Same as Django, the pages may render dates in the current time zone.
+        time_zone = get_current_timezone_name().encode('ascii', 'ignore').decode('ascii').replace(' ', '_')
+        page_key = '{page_key}.{time_zone}'.format(page_key=page_key, time_zone=time_zone)
+
+    return page_key
+
+
+def get_cache_key(request, key_prefix=None, method='GET', cache=None):
+    """
+    Get the key of a cached page, the counterpart of `django.utils.cache.get_cache_key`.
+
+    Args:
+        request: A django request.
+        key_prefix: The cache key prefix, defaults to `settings.CACHE_MIDDLEWARE_KEY_PREFIX`.
+        method: The request method the page was cached for.
+        cache: The cache backend, defaults to the `settings.CACHE_MIDDLEWARE_ALIAS` one.
+    Return: The cache key, or None if the page hasn't been cached yet.
+    """
+    if key_prefix is None:
+        key_prefix = settings.CACHE_MIDDLEWARE_KEY_PREFIX
+    if cache is None:
+        cache = caches[settings.CACHE_MIDDLEWARE_ALIAS]
+
+    headerlist = cache.get(generate_cache_header_key(request, key_prefix))
+    if headerlist is None:
+        return None
+    return generate_cache_key(request, method, headerlist, key_prefix)
+
+
+def learn_cache_key(request, response, cache_timeout=None, key_prefix=None, cache=None):
+    """
+    Store the headers a page varies on and get its cache key, the counterpart of `django.utils.cache.learn_cache_key`.
+
+    Args:
+        request: A django request.
+        response: The response to be cached.
+        cache_timeout: How long to keep the headers list, defaults to `settings.CACHE_MIDDLEWARE_SECONDS`.
+        key_prefix: The cache key prefix, defaults to `settings.CACHE_MIDDLEWARE_KEY_PREFIX`.
+        cache: The cache backend, defaults to the `settings.CACHE_MIDDLEWARE_ALIAS` one.
+    Return: The cache key.
+    """
+    if key_prefix is None:
+        key_prefix = settings.CACHE_MIDDLEWARE_KEY_PREFIX
+    if cache_timeout is None:
+        cache_timeout = settings.CACHE_MIDDLEWARE_SECONDS
+    if cache is None:
+        cache = caches[settings.CACHE_MIDDLEWARE_ALIAS]
+
+    headerlist = []
+    if response.has_header('Vary'):
+        for header in cc_delim_re.split(response['Vary']):
+            header = 'HTTP_' + header.upper().replace('-', '_')
+            if header not in IGNORED_HEADERS:
+                headerlist.append(header)
+        headerlist.sort()
+
+    cache.set(generate_cache_header_key(request, key_prefix), headerlist, cache_timeout)
+    return generate_cache_key(request, request.method, headerlist, key_prefix)
+
+
+class UpdateCacheMiddleware(django_cache.UpdateCacheMiddleware):
+    """
+    Django's `UpdateCacheMiddleware` with the language-aware cache keys.
+    """
+
+    def process_response(self, request, response):
+        """
+        Cache the response if it's cacheable.
+        """
+        if not self._should_update_cache(request, response):
+            return response
+
+        if response.streaming or response.status_code not in (200, 304):
+            return response
+
+        # Don't cache responses that set a user-specific (and maybe security sensitive) cookie in response to a
+        # cookie-less request.
+        if not request.COOKIES and response.cookies and has_vary_header(response, 'Cookie'):
+            return response
+
+        timeout = get_max_age(response)
+        if timeout is None:
+            timeout = self.cache_timeout
+        elif timeout == 0:
+            return response
+
+        patch_response_headers(response, timeout)
+        if timeout and response.status_code == 200:
+            cache_key = learn_cache_key(request, response, timeout, self.key_prefix, cache=self.cache)
+            if hasattr(response, 'render') and callable(response.render):
+                response.add_post_render_callback(lambda rendered: self.cache.set(cache_key, rendered, timeout))
+            else:
+                self.cache.set(cache_key, response, timeout)
+        return response
+
+
+class FetchFromCacheMiddleware(django_cache.FetchFromCacheMiddleware):
+    """
+    Django's `FetchFromCacheMiddleware` with the language-aware cache keys.
+    """
+
+    def process_request(self, request):
+        """
+        Get the cached response of the request, if any.
+        """
+        # pylint: disable=protected-access
+        if request.method not in ('GET', 'HEAD'):
+            request._cache_update_cache = False
+            return None
+
+        cache_key = get_cache_key(request, self.key_prefix, 'GET', cache=self.cache)
+        if cache_key is None:
+            request._cache_update_cache = True
+            return None
+
+        response = self.cache.get(cache_key)
+        if response is None and request.method == 'HEAD':
+            response = self.cache.get(get_cache_key(request, self.key_prefix, 'HEAD', cache=self.cache))
+
+        if response is None:
+            request._cache_update_cache = True
+            return None
+
+        request._cache_update_cache = False
+        return response
+
+
+class CacheMiddleware(UpdateCacheMiddleware, FetchFromCacheMiddleware, django_cache.CacheMiddleware):
+    """
+    Django's `CacheMiddleware` with the language-aware cache keys, which `cache_page` is built on.
+    """
+
+
+def cache_page(timeout, cache=None, key_prefix=None):
+    """
+    Cache the view's responses with the language-aware cache keys, the counterpart of Django's `cache_page`.
+
+    Args:
+        timeout: The cache timeout in seconds.
+        cache: The cache alias to use, defaults to the default cache.
+        key_prefix: The cache key prefix.
+    """
+    return decorator_from_middleware_with_args(CacheMiddleware)(
+        cache_timeout=timeout,
+        cache_alias=cache,
+        key_prefix=key_prefix,
+    )
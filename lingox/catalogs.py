@@ -0,0 +1,126 @@
+"""
+Translation catalogs warm-up for the LocalizerX module.
+
+Django loads the gettext catalogs of a language from `LOCALE_PATHS` and every installed app on the first request
+in that language, which takes hundreds of milliseconds in Open edX. The warm-up loads the catalogs of the languages
+LocalizerX serves when the app is ready, so the first requests of each worker don't pay for it.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import threading
+from timeit import default_timer
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.utils.translation import trans_real
+
+from localizerx.shared_catalogs import get_shared_catalogs_dir, install_shared_translation
+
+LOGGER = logging.getLogger(__name__)
+
+
+def is_catalog_warmup_enabled():
+    """
+    Check if the translation catalogs should be loaded when the app is ready.
+
+    The shared catalogs are installed by the warm-up, so they enable it as well.
+    """
+    return bool(settings.ENV_TOKENS.get('LOCALIZERX_WARMUP_CATALOGS', False) or get_shared_catalogs_dir())
+
+
+def get_site_languages():
+    """
+    Get the languages configured in the enabled sites' configurations.
+
+    Return: A list of language codes, empty if the site configurations aren't available.
+    """
+    try:
+        from openedx.core.djangoapps.site_configuration.models import SiteConfiguration
+    except ImportError:
+        return []
+
+    languages = []
+    try:
+        for configuration in SiteConfiguration.objects.filter(enabled=True):
+            languages.append(configuration.get_value('LANGUAGE_CODE'))
+            languages.extend(configuration.get_value('LOCALIZERX_SUPPORTED_LANGUAGES') or [])
+    except DatabaseError:
+        # e.g. the tables aren't created yet while running the migrations.
+        LOGGER.warning('Could not read the site configurations, only the platform languages will be warmed up.')
+    return languages
+
+
+def get_warmup_languages():
+    """
+    Get the languages to load the catalogs of.
+
+    Return: A list of the unique language codes in `settings.LANGUAGE_CODE`, `LOCALIZERX_SUPPORTED_LANGUAGES` and
+        the site configurations, in that order.
+    """
+    languages = [settings.LANGUAGE_CODE]
+    languages.extend(settings.ENV_TOKENS.get('LOCALIZERX_SUPPORTED_LANGUAGES', []))
+    languages.extend(get_site_languages())
+
+    unique_languages = []
+    for language in languages:
+        if language and language not in unique_languages:
+            unique_languages.append(language)
+    return unique_languages
+
+
+def warm_up_catalogs(languages=None):
+    """
+    Load the translation catalogs of the languages into Django's translations cache.
+
+    The shared catalogs are used instead if `LOCALIZERX_SHARED_CATALOGS_DIR` is set.
+
+    Args:
+        languages: The language codes to load, defaults to `get_warmup_languages()`.
+    Return: The time it took, in seconds.
+    """
+    started_at = default_timer()
+    if languages is None:
+        languages = get_warmup_languages()
+
+    shared_catalogs_dir = get_shared_catalogs_dir()
+    for language in languages:
+        if shared_catalogs_dir:
+            install_shared_translation(language, shared_catalogs_dir)
+        else:
+            trans_real.translation(language)
+
+    duration = default_timer() - started_at
+    LOGGER.info(
+        'Loaded the translation catalogs of %d languages in %.1f ms: %s',
+        len(languages), duration * 1000, ', '.join(languages),
+    )
+    return duration
+
+
+def warm_up_catalogs_in_thread():
+    """
+    Warm up the catalogs and release the thread's database connections.
+    """
+    try:
+        warm_up_catalogs()
+    except Exception:  # pylint: disable=broad-except
+        LOGGER.exception('Could not warm up the translation catalogs.')
+    finally:
+        connections.close_all()
+
+
+def start_catalog_warmup():
+    """
+    Warm up the catalogs, in a background thread unless `LOCALIZERX_WARMUP_IN_BACKGROUND` is disabled.
+
+    Return: The warm-up thread, or None if the catalogs are already loaded.
+    """
+    if not settings.ENV_TOKENS.get('LOCALIZERX_WARMUP_IN_BACKGROUND', True):
+        warm_up_catalogs()
+        return None
+
+    thread = threading.Thread(target=warm_up_catalogs_in_thread, name='localizerx-catalogs-warmup')
+    thread.daemon = True
+    thread.start()
+    return thread
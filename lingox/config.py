@@ -0,0 +1,207 @@
+"""
+Settings snapshot for the LocalizerX module.
+
+Each `settings.X` lookup goes through `LazySettings.__getattr__`, and the `FEATURES` and `ENV_TOKENS` values
+need another dict lookup on top of it. The settings LocalizerX reads while serving requests are frozen into a
+`SettingsSnapshot` when the app is ready, and rebuilt after they're modified e.g. via `override_settings`.
+"""
+from __future__ import absolute_import, unicode_literals
+
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+DEFAULT_API_URL_PREFIXES = (
+    '/api/',
+    '/user_api/',
+    '/notifier_api/',
+)
+
+# The high-volume paths that never render translated text: static files, health checks and XBlock resources.
+# The `STATIC_URL` and `MEDIA_URL` are added to them if they're paths.
+DEFAULT_BYPASS_URL_PREFIXES = (
+    '/static/',
+    '/media/',
+    '/heartbeat',
+    '/xblock/resource/',
+)
+
+# The same limit Django enforces since 4.2, the longest real browser headers are a few hundred characters.
+DEFAULT_ACCEPT_LANGUAGE_MAX_LENGTH = 500
+DEFAULT_ACCEPT_LANGUAGE_MAX_ENTRIES = 16
+
+DEFAULT_SITE_CACHE_SIZE = 1024
+DEFAULT_SITE_CACHE_TTL = 300  # In seconds.
+
+DEFAULT_GENERATION_CHECK_INTERVAL_MS = 1000
+
+DEFAULT_DARK_LANG_CACHE_TTL = 300  # In seconds.
+
+DEFAULT_PREFERENCE_CACHE_SIZE = 10000
+DEFAULT_PREFERENCE_CACHE_TTL = 300  # In seconds.
+
+DEFAULT_LANGUAGE_STATS_INTERVAL = 60  # In seconds.
+DEFAULT_LANGUAGE_STATS_CAPACITY = 256
+
+DEFAULT_PROFILING_SCOPE = 'middleware'
+DEFAULT_PROFILING_SAMPLE_RATE = 0.01
+DEFAULT_PROFILING_THRESHOLD_MS = 50
+DEFAULT_PROFILING_MAX_FILES = 100
+DEFAULT_PROFILING_MAX_BYTES = 50 * 1024 * 1024
+
+
+class SettingsSnapshot(namedtuple('SettingsSnapshot', [
+        'feature_enabled',
+        'language_code',
+        'language_cookie_name',
+        'session_cookie_secure',
+        'use_x_forwarded_host',
+        'force_script_name',
+        'use_tz',
+        'allowed_hosts',
+        'debug',
+        'api_url_prefixes',
+        'bypass_url_prefixes',
+        'path_languages',
+        'supported_languages',
+        'accept_language_max_length',
+        'accept_language_max_entries',
+        'site_cache_size',
+        'site_cache_ttl',
+        'sites_by_host',
+        'site_snapshots_path',
+        'site_snapshots_cache',
+        'generation_cache',
+        'generation_check_interval',
+        'direct_activation',
+        'normalize_vary',
+        'cached_dark_lang',
+        'dark_lang_cache_ttl',
+        'preference_cache',
+        'preference_cookie',
+        'preference_cache_size',
+        'preference_cache_ttl',
+        'language_stats_path',
+        'language_stats_interval',
+        'language_stats_capacity',
+        'profiling_path',
+        'profiling_scope',
+        'profiling_sample_rate',
+        'profiling_threshold',
+        'profiling_max_files',
+        'profiling_max_bytes',
+])):
+    """
+    Immutable view of the Django settings LocalizerX depends on.
+
+    The `feature_enabled` flag is the platform-wide `FEATURES['ENABLE_LOCALIZERX']`, the `LOCALIZERX_*` values of
+    `ENV_TOKENS` are stored under their lower case names without the prefix, with their defaults filled in.
+    """
+
+    __slots__ = ()
+
+
+# The current snapshot, built lazily and discarded whenever the settings change.
+_SNAPSHOTS = {}
+
+
+def get_default_bypass_url_prefixes():
+    """
+    Get the default `LOCALIZERX_BYPASS_URL_PREFIXES`, including the `STATIC_URL` and `MEDIA_URL` paths.
+    """
+    prefixes = list(DEFAULT_BYPASS_URL_PREFIXES)
+    for url in (settings.STATIC_URL, settings.MEDIA_URL):
+        # Only the URLs on the same host, not e.g. `https://cdn.example.com/static/`.
+        if url and url.startswith('/') and url not in prefixes:
+            prefixes.append(url)
+    return tuple(prefixes)
+
+
+def build_settings_snapshot():
+    """
+    Read the LocalizerX settings.
+
+    Return: A `SettingsSnapshot` instance.
+    """
+    env_tokens = settings.ENV_TOKENS
+    preference_cache = bool(env_tokens.get('LOCALIZERX_PREFERENCE_CACHE', False))
+
+    return SettingsSnapshot(
+        feature_enabled=settings.FEATURES.get('ENABLE_LOCALIZERX', False),
+        language_code=settings.LANGUAGE_CODE,
+        language_cookie_name=settings.LANGUAGE_COOKIE_NAME,
+        session_cookie_secure=settings.SESSION_COOKIE_SECURE,
+        use_x_forwarded_host=settings.USE_X_FORWARDED_HOST,
+        force_script_name=settings.FORCE_SCRIPT_NAME,
+        use_tz=settings.USE_TZ,
+        allowed_hosts=tuple(settings.ALLOWED_HOSTS),
+        debug=settings.DEBUG,
+        api_url_prefixes=tuple(env_tokens.get('LOCALIZERX_API_URL_PREFIXES', DEFAULT_API_URL_PREFIXES)),
+        bypass_url_prefixes=tuple(env_tokens.get('LOCALIZERX_BYPASS_URL_PREFIXES', get_default_bypass_url_prefixes())),
+        path_languages=tuple(tuple(rule) for rule in env_tokens.get('LOCALIZERX_PATH_LANGUAGES', ())),
+        supported_languages=tuple(env_tokens.get('LOCALIZERX_SUPPORTED_LANGUAGES', ())),
+        accept_language_max_length=env_tokens.get(
+            'LOCALIZERX_ACCEPT_LANGUAGE_MAX_LENGTH', DEFAULT_ACCEPT_LANGUAGE_MAX_LENGTH,
+        ),
+        accept_language_max_entries=env_tokens.get(
+            'LOCALIZERX_ACCEPT_LANGUAGE_MAX_ENTRIES', DEFAULT_ACCEPT_LANGUAGE_MAX_ENTRIES,
+        ),
+        site_cache_size=env_tokens.get('LOCALIZERX_SITE_CACHE_SIZE', DEFAULT_SITE_CACHE_SIZE),
+        site_cache_ttl=env_tokens.get('LOCALIZERX_SITE_CACHE_TTL', DEFAULT_SITE_CACHE_TTL),
+        sites_by_host=bool(env_tokens.get('LOCALIZERX_SITES_BY_HOST', False)),
+        site_snapshots_path=env_tokens.get('LOCALIZERX_SITE_SNAPSHOTS_PATH'),
+        site_snapshots_cache=env_tokens.get('LOCALIZERX_SITE_SNAPSHOTS_CACHE'),
+        generation_cache=env_tokens.get('LOCALIZERX_GENERATION_CACHE'),
+        generation_check_interval=env_tokens.get(
+            'LOCALIZERX_GENERATION_CHECK_INTERVAL_MS', DEFAULT_GENERATION_CHECK_INTERVAL_MS,
+        ),
+        direct_activation=bool(env_tokens.get('LOCALIZERX_DIRECT_ACTIVATION', False)),
+        normalize_vary=bool(env_tokens.get('LOCALIZERX_NORMALIZE_VARY', False)),
+        cached_dark_lang=bool(env_tokens.get('LOCALIZERX_CACHED_DARK_LANG', False)),
+        dark_lang_cache_ttl=env_tokens.get('LOCALIZERX_DARK_LANG_CACHE_TTL', DEFAULT_DARK_LANG_CACHE_TTL),
+        preference_cache=preference_cache,
+        preference_cookie=preference_cache and bool(env_tokens.get('LOCALIZERX_PREFERENCE_COOKIE', False)),
+        preference_cache_size=env_tokens.get('LOCALIZERX_PREFERENCE_CACHE_SIZE', DEFAULT_PREFERENCE_CACHE_SIZE),
+        preference_cache_ttl=env_tokens.get('LOCALIZERX_PREFERENCE_CACHE_TTL', DEFAULT_PREFERENCE_CACHE_TTL),
+        language_stats_path=env_tokens.get('LOCALIZERX_LANGUAGE_STATS_PATH'),
+        language_stats_interval=env_tokens.get('LOCALIZERX_LANGUAGE_STATS_INTERVAL', DEFAULT_LANGUAGE_STATS_INTERVAL),
+        language_stats_capacity=env_tokens.get('LOCALIZERX_LANGUAGE_STATS_CAPACITY', DEFAULT_LANGUAGE_STATS_CAPACITY),
+        profiling_path=env_tokens.get('LOCALIZERX_PROFILING_PATH'),
+        profiling_scope=env_tokens.get('LOCALIZERX_PROFILING_SCOPE', DEFAULT_PROFILING_SCOPE),
+        profiling_sample_rate=env_tokens.get('LOCALIZERX_PROFILING_SAMPLE_RATE', DEFAULT_PROFILING_SAMPLE_RATE),
+        profiling_threshold=env_tokens.get('LOCALIZERX_PROFILING_THRESHOLD_MS', DEFAULT_PROFILING_THRESHOLD_MS),
+        profiling_max_files=env_tokens.get('LOCALIZERX_PROFILING_MAX_FILES', DEFAULT_PROFILING_MAX_FILES),
+        profiling_max_bytes=env_tokens.get('LOCALIZERX_PROFILING_MAX_BYTES', DEFAULT_PROFILING_MAX_BYTES),
+    )
+
+
+def get_settings_snapshot():
+    """
+    Get the snapshot of the current LocalizerX settings.
+
+    Return: A `SettingsSnapshot` instance.
+    """
+    snapshot = _SNAPSHOTS.get('settings')
+    if snapshot is None:
+        snapshot = _SNAPSHOTS['settings'] = build_settings_snapshot()
+    return snapshot
+
+
+def reload_settings_snapshot():
+    """
+    Build the snapshot of the current LocalizerX settings again.
+
+    Return: The new `SettingsSnapshot` instance.
+    """
+    snapshot = _SNAPSHOTS['settings'] = build_settings_snapshot()
+    return snapshot
+
+
+@receiver(setting_changed)
+def reset_settings_snapshot(**kwargs):  # pylint: disable=unused-argument
+    """
+    Discard the snapshot when the settings are modified e.g. via `override_settings`, it's rebuilt on the next use.
+    """
+    _SNAPSHOTS.clear()
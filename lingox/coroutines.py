@@ -0,0 +1,72 @@
+"""
+Asynchronous request handling for the LocalizerX middlewares.
+
+This module is only imported on Python 3, when Django hands a middleware an asynchronous `get_response`.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import functools
+
+
+def is_coroutine_function(func):
+    """
+    Check whether `func` is a coroutine function, or an object marked as such.
+    """
+    try:
+        from asgiref.sync import iscoroutinefunction
+    except ImportError:
+        iscoroutinefunction = asyncio.iscoroutinefunction
+    return iscoroutinefunction(func)
+
+
+def mark_coroutine_function(func):
+    """
+    Mark `func` (usually a middleware instance) as a coroutine function, so Django awaits its calls.
+    """
+    try:
+        from asgiref.sync import markcoroutinefunction
+    except ImportError:
+        pass
+    else:
+        markcoroutinefunction(func)
+
+    # Recognized by `asyncio.iscoroutinefunction`, which is what Django 3.1 up to 4.0 checks.
+    marker = getattr(asyncio.coroutines, '_is_coroutine', None)
+    if marker is not None:
+        func._is_coroutine = marker  # pylint: disable=protected-access
+
+    return func
+
+
+async def run_in_thread(func, *args):
+    """
+    Run a blocking function in a thread, and wait for its result without blocking the event loop.
+
+    Django's `sync_to_async` is used when it's available, so the database connections are handled the way Django
+    expects. The event loop's default executor is used otherwise.
+    """
+    try:
+        from asgiref.sync import sync_to_async
+    except ImportError:
+        return await asyncio.get_event_loop().run_in_executor(None, functools.partial(func, *args))
+    return await sync_to_async(func)(*args)
+
+
+async def acall(middleware, request):
+    """
+    Run a LocalizerX middleware in an asynchronous middleware chain.
+
+    The request is usually handled with cached data only, so it's processed right on the event loop. When the
+    middleware's `request_may_block` or `response_may_block` says it may query the database or a cache backend,
+    or write a file, that step is delegated to a thread instead.
+    """
+    if middleware.request_may_block(request):
+        await run_in_thread(middleware.process_request, request)
+    else:
+        middleware.process_request(request)
+
+    response = await middleware.get_response(request)
+    if middleware.response_may_block(request):
+        return await run_in_thread(middleware.process_response, request, response)
+    return middleware.process_response(request, response)
@@ -0,0 +1,211 @@
+"""
+Cached dark language configuration for the LocalizerX module.
+
+Open edX's `DarkLangMiddleware` reads the current `DarkLangConfig` several times on every request to find the
+released languages. The configuration is resolved once into a `DarkLangSnapshot` and kept until it expires or the
+configuration is saved, for both the `CachedDarkLangMiddleware` and the `DefaultLocaleMiddleware`.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import logging
+from collections import namedtuple
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from localizerx.config import get_settings_snapshot
+from localizerx.helpers import parse_accept_language, truncate_accept_language
+from localizerx.lru import LRUCache
+from localizerx.preferences import is_authenticated
+
+LOGGER = logging.getLogger(__name__)
+
+CLEANED_HEADERS_CACHE_SIZE = 1024
+
+DARK_LANGUAGE_KEY = 'dark-lang'
+
+
+class DarkLangSnapshot(namedtuple('DarkLangSnapshot', ['enabled', 'released_languages', 'released_prefixes'])):
+    """
+    Immutable view of the dark language configuration.
+
+    It holds whether the dark languages are `enabled`, the `released_languages` frozenset, which includes
+    `settings.LANGUAGE_CODE` like Open edX does, and the `released_prefixes` dict of the first released language of
+    each language prefix e.g. `{'en': 'en-us'}`.
+    """
+
+    __slots__ = ()
+
+    def fuzzy_match(self, language_code):
+        """
+        Find the released language matching the language code, the same way Open edX's `DarkLangMiddleware` does.
+
+        Args:
+            language_code: A lower case language code e.g. `en-gb`.
+        Return: The language code, the released language with the same prefix or None if there's none.
+        """
+        if language_code in self.released_languages:
+            return language_code
+        return self.released_prefixes.get(language_code.partition('-')[0])
+
+
+DISABLED_SNAPSHOT = DarkLangSnapshot(enabled=False, released_languages=frozenset(), released_prefixes={})
+
+# The snapshot and the cleaned headers caches, created lazily so they pick up the configured TTL.
+_CACHES = {}
+
+
+def is_cached_dark_lang_enabled():
+    """
+    Check if the `CachedDarkLangMiddleware` should replace Open edX's `DarkLangMiddleware`.
+    """
+    return get_settings_snapshot().cached_dark_lang
+
+
+def get_dark_lang_ttl():
+    """
+    Get the number of seconds the cached dark language configuration is considered fresh.
+    """
+    return get_settings_snapshot().dark_lang_cache_ttl
+
+
+def get_dark_lang_cache():
+    """
+    Get the cache of the dark language snapshot.
+    """
+    cache = _CACHES.get('dark_lang')
+    if cache is None:
+        cache = _CACHES['dark_lang'] = LRUCache(maxsize=1, ttl=get_dark_lang_ttl())
+    return cache
+
+
+def get_cleaned_headers_cache():
+    """
+    Get the LRU cache of the `Accept-Language` headers cleaned from the unreleased languages.
+    """
+    cache = _CACHES.get('headers')
+    if cache is None:
+        # The headers expire along with the snapshot they were cleaned with.
+        cache = _CACHES['headers'] = LRUCache(maxsize=CLEANED_HEADERS_CACHE_SIZE, ttl=get_dark_lang_ttl())
+    return cache
+
+
+def build_dark_lang_snapshot():
+    """
+    Resolve the current dark language configuration.
+
+    Return: A `DarkLangSnapshot` instance, disabled if the dark lang app isn't available.
+    """
+    try:
+        from openedx.core.djangoapps.dark_lang.models import DarkLangConfig
+    except ImportError:
+        LOGGER.warning('Could not import DarkLangConfig, the dark languages are disabled.')
+        return DISABLED_SNAPSHOT
+
+    config = DarkLangConfig.current()
+    if not config.enabled:
+        return DISABLED_SNAPSHOT
+
+    language_code = get_settings_snapshot().language_code
+    released_languages = list(config.released_languages_list)
+    if language_code not in released_languages:
+        released_languages.append(language_code)
+
+    released_prefixes = {}
+    for language_code in released_languages:
+        released_prefixes.setdefault(language_code.partition('-')[0], language_code)
+
+    return DarkLangSnapshot(
+        enabled=True,
+        released_languages=frozenset(released_languages),
+        released_prefixes=released_prefixes,
+    )
+
+
+def get_dark_lang_snapshot():
+    """
+    Get the dark language configuration snapshot.
+
+    Return: A `DarkLangSnapshot` instance.
+    """
+    cache = get_dark_lang_cache()
+    snapshot = cache.get('current')
+    if snapshot is None:
+        snapshot = build_dark_lang_snapshot()
+        cache.set('current', snapshot)
+    return snapshot
+
+
+def is_dark_lang_snapshot_cached():
+    """
+    Check whether the dark language snapshot is cached, so getting it doesn't query the `DarkLangConfig`.
+    """
+    return 'current' in get_dark_lang_cache()
+
+
+def get_released_language(language_code):
+    """
+    Get the released language to use instead of a language code.
+
+    Args:
+        language_code: A language code e.g. the site's `LANGUAGE_CODE`.
+    Return: The matching released language, or `settings.LANGUAGE_CODE` if the language isn't released.
+        The language code is returned as is when the dark languages are disabled.
+    """
+    snapshot = get_dark_lang_snapshot()
+    if not snapshot.enabled:
+        return language_code
+    return snapshot.fuzzy_match(language_code.lower()) or get_settings_snapshot().language_code
+
+
+def clean_accept_language(header, snapshot):
+    """
+    Remove the unreleased languages from an `Accept-Language` header, like Open edX's `DarkLangMiddleware` does.
+
+    The result is cached per header until the dark language configuration changes.
+
+    Args:
+        header: The raw `Accept-Language` header.
+        snapshot: The current `DarkLangSnapshot`.
+    Return: The header with the released languages only e.g. `en;q=1.0, ar;q=0.8`.
+    """
+    header = truncate_accept_language(header)
+    cache = get_cleaned_headers_cache()
+    cleaned_header = cache.get(header)
+    if cleaned_header is None:
+        cleaned_languages = []
+        for language, quality in parse_accept_language(header):
+            released_language = snapshot.fuzzy_match(language)
+            if released_language:
+                cleaned_languages.append('{};q={}'.format(released_language, quality))
+        cleaned_header = ', '.join(cleaned_languages)
+        cache.set(header, cleaned_header)
+    return cleaned_header
+
+
+def get_preview_language(request):
+    """
+    Get the dark language the user has chosen to preview, if any.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not is_authenticated(user):
+        return None
+
+    from openedx.core.djangoapps.user_api.preferences.api import get_user_preference
+    return get_user_preference(user, DARK_LANGUAGE_KEY)
+
+
+def invalidate_dark_lang_snapshot(sender, **kwargs):  # pylint: disable=unused-argument
+    """
+    Discard the snapshot and the cleaned headers when a `DarkLangConfig` is saved.
+    """
+    get_dark_lang_cache().clear()
+    get_cleaned_headers_cache().clear()
+
+
+@receiver(setting_changed)
+def reset_dark_lang_snapshot(**kwargs):  # pylint: disable=unused-argument
+    """
+    Discard the cached snapshot and headers when the settings are modified e.g. via `override_settings`.
+    """
+    _CACHES.clear()
@@ -0,0 +1,212 @@
+"""
+Language decision engine of the LocalizerX module.
+
+`decide()` is the core of the `DefaultLocaleMiddleware`: it picks the language of a request out of its host, path and
+`Accept-Language` header, without a Django request object. It can be called from any WSGI or ASGI
+stack, offline tools and the benchmarks, and returns a small immutable `Decision`.
+
+The site configuration is read from the cached `SiteSnapshot` of the host. A host that isn't cached yet is resolved
+with the current site configuration, which is the request's site while serving it.
+
+`decide_environ()` decides from a WSGI environ before Django builds its request, for the
+`localizerx.wsgi.LocalizerXWSGIMiddleware`. There's no current site at that point, so it only uses the hosts that
+are already cached, and leaves the others to the `DefaultLocaleMiddleware`. With `LOCALIZERX_SITES_BY_HOST`
+enabled, it resolves the other allowed hosts as well.
+"""
+from __future__ import absolute_import, unicode_literals
+
+from collections import namedtuple
+
+from django.core.handlers.wsgi import get_path_info, get_script_name
+from django.http.request import split_domain_port, validate_host
+
+from localizerx.config import get_settings_snapshot
+from localizerx.dark_lang import get_released_language
+from localizerx.helpers import get_bypass_matcher, negotiate_language
+from localizerx.matchers import PASSTHROUGH
+from localizerx.sites import get_host_snapshot, get_site_key, get_snapshots_cache
+
+# The reasons of the decisions.
+BYPASSED = 'bypassed'  # The path is in `LOCALIZERX_BYPASS_URL_PREFIXES`, the site isn't even looked up.
+DISABLED = 'disabled'  # LocalizerX is disabled for the site.
+PASSTHROUGH_PATH = 'passthrough'  # The path is an API endpoint or a `passthrough` rule.
+PATH_RULE = 'path'  # The language of the path's `LOCALIZERX_PATH_LANGUAGES` rule.
+NEGOTIATED = 'negotiated'  # The browser's preferred language out of the site's `LOCALIZERX_SUPPORTED_LANGUAGES`.
+SITE_LANGUAGE = 'site'  # The site's `LANGUAGE_CODE`.
+
+# The WSGI environ key of the decision made by the `LocalizerXWSGIMiddleware`, it ends up in `request.META`.
+ENVIRON_DECISION_KEY = 'localizerx.decision'
+
+
+class Decision(namedtuple('Decision', ['language', 'reason', 'bypass', 'varies_on_browser'])):
+    """
+    The language LocalizerX picked for a request, and why.
+
+    The `language` is None when the request should be left untouched, otherwise it's the language to enforce.
+    The `reason` is one of the reasons above, `bypass` is set for the bypassed paths, and `varies_on_browser` is set
+    when the language depends on the browser's `Accept-Language` header, i.e. the response should keep varying on it.
+    """
+
+    __slots__ = ()
+
+
+# The decisions that leave the request untouched are shared, so they cost no allocation.
+BYPASS_DECISION = Decision(language=None, reason=BYPASSED, bypass=True, varies_on_browser=True)
+DISABLED_DECISION = Decision(language=None, reason=DISABLED, bypass=False, varies_on_browser=True)
+PASSTHROUGH_DECISION = Decision(language=None, reason=PASSTHROUGH_PATH, bypass=False, varies_on_browser=True)
+
+
+def decide(host, path, accept_language=''):
+    """
+    Decide the language of a request.
+
+    Args:
+        host: The site's domain or the request's host, see `localizerx.sites.get_site_key`.
+        path: The URL path e.g. `request.path`.
+        accept_language: The raw `Accept-Language` header.
+    Return: A `Decision` instance.
+    """
+    if path in get_bypass_matcher():
+        return BYPASS_DECISION
+    return decide_for_site(get_host_snapshot(host), path, accept_language)
+
+
+def decide_request(request):
+    """
+    Decide the language of a django request, see `decide`.
+
+    The request's host is only read if the path isn't bypassed.
+
+    Return: A `Decision` instance.
+    """
+    path = request.path
+    if path in get_bypass_matcher():
+        return BYPASS_DECISION
+    return decide_for_site(
+        get_host_snapshot(get_site_key(request)),
+        path,
+        request.META.get('HTTP_ACCEPT_LANGUAGE', ''),
+    )
+
+
+def is_ascii(value):
+    """
+    Check whether a WSGI environ value only has ASCII characters, so it doesn't need to be decoded.
+    """
+    try:
+        value.encode('ascii')
+    except UnicodeError:
+        return False
+    return True
+
+
+def get_environ_path(environ):
+    """
+    Get the path of a WSGI request, the same way Django builds `request.path`.
+    """
+    path_info = environ.get('PATH_INFO') or '/'
+    script_name = environ.get('SCRIPT_NAME', '')
+    if (
+            get_settings_snapshot().force_script_name is not None
+            or 'SCRIPT_URL' in environ
+            or 'REDIRECT_URL' in environ
+            or not is_ascii(script_name + path_info)
+    ):
+        # Leave the rewritten URLs and the encoded paths to Django.
+        path_info = get_path_info(environ) or '/'
+        script_name = get_script_name(environ)
+    elif not script_name and path_info.startswith('/'):
+        return path_info
+
+    return '{script_name}/{path}'.format(
+        script_name=script_name.rstrip('/'),
+        path=path_info.replace('/', '', 1),
+    )
+
+
+def get_environ_host(environ):
+    """
+    Get the host of a WSGI request, the same way Django's `request.get_host()` does before validating it.
+
+    The host isn't validated against `ALLOWED_HOSTS`, it's only used to find the cached site snapshots, which are
+    keyed on validated hosts or site domains.
+
+    Return: The host, or None if the request has no `Host` header.
+    """
+    if get_settings_snapshot().use_x_forwarded_host and 'HTTP_X_FORWARDED_HOST' in environ:
+        return environ['HTTP_X_FORWARDED_HOST']
+    return environ.get('HTTP_HOST')
+
+
+def is_allowed_host(host):
+    """
+    Check a host against `ALLOWED_HOSTS` the way Django's `request.get_host()` does, before resolving its site.
+    """
+    settings_snapshot = get_settings_snapshot()
+    allowed_hosts = settings_snapshot.allowed_hosts
+    if settings_snapshot.debug and not allowed_hosts:
+        allowed_hosts = ('localhost', '127.0.0.1', '[::1]')
+    domain, _port = split_domain_port(host)
+    return bool(domain) and validate_host(domain, allowed_hosts)
+
+
+def decide_environ(environ):
+    """
+    Decide the language of a WSGI request, before Django builds its request.
+
+    Args:
+        environ: The WSGI environ.
+    Return: A `Decision` instance, or None if the request's site isn't cached yet, or its host isn't resolved.
+    """
+    path = get_environ_path(environ)
+    if path in get_bypass_matcher():
+        return BYPASS_DECISION
+
+    host = get_environ_host(environ)
+    if not host:
+        return None
+    snapshot = get_snapshots_cache().get(host)
+    if snapshot is None:
+        # The disallowed hosts are left to Django, so they aren't cached.
+        if not get_settings_snapshot().sites_by_host or not is_allowed_host(host):
+            return None
+        snapshot = get_host_snapshot(host)
+    return decide_for_site(snapshot, path, environ.get('HTTP_ACCEPT_LANGUAGE', ''))
+
+
+def decide_for_site(snapshot, path, accept_language):
+    """
+    Decide the language of a request that isn't bypassed, out of its site's configuration.
+
+    Args:
+        snapshot: The site's `SiteSnapshot`.
+        path: The URL path e.g. `request.path`.
+        accept_language: The raw `Accept-Language` header.
+    Return: A `Decision` instance.
+    """
+    if not snapshot.enabled:
+        return DISABLED_DECISION
+    # A single pass over the path finds the site's rule for it, if any.
+    language_code = snapshot.path_rules.lookup(path)
+    if language_code == PASSTHROUGH:
+        # LocalizerX is only needed for regular browser pages.
+        # It is incompatible with the mobile apps and APIs in general.
+        return PASSTHROUGH_DECISION
+
+    if language_code is not None:
+        # The path's language is enforced regardless of the site language and the browser.
+        reason = PATH_RULE
+        varies_on_browser = False
+    elif snapshot.supported_languages:
+        # The site allows the browser languages it supports, the site language is only the fallback.
+        language_code = negotiate_language(accept_language or '', snapshot.supported_languages, snapshot.language_code)
+        reason = NEGOTIATED
+        varies_on_browser = True
+    else:
+        language_code = snapshot.language_code
+        reason = SITE_LANGUAGE
+        varies_on_browser = False
+
+    if get_settings_snapshot().cached_dark_lang:
+        language_code = get_released_language(language_code)
+    return Decision(language_code, reason, False, varies_on_browser)
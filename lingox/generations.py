@@ -0,0 +1,116 @@
+"""
+Cross-process invalidation of the LocalizerX in-process caches.
+
+The `post_save` signals only reach the process that saved e.g. a `SiteConfiguration`, the other workers on all
+the nodes would serve their cached copies until they expire. When `LOCALIZERX_GENERATION_CACHE` is configured,
+saving bumps a generation counter stored in that Django cache backend, which the workers compare with the
+generation they've last seen at most once every `LOCALIZERX_GENERATION_CHECK_INTERVAL_MS` milliseconds, and drop
+their cached copies when it has changed. The changes reach all the workers within that interval.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import logging
+from timeit import default_timer
+
+from django.core.cache import caches
+
+from localizerx.config import get_settings_snapshot
+
+LOGGER = logging.getLogger(__name__)
+
+GENERATION_KEY_PREFIX = 'localizerx:generation:'
+
+# The generation of the site configurations, see `localizerx.sites`.
+SITES_GENERATION = 'sites'
+# The generation of the users' language preferences, see `localizerx.preferences`.
+PREFERENCES_GENERATION = 'preferences'
+
+
+class GenerationCounter(object):
+    """
+    Generation counter shared by all the worker processes through a Django cache backend.
+
+    A missing counter, e.g. evicted or after the cache was flushed, counts as a change as well.
+    """
+
+    def __init__(self, name, cache_alias, interval):
+        """
+        Initialize the counter with the current shared generation.
+
+        Args:
+            name: The name of the cached data e.g. `SITES_GENERATION`.
+            cache_alias: The alias of the Django cache backend shared by the workers.
+            interval: The minimum number of seconds between two checks of the shared generation.
+        """
+        self.key = GENERATION_KEY_PREFIX + name
+        self.cache_alias = cache_alias
+        self.interval = interval
+        self.generation = self.fetch()
+        self.next_check_at = default_timer() + interval
+
+    def fetch(self):
+        """
+        Get the shared generation.
+
+        Return: The generation, 0 if there's none yet, or None if the cache backend is unavailable.
+        """
+        try:
+            return caches[self.cache_alias].get(self.key, 0)
+        except Exception:  # pylint: disable=broad-except
+            # The cached copies are still refreshed after their TTL.
+            LOGGER.warning('Could not get the LocalizerX generation %s', self.key, exc_info=True)
+            return None
+
+    def bump(self):
+        """
+        Let all the workers know that the data has changed.
+        """
+        cache = caches[self.cache_alias]
+        try:
+            try:
+                cache.incr(self.key)
+            except ValueError:
+                # The counter doesn't exist yet, unless another worker has just added it.
+                if not cache.add(self.key, 1, timeout=None):
+                    cache.incr(self.key)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.warning('Could not bump the LocalizerX generation %s', self.key, exc_info=True)
+
+    def is_check_due(self):
+        """
+        Check whether the next `has_changed` call queries the cache backend.
+        """
+        return default_timer() >= self.next_check_at
+
+    def has_changed(self):
+        """
+        Check whether the shared generation has changed since the last check.
+
+        The cache backend is only queried once per interval, the other calls only compare the time.
+        """
+        now = default_timer()
+        if now < self.next_check_at:
+            return False
+
+        self.next_check_at = now + self.interval
+        generation = self.fetch()
+        if generation is None or generation == self.generation:
+            return False
+        self.generation = generation
+        return True
+
+
+def build_generation_counter(name):
+    """
+    Build the generation counter of some cached data.
+
+    Return: A `GenerationCounter` instance, or None if `LOCALIZERX_GENERATION_CACHE` isn't configured.
+    """
+    settings_snapshot = get_settings_snapshot()
+    if not settings_snapshot.generation_cache:
+        return None
+    return GenerationCounter(
+        name,
+        cache_alias=settings_snapshot.generation_cache,
+        interval=settings_snapshot.generation_check_interval / 1000.0,
+    )
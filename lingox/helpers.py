@@ -4,26 +4,58 @@ Helper functions for the LocalizerX module.
 from __future__ import absolute_import, unicode_literals
 
 import logging
+import re
 
-from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation.trans_real import get_supported_language_variant
 
+from localizerx.config import get_settings_snapshot
+from localizerx.instrumentation import add_timing_markers
+from localizerx.lru import LRUCache
+from localizerx.matchers import PathMatcher, PathRules
+from localizerx.profiling import add_profiling_markers
 from openedx.core.djangoapps.site_configuration import helpers as configuration_helpers
 
 LOGGER = logging.getLogger(__name__)
 
+# Compiled matchers, populated lazily and cleared whenever the underlying settings change.
+_MATCHERS = {}
 
-def add_locale_middleware(middleware_classes):
+# Same as Django's `accept_language_re`, a language range or the `*` wildcard.
+LANGUAGE_RANGE_RE = re.compile(r'^(?:[A-Za-z]{1,8}(?:-[A-Za-z0-9]{1,8})*|\*)$')
+
+# Browsers send a few hundred distinct headers at most, so the negotiation results are cached by the raw header.
+NEGOTIATION_CACHE_SIZE = 2048
+_NEGOTIATIONS = LRUCache(maxsize=NEGOTIATION_CACHE_SIZE)
+
+
+def add_locale_middleware(middleware_classes, setting_name='MIDDLEWARE_CLASSES', instrument=False,
+                          direct_activation=False, cached_dark_lang=False, sites_by_host=False, profile_scope=None):
     """
     Add the LocalizerX's DefaultLocaleMiddleware to the MIDDLEWARE_CLASSES tuple correctly.
 
+    The same works for the new-style `MIDDLEWARE` setting, since the middleware supports both.
+
     Args:
-        middleware_classes: The MIDDLEWARE_CLASSES tuple from the settings.
+        middleware_classes: The MIDDLEWARE_CLASSES (or MIDDLEWARE) tuple from the settings.
+        setting_name: The name of the setting being patched, used in the log and error messages.
+        instrument: Surround the locale-aware middlewares with timing markers.
+        direct_activation: Replace Django's `LocaleMiddleware` with the `DirectLocaleMiddleware`.
+        cached_dark_lang: Replace Open edX's `DarkLangMiddleware` with the `CachedDarkLangMiddleware`.
+        sites_by_host: The sites are resolved by their host, so the sites middleware isn't required before it.
+        profile_scope: Surround the `DefaultLocaleMiddleware`, or the whole locale block with `pipeline`, with
+                       sampling profiler markers.
     Return:
         The new MIDDLEWARE_CLASSES with the localizerx middleware.
     """
     localizerx_middleware = 'localizerx.middleware.DefaultLocaleMiddleware'
     site_middleware = 'django.contrib.sites.middleware.CurrentSiteMiddleware'
+    django_locale_middleware = 'django.middleware.locale.LocaleMiddleware'
+    direct_locale_middleware = 'localizerx.middleware.DirectLocaleMiddleware'
+    dark_lang_middleware = 'openedx.core.djangoapps.dark_lang.middleware.DarkLangMiddleware'
+    cached_dark_lang_middleware = 'localizerx.middleware.CachedDarkLangMiddleware'
 
     if localizerx_middleware in middleware_classes:
         return middleware_classes
@@ -31,12 +63,12 @@ def add_locale_middleware(middleware_classes):
     if not isinstance(middleware_classes, tuple):
         middleware_classes = tuple(middleware_classes)
 
-    LOGGER.warning('Monkeypatching MIDDLEWARE_CLASSES to add DefaultLocaleMiddleware')
+    LOGGER.warning('Monkeypatching %s to add DefaultLocaleMiddleware', setting_name)
 
     other_locale_middlewares = [
         'openedx.core.djangoapps.lang_pref.middleware.LanguagePreferenceMiddleware',
-        'openedx.core.djangoapps.dark_lang.middleware.DarkLangMiddleware',
-        'django.middleware.locale.LocaleMiddleware',
+        dark_lang_middleware,
+        django_locale_middleware,
     ]
 
     # If this broke, then this module needs an update to sync with the edX Platform default middlewares.
@@ -46,26 +78,125 @@ def add_locale_middleware(middleware_classes):
 
     first_locale_middleware_index = min(locale_middleware_indexes)
 
-    sites_middleware_index = middleware_classes.index(site_middleware)
+    if sites_by_host:
+        # The `DefaultLocaleMiddleware` doesn't need `request.site`, see `localizerx.sites.build_host_snapshot`.
+        sites_middleware_index = -1
+    else:
+        sites_middleware_index = middleware_classes.index(site_middleware)
 
     if sites_middleware_index > first_locale_middleware_index:
         raise ImproperlyConfigured(
             # This exception indicates that this package either needs an update, or no longer compatible with the edX
             # platform sites.
-            'Something is wrong with the MIDDLEWARE_CLASSES, the sites middleware was found after a locale-aware '
+            'Something is wrong with the {setting_name}, the sites middleware was found after a locale-aware '
             'middleware. The `DefaultLocaleMiddleware` cannot work in this case. original={classes}'.format(
+                setting_name=setting_name,
                 classes=middleware_classes,
             )
         )
 
     # Insert the DefaultLocaleMiddleware before any other locale-related
     # middleware in order for it to work
-    return (
+    middleware_classes = (
         middleware_classes[:first_locale_middleware_index]
         + (localizerx_middleware,)
         + middleware_classes[first_locale_middleware_index:]
     )
 
+    if direct_activation:
+        # The DefaultLocaleMiddleware activates the language itself, so there's nothing left to parse.
+        middleware_classes = tuple(
+            direct_locale_middleware if class_name == django_locale_middleware else class_name
+            for class_name in middleware_classes
+        )
+        other_locale_middlewares[-1] = direct_locale_middleware
+
+    if cached_dark_lang:
+        # The released languages are read from the LocalizerX cache instead of the `DarkLangConfig` model.
+        middleware_classes = tuple(
+            cached_dark_lang_middleware if class_name == dark_lang_middleware else class_name
+            for class_name in middleware_classes
+        )
+        other_locale_middlewares[1] = cached_dark_lang_middleware
+
+    if instrument:
+        middleware_classes = add_timing_markers(middleware_classes, [localizerx_middleware] + other_locale_middlewares)
+
+    if profile_scope:
+        middleware_classes = add_profiling_markers(
+            middleware_classes,
+            profile_scope,
+            localizerx_middleware,
+            [localizerx_middleware] + other_locale_middlewares,
+        )
+
+    return middleware_classes
+
+
+def get_api_matcher():
+    """
+    Get the compiled matcher of the `LOCALIZERX_API_URL_PREFIXES` setting.
+
+    The matcher is compiled on the first call and cached until `ENV_TOKENS` is changed.
+
+    Return: A `PathMatcher` instance.
+    """
+    matcher = _MATCHERS.get('api')
+    if matcher is None:
+        matcher = _MATCHERS['api'] = PathMatcher(get_settings_snapshot().api_url_prefixes)
+    return matcher
+
+
+def get_path_rules():
+    """
+    Get the compiled rules of the `LOCALIZERX_PATH_LANGUAGES` setting, followed by the API prefixes as passthrough.
+
+    The rules are compiled on the first call and cached until `ENV_TOKENS` is changed.
+
+    Return: A `PathRules` instance.
+    """
+    path_rules = _MATCHERS.get('path_rules')
+    if path_rules is None:
+        settings_snapshot = get_settings_snapshot()
+        path_rules = _MATCHERS['path_rules'] = PathRules(
+            settings_snapshot.path_languages,
+            settings_snapshot.api_url_prefixes,
+        )
+    return path_rules
+
+
+def get_bypass_matcher():
+    """
+    Get the compiled matcher of the `LOCALIZERX_BYPASS_URL_PREFIXES` setting.
+
+    The matcher is compiled on the first call and cached until the settings are changed.
+
+    Return: A `PathMatcher` instance.
+    """
+    matcher = _MATCHERS.get('bypass')
+    if matcher is None:
+        matcher = _MATCHERS['bypass'] = PathMatcher(get_settings_snapshot().bypass_url_prefixes)
+    return matcher
+
+
+@receiver(setting_changed)
+def reset_matchers(setting, **kwargs):  # pylint: disable=unused-argument
+    """
+    Discard the compiled matchers when the settings are modified e.g. via `override_settings`.
+    """
+    if setting in ('ENV_TOKENS', 'STATIC_URL', 'MEDIA_URL'):
+        _MATCHERS.clear()
+
+
+def get_supported_language(language_code):
+    """
+    Get the variant of the language that's available in `settings.LANGUAGES`, or None if it isn't available.
+    """
+    try:
+        return get_supported_language_variant(language_code)
+    except LookupError:
+        return None
+
 
 def is_api_request(request):
     """
@@ -75,24 +206,142 @@ def is_api_request(request):
         request: A django request.
     Return: True if the request is an API request and False otherwise.
     """
-    default_api_prefixes = [
-        '/api/',
-        '/user_api/',
-        '/notifier_api/',
-    ]
+    return request.path in get_api_matcher()
+
 
-    api_prefixes = settings.ENV_TOKENS.get('LOCALIZERX_API_URL_PREFIXES', default_api_prefixes)
+def is_direct_activation_enabled():
+    """
+    Check if the `DefaultLocaleMiddleware` should activate the language itself instead of Django's `LocaleMiddleware`.
+    """
+    return get_settings_snapshot().direct_activation
 
-    for prefix in api_prefixes:
-        if request.path.startswith(prefix):
-            return True
 
-    return False
+def is_vary_normalization_enabled():
+    """
+    Check if the `Vary: Accept-Language` response header should be replaced for the pages in the site language.
+    """
+    return get_settings_snapshot().normalize_vary
 
 
 def is_feature_enabled():
     """
     Check if the feature is enabled for the Site or for the platform as a whole.
     """
-    is_enabled_in_platform = settings.FEATURES.get('ENABLE_LOCALIZERX', False)
-    return configuration_helpers.get_value('ENABLE_LOCALIZERX', is_enabled_in_platform)
+    return configuration_helpers.get_value('ENABLE_LOCALIZERX', get_settings_snapshot().feature_enabled)
+
+
+def truncate_accept_language(header, max_length=None):
+    """
+    Bound the length of an `Accept-Language` header.
+
+    A header longer than `LOCALIZERX_ACCEPT_LANGUAGE_MAX_LENGTH` is cut after its last entry that fits,
+    like Django 4.2 does.
+
+    Args:
+        header: The raw `Accept-Language` header.
+        max_length: The maximum length, `LOCALIZERX_ACCEPT_LANGUAGE_MAX_LENGTH` by default.
+    Return: The header, or its complete entries that fit in `max_length` characters.
+    """
+    if max_length is None:
+        max_length = get_settings_snapshot().accept_language_max_length
+    if len(header) <= max_length:
+        return header
+    return header[:max(header.rfind(',', 0, max_length + 1), 0)]
+
+
+def parse_accept_language(header):
+    """
+    Parse an `Accept-Language` header.
+
+    Malformed entries and the ones with a zero quality are skipped. The cost is bounded: the header is truncated to
+    `LOCALIZERX_ACCEPT_LANGUAGE_MAX_LENGTH` characters, and only its first `LOCALIZERX_ACCEPT_LANGUAGE_MAX_ENTRIES`
+    entries are parsed.
+
+    Args:
+        header: The raw `Accept-Language` header e.g. `en-US,en;q=0.9,ar;q=0.8`.
+    Return:
+        A list of `(language, quality)` tuples with lowercase languages, ordered by descending quality.
+        Entries with the same quality keep their order in the header.
+    """
+    settings_snapshot = get_settings_snapshot()
+    header = truncate_accept_language(header, settings_snapshot.accept_language_max_length)
+    max_entries = settings_snapshot.accept_language_max_entries
+
+    languages = []
+    for entry in header.split(',', max_entries)[:max_entries]:
+        language, _sep, params = entry.partition(';')
+        language = language.strip()
+        if not LANGUAGE_RANGE_RE.match(language):
+            continue
+
+        quality = 1.0
+        params = params.strip()
+        if params:
+            name, _sep, value = params.partition('=')
+            if name.strip() != 'q':
+                continue
+            try:
+                quality = float(value)
+            except ValueError:
+                continue
+            if not 0 < quality <= 1:
+                continue
+
+        languages.append((language.lower(), quality))
+
+    languages.sort(key=lambda language: -language[1])
+    return languages
+
+
+def find_supported_language(language, supported_languages):
+    """
+    Find the supported language that best matches a browser language.
+
+    Args:
+        language: A lowercase language e.g. `ar-sa`.
+        supported_languages: A tuple of the supported languages.
+    Return:
+        The exact language if supported, otherwise its generic language e.g. `ar`, otherwise a supported variant
+        of the generic language e.g. `ar-eg`. None if nothing matches.
+    """
+    lowercase_languages = [supported.lower() for supported in supported_languages]
+    if language in lowercase_languages:
+        return supported_languages[lowercase_languages.index(language)]
+
+    generic_language = language.split('-')[0]
+    if generic_language in lowercase_languages:
+        return supported_languages[lowercase_languages.index(generic_language)]
+
+    for index, supported in enumerate(lowercase_languages):
+        if supported.split('-')[0] == generic_language:
+            return supported_languages[index]
+
+    return None
+
+
+def negotiate_language(header, supported_languages, default):
+    """
+    Pick the browser's most preferred language out of the supported languages.
+
+    The result is cached per header and supported languages, so repeated headers cost a dict lookup.
+    The headers are truncated first, so the pathological ones can't fill the cache with huge keys.
+
+    Args:
+        header: The raw `Accept-Language` header.
+        supported_languages: A tuple of the languages the site allows.
+        default: The language to use if the browser doesn't accept any of the supported languages.
+    Return:
+        One of the `supported_languages` or `default`.
+    """
+    header = truncate_accept_language(header)
+    key = (header, supported_languages, default)
+    language = _NEGOTIATIONS.get(key)
+    if language is None:
+        language = default
+        for browser_language, _quality in parse_accept_language(header):
+            supported = find_supported_language(browser_language, supported_languages)
+            if supported is not None:
+                language = supported
+                break
+        _NEGOTIATIONS.set(key, language)
+    return language
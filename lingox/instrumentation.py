@@ -0,0 +1,504 @@
+"""
+Opt-in latency instrumentation of the locale middleware pipeline.
+
+When `LOCALIZERX_INSTRUMENTATION` is enabled, `add_locale_middleware` surrounds the locale-aware middlewares with
+`LocaleTimingMiddleware` markers. The time spent between two markers is recorded in per-thread histograms, so
+recording never takes a lock, and the histograms are periodically exported in the Prometheus text format or as
+statsd lines.
+
+Nothing is installed when the instrumentation is disabled, so it costs nothing.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import atexit
+import logging
+import os
+import socket
+import threading
+from bisect import bisect_left
+from timeit import default_timer
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+LOGGER = logging.getLogger(__name__)
+
+TIMING_MIDDLEWARE = 'localizerx.middleware.LocaleTimingMiddleware'
+
+# Upper bounds of the histogram buckets in seconds, the last bucket is unbounded.
+BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+)
+
+# The label of the time spent between the first and the last markers.
+PIPELINE_STAGE = 'pipeline'
+
+METRIC_NAME = 'localizerx_locale_stage_seconds'
+
+# The requests the `DefaultLocaleMiddleware` left untouched because of `LOCALIZERX_BYPASS_URL_PREFIXES`.
+BYPASSED_REQUESTS = 'bypassed_requests'
+
+COUNTER_DESCRIPTIONS = {
+    BYPASSED_REQUESTS: 'Requests that skipped the LocalizerX middleware.',
+}
+
+DEFAULT_EXPORT_INTERVAL = 60  # In seconds.
+
+
+class Histogram(object):
+    """
+    Cumulative histogram of durations with fixed buckets.
+
+    Instances are owned by a single thread, so updating them doesn't need a lock.
+    """
+
+    __slots__ = ('counts', 'total')
+
+    def __init__(self):
+        """
+        Initialize an empty histogram.
+        """
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+
+    def observe(self, seconds):
+        """
+        Record a duration.
+        """
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+
+    def merge(self, other):
+        """
+        Add the observations of another histogram to this one.
+        """
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.total += other.total
+
+    @property
+    def count(self):
+        """
+        Get the number of observations.
+        """
+        return sum(self.counts)
+
+
+class Registry(object):
+    """
+    Hold the histograms and the counters of all the threads.
+
+    The data of the threads that have exited is merged into the retired totals when the registry is collected, so
+    the registry doesn't grow with the servers that start a thread per request or recycle their threads.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty registry.
+        """
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # The `{thread: dict}` data of the live threads, and the merged data of the threads that have exited.
+        self._thread_histograms = {}
+        self._thread_counters = {}
+        self._retired_histograms = {}
+        self._retired_counters = {}
+
+    def get_histograms(self):
+        """
+        Get the histograms of the current thread, as a `{(stage, phase): Histogram}` dict.
+        """
+        histograms = getattr(self._local, 'histograms', None)
+        if histograms is None:
+            histograms = self._local.histograms = {}
+            with self._lock:
+                # Only taken once per thread.
+                self._thread_histograms[threading.current_thread()] = histograms
+        return histograms
+
+    def get_counters(self):
+        """
+        Get the counters of the current thread, as a `{name: count}` dict.
+        """
+        counters = getattr(self._local, 'counters', None)
+        if counters is None:
+            counters = self._local.counters = {}
+            with self._lock:
+                # Only taken once per thread.
+                self._thread_counters[threading.current_thread()] = counters
+        return counters
+
+    def increment(self, name):
+        """
+        Count an event in the current thread.
+        """
+        counters = self.get_counters()
+        counters[name] = counters.get(name, 0) + 1
+
+    def observe(self, stage, phase, seconds):
+        """
+        Record a duration of a stage in the current thread.
+        """
+        histograms = self.get_histograms()
+        histogram = histograms.get((stage, phase))
+        if histogram is None:
+            histogram = histograms[(stage, phase)] = Histogram()
+        histogram.observe(seconds)
+
+    def retire_dead_threads(self):
+        """
+        Merge the data of the threads that have exited into the retired totals, and forget the threads.
+
+        Should be called with the lock held. The exited threads can't update their data anymore.
+        """
+        for thread in [thread for thread in self._thread_histograms if not thread.is_alive()]:
+            for key, histogram in self._thread_histograms.pop(thread).items():
+                self._retired_histograms.setdefault(key, Histogram()).merge(histogram)
+        for thread in [thread for thread in self._thread_counters if not thread.is_alive()]:
+            for name, count in self._thread_counters.pop(thread).items():
+                self._retired_counters[name] = self._retired_counters.get(name, 0) + count
+
+    def collect(self):
+        """
+        Merge the histograms of all the threads.
+
+        Return: A `{(stage, phase): Histogram}` dict.
+        """
+        merged = {}
+        with self._lock:
+            self.retire_dead_threads()
+            thread_histograms = list(self._thread_histograms.values())
+            for key, histogram in self._retired_histograms.items():
+                merged.setdefault(key, Histogram()).merge(histogram)
+
+        for histograms in thread_histograms:
+            for key, histogram in list(histograms.items()):
+                merged.setdefault(key, Histogram()).merge(histogram)
+        return merged
+
+    def collect_counters(self):
+        """
+        Sum the counters of all the threads.
+
+        Return: A `{name: count}` dict.
+        """
+        with self._lock:
+            self.retire_dead_threads()
+            thread_counters = list(self._thread_counters.values())
+            totals = dict(self._retired_counters)
+
+        for counters in thread_counters:
+            for name, count in list(counters.items()):
+                totals[name] = totals.get(name, 0) + count
+        return totals
+
+    def clear(self):
+        """
+        Discard all the observations and counts.
+        """
+        with self._lock:
+            for histograms in self._thread_histograms.values():
+                histograms.clear()
+            for counters in self._thread_counters.values():
+                counters.clear()
+            self._retired_histograms.clear()
+            self._retired_counters.clear()
+
+
+REGISTRY = Registry()
+
+
+def format_bound(bound):
+    """
+    Format a bucket bound as a Prometheus `le` label value.
+    """
+    return '{bound!r}'.format(bound=bound)
+
+
+def render_prometheus(histograms, counters=None):
+    """
+    Render the histograms and the counters in the Prometheus text exposition format.
+    """
+    lines = [
+        '# HELP {name} Time spent in the locale middleware stages.'.format(name=METRIC_NAME),
+        '# TYPE {name} histogram'.format(name=METRIC_NAME),
+    ]
+    pid = os.getpid()
+
+    for (stage, phase), histogram in sorted(histograms.items()):
+        labels = 'stage="{stage}",phase="{phase}",pid="{pid}"'.format(stage=stage, phase=phase, pid=pid)
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+            cumulative += count
+            lines.append('{name}_bucket{{{labels},le="{bound}"}} {count}'.format(
+                name=METRIC_NAME,
+                labels=labels,
+                bound=bound if bound == '+Inf' else format_bound(bound),
+                count=cumulative,
+            ))
+        lines.append('{name}_sum{{{labels}}} {total!r}'.format(name=METRIC_NAME, labels=labels, total=histogram.total))
+        lines.append('{name}_count{{{labels}}} {count}'.format(name=METRIC_NAME, labels=labels, count=cumulative))
+
+    for counter, count in sorted((counters or {}).items()):
+        name = 'localizerx_{counter}_total'.format(counter=counter)
+        lines.append('# HELP {name} {description}'.format(name=name, description=COUNTER_DESCRIPTIONS.get(counter, '')))
+        lines.append('# TYPE {name} counter'.format(name=name))
+        lines.append('{name}{{pid="{pid}"}} {count}'.format(name=name, pid=pid, count=count))
+
+    return '\n'.join(lines) + '\n'
+
+
+def render_statsd(histograms, previous, prefix='localizerx.locale_stage', counters=None, previous_counters=None):
+    """
+    Render the change of the histograms and the counters since the `previous` export as statsd counters.
+
+    Return: A list of statsd lines.
+    """
+    lines = []
+    for (stage, phase), histogram in sorted(histograms.items()):
+        before = previous.get((stage, phase)) or Histogram()
+        metric = '{prefix}.{stage}.{phase}'.format(prefix=prefix, stage=stage, phase=phase)
+
+        count = histogram.count - before.count
+        if not count:
+            continue
+
+        lines.append('{metric}.count:{value}|c'.format(metric=metric, value=count))
+        lines.append('{metric}.sum_ms:{value:.3f}|c'.format(
+            metric=metric, value=(histogram.total - before.total) * 1000,
+        ))
+        for bound, bucket_count, bucket_before in zip(BUCKETS + ('inf',), histogram.counts, before.counts):
+            if bucket_count != bucket_before:
+                bucket = bound if bound == 'inf' else '{micros:d}us'.format(micros=int(round(bound * 1e6)))
+                lines.append('{metric}.le_{bucket}:{value}|c'.format(
+                    metric=metric, bucket=bucket, value=bucket_count - bucket_before,
+                ))
+
+    previous_counters = previous_counters or {}
+    for counter, count in sorted((counters or {}).items()):
+        count -= previous_counters.get(counter, 0)
+        if count:
+            lines.append('localizerx.{counter}:{value}|c'.format(counter=counter, value=count))
+    return lines
+
+
+class Exporter(object):
+    """
+    Periodically write the histograms to a file or a local socket.
+
+    Targets:
+        - `udp://host:port` sends statsd lines over UDP.
+        - `unix:///path/to/socket` sends statsd lines over a Unix datagram socket.
+        - Any other value is a file path, which may contain `{pid}`. The Prometheus format replaces the file
+          on every export (suitable for the node_exporter textfile collector), the statsd format appends to it.
+    """
+
+    def __init__(self, registry, target, export_format='prometheus', interval=DEFAULT_EXPORT_INTERVAL):
+        """
+        Initialize the exporter.
+        """
+        if export_format not in ('prometheus', 'statsd'):
+            raise ValueError('Unknown metrics format: {export_format}'.format(export_format=export_format))
+
+        self.registry = registry
+        self.target = target
+        self.format = export_format
+        self.interval = interval
+        self.next_export_at = default_timer() + interval
+        self._lock = threading.Lock()
+        self._previous = {}
+        self._previous_counters = {}
+
+    def is_export_due(self):
+        """
+        Check whether the next recorded request exports the histograms.
+        """
+        return default_timer() >= self.next_export_at
+
+    def maybe_export(self):
+        """
+        Export the histograms if the interval has elapsed, without blocking if another thread is exporting.
+        """
+        if not self.is_export_due():
+            return
+
+        if self._lock.acquire(False):
+            try:
+                self.next_export_at = default_timer() + self.interval
+                self.export()
+            finally:
+                self._lock.release()
+
+    def export(self):
+        """
+        Export the histograms now.
+        """
+        histograms = self.registry.collect()
+        counters = self.registry.collect_counters()
+        try:
+            if self.format == 'prometheus':
+                self.write_file(render_prometheus(histograms, counters), mode='replace')
+            else:
+                lines = render_statsd(
+                    histograms, self._previous, counters=counters, previous_counters=self._previous_counters,
+                )
+                if lines:
+                    self.send_lines(lines)
+            self._previous = histograms
+            self._previous_counters = counters
+        except (IOError, OSError, socket.error):
+            LOGGER.exception('Could not export the LocalizerX metrics to %s', self.target)
+
+    def send_lines(self, lines):
+        """
+        Send statsd lines to the target.
+        """
+        if self.target.startswith('udp://'):
+            host, _sep, port = self.target[len('udp://'):].rpartition(':')
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            address = (host, int(port))
+        elif self.target.startswith('unix://'):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            address = self.target[len('unix://'):]
+        else:
+            self.write_file('\n'.join(lines) + '\n', mode='append')
+            return
+
+        try:
+            for line in lines:
+                sock.sendto(line.encode('utf-8'), address)
+        finally:
+            sock.close()
+
+    def write_file(self, content, mode):
+        """
+        Write the content to the target file, replacing it atomically or appending to it.
+        """
+        path = self.target.format(pid=os.getpid())
+        if mode == 'append':
+            with open(path, 'a') as metrics_file:
+                metrics_file.write(content)
+        else:
+            temp_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+            with open(temp_path, 'w') as metrics_file:
+                metrics_file.write(content)
+            os.rename(temp_path, path)
+
+
+# Lazily configured state: the stage labels and the exporter.
+_STATE = {}
+
+
+def is_instrumentation_enabled():
+    """
+    Check whether the locale pipeline instrumentation is enabled.
+    """
+    return bool(settings.ENV_TOKENS.get('LOCALIZERX_INSTRUMENTATION', False))
+
+
+def get_exporter():
+    """
+    Get the configured exporter, or None if `LOCALIZERX_METRICS_TARGET` isn't configured.
+    """
+    if 'exporter' not in _STATE:
+        target = settings.ENV_TOKENS.get('LOCALIZERX_METRICS_TARGET')
+        exporter = None
+        if target:
+            exporter = Exporter(
+                REGISTRY,
+                target=target,
+                export_format=settings.ENV_TOKENS.get('LOCALIZERX_METRICS_FORMAT', 'prometheus'),
+                interval=settings.ENV_TOKENS.get('LOCALIZERX_METRICS_INTERVAL', DEFAULT_EXPORT_INTERVAL),
+            )
+        _STATE['exporter'] = exporter
+    return _STATE['exporter']
+
+
+@atexit.register
+def export_at_exit():
+    """
+    Export the last observations when the process exits.
+    """
+    exporter = _STATE.get('exporter')
+    if exporter is not None:
+        exporter.export()
+
+
+def get_stage_labels():
+    """
+    Get the labels of the gaps between the timing markers in the configured middlewares.
+
+    A gap between two markers is labeled with the class name of the single middleware between them,
+    or None if there are zero or many middlewares between them. A middleware that sits between two locale-aware
+    middlewares gets timed as well, since it's surrounded by their markers.
+    """
+    labels = _STATE.get('labels')
+    if labels is None:
+        middlewares = getattr(settings, 'MIDDLEWARE', None)
+        if middlewares is None:
+            middlewares = settings.MIDDLEWARE_CLASSES
+
+        positions = [index for index, name in enumerate(middlewares) if name == TIMING_MIDDLEWARE]
+        labels = _STATE['labels'] = [
+            middlewares[start + 1].rpartition('.')[2] if end - start == 2 else None
+            for start, end in zip(positions, positions[1:])
+        ]
+    return labels
+
+
+def record_marks(request_marks, response_marks):
+    """
+    Record the stage timings of a request out of its marker timestamps.
+
+    Args:
+        request_marks: The timestamps of the markers when the request went in, outermost first.
+        response_marks: The timestamps of the markers when the response went out, innermost first.
+    """
+    labels = get_stage_labels()
+    if len(request_marks) != len(labels) + 1 or len(response_marks) != len(request_marks):
+        # The request was short-circuited before going through all the markers.
+        return
+
+    last = len(labels)
+    for index, label in enumerate(labels):
+        if label is not None:
+            REGISTRY.observe(label, 'request', request_marks[index + 1] - request_marks[index])
+            REGISTRY.observe(label, 'response', response_marks[last - index] - response_marks[last - index - 1])
+
+    REGISTRY.observe(PIPELINE_STAGE, 'request', request_marks[-1] - request_marks[0])
+    REGISTRY.observe(PIPELINE_STAGE, 'response', response_marks[-1] - response_marks[0])
+
+    exporter = get_exporter()
+    if exporter is not None:
+        exporter.maybe_export()
+
+
+def add_timing_markers(middleware_classes, stage_middlewares):
+    """
+    Surround each of the stage middlewares with timing markers.
+
+    Args:
+        middleware_classes: The middlewares tuple.
+        stage_middlewares: The middlewares to time.
+    Return:
+        The new middlewares tuple.
+    """
+    instrumented = []
+    for class_name in middleware_classes:
+        is_stage = class_name in stage_middlewares
+        if is_stage and (not instrumented or instrumented[-1] != TIMING_MIDDLEWARE):
+            instrumented.append(TIMING_MIDDLEWARE)
+        instrumented.append(class_name)
+        if is_stage:
+            instrumented.append(TIMING_MIDDLEWARE)
+    return tuple(instrumented)
+
+
+@receiver(setting_changed)
+def reset_instrumentation(**kwargs):  # pylint: disable=unused-argument
+    """
+    Discard the stage labels and the exporter when the settings are modified e.g. via `override_settings`.
+    """
+    _STATE.clear()
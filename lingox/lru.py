@@ -0,0 +1,93 @@
+"""
+A small thread-safe LRU cache with an optional time-to-live for the LocalizerX module.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import threading
+from collections import OrderedDict
+from timeit import default_timer
+
+
+class LRUCache(object):
+    """
+    Bounded mapping that evicts the least recently used entries.
+
+    Entries older than `ttl` seconds are treated as missing. A `None` ttl keeps the entries until they're evicted.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        """
+        Initialize an empty cache.
+
+        Args:
+            maxsize: The maximum number of entries to keep.
+            ttl: The number of seconds an entry is considered fresh, or None to never expire the entries.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Get a fresh value from the cache, marking it as recently used.
+        """
+        with self._lock:
+            try:
+                value, expires_at = self._data.pop(key)
+            except KeyError:
+                return default
+
+            if expires_at is not None and expires_at < default_timer():
+                return default
+
+            # Re-insert to move the entry to the most recently used end.
+            self._data[key] = (value, expires_at)
+            return value
+
+    def set(self, key, value):
+        """
+        Store a value in the cache, evicting the least recently used entries if needed.
+        """
+        expires_at = None if self.ttl is None else default_timer() + self.ttl
+
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires_at)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """
+        Remove an entry from the cache and return its value.
+        """
+        with self._lock:
+            value, _expires_at = self._data.pop(key, (default, None))
+            return value
+
+    def clear(self):
+        """
+        Remove all the entries from the cache.
+        """
+        with self._lock:
+            self._data.clear()
+
+    def keys(self):
+        """
+        Get a list of the stored keys, including the expired ones that weren't evicted yet.
+        """
+        with self._lock:
+            return list(self._data)
+
+    def __len__(self):
+        """
+        Get the number of the entries stored, including the expired ones that weren't evicted yet.
+        """
+        return len(self._data)
+
+    def __contains__(self, key):
+        """
+        Check whether a fresh value is stored for the key.
+        """
+        missing = object()
+        return self.get(key, missing) is not missing
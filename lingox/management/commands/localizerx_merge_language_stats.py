@@ -0,0 +1,66 @@
+"""
+Merge the language stats files of the worker processes, see `localizerx.stats`.
+"""
+from __future__ import absolute_import, unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+
+from localizerx.config import DEFAULT_LANGUAGE_STATS_CAPACITY
+from localizerx.stats import LanguageStats, load_stats_file, write_stats_file
+
+ROW_FORMAT = '{site:<30} {browser:<10} {enforced:<10} {requests:>12} {share:>8}'
+
+
+class Command(BaseCommand):
+    """
+    Print the browser and enforced languages of each site, out of the stats files of all the workers.
+    """
+
+    help = (
+        'Merge the LocalizerX language stats files written by the worker processes, and print the most frequent '
+        'browser and enforced languages of each site.'
+    )
+
+    def add_arguments(self, parser):
+        """
+        Add the stats files and the merge options.
+        """
+        parser.add_argument('stats_files', nargs='+', help='The stats files of the workers, or merged ones.')
+        parser.add_argument(
+            '--top', type=int, default=DEFAULT_LANGUAGE_STATS_CAPACITY,
+            help='The number of tallies to keep, the most frequent first.',
+        )
+        parser.add_argument('--output', help='Also write the merged stats to this file, which can be merged again.')
+
+    def handle(self, *args, **options):
+        """
+        Merge the files and print the most frequent tallies.
+        """
+        merged = LanguageStats(None, interval=0, capacity=options['top'])
+        for path in options['stats_files']:
+            try:
+                merged.merge(load_stats_file(path))
+            except (IOError, OSError, ValueError) as error:
+                raise CommandError('Could not merge {path}: {error}'.format(path=path, error=error))
+
+        if options['output']:
+            write_stats_file(merged, options['output'])
+        self.report(merged)
+
+    def report(self, stats):
+        """
+        Print the tallies and their share of all the requests.
+        """
+        total = stats.sketch.total
+        self.stdout.write(ROW_FORMAT.format(
+            site='site', browser='browser', enforced='enforced', requests='requests', share='share',
+        ))
+        for site, browser_language, language, estimate in stats.top():
+            self.stdout.write(ROW_FORMAT.format(
+                site=site,
+                browser=browser_language,
+                enforced=language,
+                requests=estimate,
+                share='{share:.1%}'.format(share=float(estimate) / total),
+            ))
+        self.stdout.write(ROW_FORMAT.format(site='total', browser='', enforced='', requests=total, share=''))
@@ -0,0 +1,143 @@
+"""
+Replay access logs through the LocalizerX decisions, to see what enabling it or changing its settings would do.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import multiprocessing
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import override_settings
+
+from localizerx.replay import (COMBINED_LOG_RE, DEFAULT_CHUNK_SIZE, DEFAULT_MAX_GROUPS, OTHER, OUTCOMES, UNPARSED,
+                               count_outcomes, count_outcomes_in_pool, open_log, summarize)
+from localizerx.site_warmup import warm_up_site_snapshots
+
+ROW_FORMAT = '{host:<30} {prefix:<30} {patched:>10} {passthrough:>12} {bypassed:>10} {disabled:>10} {total:>10}'
+
+
+def read_lines(paths):
+    """
+    Stream the lines of the log files one after the other.
+    """
+    for path in paths:
+        with open_log(path) as log_file:
+            for line in log_file:
+                yield line
+
+
+def get_pool(processes):
+    """
+    Start a pool of forked processes, which inherit the configured Django settings.
+    """
+    # The forked processes shouldn't share the database connections.
+    connections.close_all()
+    try:
+        context = multiprocessing.get_context('fork')
+    except AttributeError:  # Python 2 always forks.
+        context = multiprocessing
+    return context.Pool(processes)
+
+
+class Command(BaseCommand):
+    """
+    Count the requests LocalizerX would patch, pass through and bypass, per site and path prefix.
+    """
+
+    help = (
+        'Replay access logs (gzip supported) through the LocalizerX decisions, and count the patched, passthrough '
+        'e.g. API, bypassed and disabled requests per site and path prefix.'
+    )
+
+    def add_arguments(self, parser):
+        """
+        Add the log files and the replay options.
+        """
+        parser.add_argument('log_files', nargs='+', help='The access log files, the `.gz` ones are decompressed.')
+        parser.add_argument(
+            '--log-format', default=COMBINED_LOG_RE,
+            help='Regular expression of a log line with a `path` group, and optional `host` and `accept_language` '
+                 'groups. Defaults to the nginx combined format, which gunicorn uses as well.',
+        )
+        parser.add_argument(
+            '--host', default='localhost', help='The site of the lines without a `host`. Defaults to `localhost`.',
+        )
+        parser.add_argument(
+            '--depth', type=int, default=1, help='The number of path segments to group the requests by.',
+        )
+        parser.add_argument(
+            '--processes', type=int, default=0, help='Replay in a pool of processes, in the command by default.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Lines per process task.')
+        parser.add_argument(
+            '--max-groups', type=int, default=DEFAULT_MAX_GROUPS,
+            help='The maximum number of sites and path prefixes to count separately, the others are counted under '
+                 '`{other}`. Defaults to {default}.'.format(other=OTHER, default=DEFAULT_MAX_GROUPS),
+        )
+        parser.add_argument(
+            '--enable', action='store_true',
+            help='Replay as if `FEATURES["ENABLE_LOCALIZERX"]` was enabled, the site configurations still apply.',
+        )
+        parser.add_argument(
+            '--api-prefix', action='append', dest='api_prefixes',
+            help='Replay with these `LOCALIZERX_API_URL_PREFIXES` instead, can be repeated.',
+        )
+
+    def handle(self, *args, **options):
+        """
+        Replay the logs with the simulated settings, and print the counts.
+        """
+        overrides = {}
+        if options['enable']:
+            overrides['FEATURES'] = dict(settings.FEATURES, ENABLE_LOCALIZERX=True)
+        if options['api_prefixes']:
+            overrides['ENV_TOKENS'] = dict(settings.ENV_TOKENS, LOCALIZERX_API_URL_PREFIXES=options['api_prefixes'])
+
+        with override_settings(**overrides):
+            # The sites dumped by `localizerx_warmup_sites` are replayed with their own configuration.
+            warm_up_site_snapshots()
+            counts = self.replay(options)
+        self.report(counts)
+
+    def replay(self, options):  # pylint: disable=no-self-use
+        """
+        Count the outcomes of the logged requests.
+        """
+        lines = read_lines(options['log_files'])
+        args = (options['log_format'], options['host'], options['depth'])
+        if options['processes'] <= 0:
+            return count_outcomes(lines, *args, max_groups=options['max_groups'])
+
+        pool = get_pool(options['processes'])
+        try:
+            return count_outcomes_in_pool(
+                lines, *args, pool=pool, processes=options['processes'], chunk_size=options['chunk_size'],
+                max_groups=options['max_groups']
+            )
+        finally:
+            pool.close()
+            pool.join()
+
+    def report(self, counts):
+        """
+        Print the counts of each site and path prefix, and the totals.
+        """
+        self.stdout.write(ROW_FORMAT.format(host='site', prefix='prefix', total='total', **{
+            outcome: outcome for outcome in OUTCOMES
+        }))
+
+        totals = Counter()
+        for host, prefix, outcomes in summarize(counts):
+            totals.update(outcomes)
+            self.stdout.write(ROW_FORMAT.format(host=host, prefix=prefix, total=sum(outcomes.values()), **{
+                outcome: outcomes[outcome] for outcome in OUTCOMES
+            }))
+
+        self.stdout.write(ROW_FORMAT.format(host='total', prefix='', total=sum(totals.values()), **{
+            outcome: totals[outcome] for outcome in OUTCOMES
+        }))
+        unparsed = counts[(None, None, UNPARSED)]
+        if unparsed:
+            self.stderr.write('{count} lines did not match the log format.'.format(count=unparsed))
@@ -0,0 +1,50 @@
+"""
+Dump the LocalizerX values of all the sites, for the workers to load when they start, see `localizerx.site_warmup`.
+"""
+from __future__ import absolute_import, unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+
+from localizerx.config import get_settings_snapshot
+from localizerx.site_warmup import dump_site_snapshots, write_site_snapshots
+
+
+class Command(BaseCommand):
+    """
+    Write the LocalizerX values of all the enabled sites to the shared cache and/or a file.
+    """
+
+    help = (
+        'Read the LocalizerX configuration of all the enabled sites in one query, and write it to the '
+        '`LOCALIZERX_SITE_SNAPSHOTS_CACHE` shared cache and/or the `LOCALIZERX_SITE_SNAPSHOTS_PATH` file, '
+        'which the workers load when they start.'
+    )
+
+    def add_arguments(self, parser):
+        """
+        Add the destination options.
+        """
+        parser.add_argument('--output', help='Write to this file instead of `LOCALIZERX_SITE_SNAPSHOTS_PATH`.')
+        parser.add_argument('--cache', help='Write to this cache alias instead of `LOCALIZERX_SITE_SNAPSHOTS_CACHE`.')
+
+    def handle(self, *args, **options):
+        """
+        Dump the site values and write them.
+        """
+        settings_snapshot = get_settings_snapshot()
+        path = options['output'] or settings_snapshot.site_snapshots_path
+        cache_alias = options['cache'] or settings_snapshot.site_snapshots_cache
+        if not path and not cache_alias:
+            raise CommandError(
+                'Configure LOCALIZERX_SITE_SNAPSHOTS_PATH or LOCALIZERX_SITE_SNAPSHOTS_CACHE, '
+                'or use the --output or --cache options.'
+            )
+
+        data = dump_site_snapshots()
+        write_site_snapshots(data, path, cache_alias)
+        self.stdout.write('Wrote the LocalizerX values of {count} sites to {destinations}.'.format(
+            count=len(data['sites']),
+            destinations=' and '.join(
+                destination for destination in (path, cache_alias and 'the {} cache'.format(cache_alias)) if destination
+            ),
+        ))
@@ -0,0 +1,298 @@
+"""
+Compiled URL path matchers for the LocalizerX module.
+
+A list of path patterns is compiled once into regular expressions so that checking a path costs
+a single pass over it, regardless of how many patterns are configured.
+
+Three kinds of patterns are supported:
+
+- Plain prefixes e.g. ``/api/``, which match any path starting with them.
+- Shell-style wildcards e.g. ``/courses/*/xblock/``, which are recognized by the ``*``, ``?`` or ``[``
+  characters and match any path starting with the expanded pattern.
+- Regular expressions e.g. ``^/courses/[^/]+/xblock/``, which are recognized by the leading ``^``.
+
+The expressions are combined into a single alternation, so the ones that don't compile on their own or that use
+named groups or backreferences, which would clash once combined, are logged and skipped.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import re
+
+LOGGER = logging.getLogger(__name__)
+
+GLOB_CHARACTERS = ('*', '?', '[')
+
+# Numbered backreferences e.g. `\1`, but not an escaped backslash followed by a digit, and named backreferences.
+BACKREFERENCE_REGEX = re.compile(r'(?<!\\)(?:\\\\)*\\[1-9]|\(\?P=')
+
+
+def translate_glob(pattern):
+    """
+    Translate a shell-style wildcard pattern into a regular expression that matches path prefixes.
+
+    Unlike `fnmatch.translate` the result is not anchored at the end, so `/courses/*/xblock/`
+    matches `/courses/edX+DemoX/xblock/block-v1:edX/handler/`.
+    """
+    index, length = 0, len(pattern)
+    parts = []
+
+    while index < length:
+        char = pattern[index]
+        index += 1
+
+        if char == '*':
+            parts.append('.*')
+        elif char == '?':
+            parts.append('.')
+        elif char == '[':
+            end = index
+            if end < length and pattern[end] == '!':
+                end += 1
+            if end < length and pattern[end] == ']':
+                end += 1
+            while end < length and pattern[end] != ']':
+                end += 1
+
+            if end >= length:
+                # Unbalanced bracket, treat it as a literal character.
+                parts.append(re.escape(char))
+            else:
+                chars = pattern[index:end].replace('\\', '\\\\')
+                index = end + 1
+                if chars.startswith('!'):
+                    chars = '^' + chars[1:]
+                elif chars.startswith('^'):
+                    chars = '\\' + chars
+                parts.append('[{chars}]'.format(chars=chars))
+        else:
+            parts.append(re.escape(char))
+
+    return ''.join(parts)
+
+
+def compile_expression(pattern, expression):
+    """
+    Compile a regular expression on its own before combining it with the others.
+
+    Args:
+        pattern: The path pattern as configured, for the logs.
+        expression: The regular expression of the pattern.
+    Return:
+        The compiled expression, or None if it's invalid or can't be combined.
+    """
+    try:
+        compiled = re.compile('({expression})'.format(expression=expression))
+    except re.error as error:
+        LOGGER.warning('Skipping the invalid path pattern %r: %s', pattern, error)
+        return None
+
+    if compiled.groupindex or BACKREFERENCE_REGEX.search(expression):
+        LOGGER.warning('Skipping the path pattern %r, named groups and backreferences are not supported.', pattern)
+        return None
+
+    return compiled
+
+
+def _build_trie(prefixes):
+    """
+    Build a character trie out of `(index, prefix)` pairs.
+
+    Each node is a dict of `{char: child_node}`, the special `None` key holds the lowest index of the prefixes
+    ending at that node.
+    """
+    root = {}
+    for index, prefix in prefixes:
+        node = root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[None] = min(index, node.get(None, index))
+    return root
+
+
+def _trie_to_regex(node, best_index, group_indexes):
+    """
+    Convert a trie node into a regular expression.
+
+    Every node that terminates a prefix emits an empty capturing group. Since the children of a node never start
+    with the same character the expression never backtracks more than one level, and the last group matched is
+    always the deepest prefix found in the path. That group is mapped (through `group_indexes`) to the lowest index
+    of all the prefixes found along the way, which is the first pattern in declaration order that matches the path.
+    """
+    parts = []
+
+    while True:
+        is_terminal = None in node
+        children = sorted(key for key in node if key is not None)
+
+        if is_terminal:
+            best_index = node[None] if best_index is None else min(best_index, node[None])
+            group_indexes.append(best_index)
+            parts.append('()')
+
+        if len(children) == 1 and not is_terminal:
+            # Compress single-child chains into plain literals.
+            parts.append(re.escape(children[0]))
+            node = node[children[0]]
+            continue
+
+        if children:
+            alternatives = '|'.join(
+                re.escape(char) + _trie_to_regex(node[char], best_index, group_indexes)
+                for char in children
+            )
+            parts.append('(?:{alternatives}){optional}'.format(
+                alternatives=alternatives,
+                optional='?' if is_terminal else '',
+            ))
+
+        return ''.join(parts)
+
+
+class PathMatcher(object):
+    """
+    Match URL paths against an ordered list of prefix, wildcard and regular expression patterns.
+
+    `match()` returns the index of the first pattern, in declaration order, that matches the path. The invalid
+    patterns are skipped and never match.
+    """
+
+    def __init__(self, patterns):
+        """
+        Compile the patterns.
+
+        Args:
+            patterns: An iterable of path patterns.
+        """
+        self.patterns = tuple(patterns)
+
+        prefixes = []
+        expressions = []
+        for index, pattern in enumerate(self.patterns):
+            if pattern.startswith('^'):
+                expressions.append((index, pattern[1:]))
+            elif any(char in pattern for char in GLOB_CHARACTERS):
+                expressions.append((index, translate_glob(pattern)))
+            else:
+                prefixes.append((index, pattern))
+
+        self._prefix_regex = None
+        self._prefix_indexes = [None]
+        if prefixes:
+            group_indexes = self._prefix_indexes
+            self._prefix_regex = re.compile(_trie_to_regex(_build_trie(prefixes), None, group_indexes))
+
+        self._expressions_regex = None
+        self._expressions_indexes = {}
+        if expressions:
+            alternatives = []
+            group_number = 1
+            for index, expression in expressions:
+                compiled = compile_expression(self.patterns[index], expression)
+                if compiled is None:
+                    continue
+                self._expressions_indexes[group_number] = index
+                alternatives.append(compiled.pattern)
+                # Skip the groups defined within the user's expression.
+                group_number += compiled.groups
+
+            if alternatives:
+                self._expressions_regex = re.compile('|'.join(alternatives))
+
+    def match(self, path):
+        """
+        Find the first pattern that matches the path.
+
+        Args:
+            path: A URL path, e.g. `request.path`.
+        Return:
+            The index of the first matching pattern or None if no pattern matches.
+        """
+        result = None
+
+        if self._prefix_regex is not None:
+            prefix_match = self._prefix_regex.match(path)
+            if prefix_match:
+                result = self._prefix_indexes[prefix_match.lastindex]
+
+        if self._expressions_regex is not None:
+            expression_match = self._expressions_regex.match(path)
+            if expression_match:
+                index = self._expressions_indexes[expression_match.lastindex]
+                if result is None or index < result:
+                    result = index
+
+        return result
+
+    def __contains__(self, path):
+        """
+        Check whether any of the patterns matches the path.
+        """
+        return self.match(path) is not None
+
+    def __repr__(self):
+        """
+        Represent the matcher with its patterns.
+        """
+        return '{cls}({patterns!r})'.format(cls=self.__class__.__name__, patterns=list(self.patterns))
+
+
+# The language of the path rules that leave the request untouched, like the API endpoints.
+PASSTHROUGH = 'passthrough'
+
+
+def _parse_rule(rule):
+    """
+    Unpack a `[pattern, language]` rule, the malformed rules are logged and skipped.
+
+    Return: A `(pattern, language)` tuple or None.
+    """
+    try:
+        pattern, language = rule
+    except (TypeError, ValueError):
+        LOGGER.warning('Skipping the malformed path rule %r, expected a [pattern, language] pair.', rule)
+        return None
+    return pattern, language
+
+
+class PathRules(object):
+    """
+    Ordered table of path rules, each mapping a path pattern to a language or to `PASSTHROUGH`.
+
+    All the patterns are compiled into a single `PathMatcher`, so looking a path up costs one pass over it
+    regardless of the number of rules. The first rule, in declaration order, that matches the path wins. The
+    malformed rules and invalid patterns are skipped, so a bad rule never breaks the site's snapshot.
+    """
+
+    def __init__(self, rules, passthrough_patterns=()):
+        """
+        Compile the rules.
+
+        Args:
+            rules: An iterable of `(pattern, language)` pairs, the language may be `PASSTHROUGH`.
+            passthrough_patterns: Patterns to leave untouched after the rules e.g. the API prefixes.
+        """
+        self.rules = tuple(rule for rule in (_parse_rule(rule) for rule in rules) if rule is not None)
+        self.rules += tuple((pattern, PASSTHROUGH) for pattern in passthrough_patterns)
+        self.matcher = PathMatcher(pattern for pattern, _language in self.rules)
+        self.languages = tuple(language for _pattern, language in self.rules)
+
+    def lookup(self, path):
+        """
+        Find the language of the first rule that matches the path.
+
+        Args:
+            path: A URL path, e.g. `request.path`.
+        Return:
+            The language of the rule, `PASSTHROUGH` or None if no rule matches.
+        """
+        index = self.matcher.match(path)
+        if index is None:
+            return None
+        return self.languages[index]
+
+    def __repr__(self):
+        """
+        Represent the rules table with its rules.
+        """
+        return '{cls}({rules!r})'.format(cls=self.__class__.__name__, rules=list(self.rules))
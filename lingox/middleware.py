@@ -3,11 +3,89 @@ LocalizerX i18n Middleware.
 """
 from __future__ import absolute_import, unicode_literals
 
-from django.conf import settings
+import sys
+from timeit import default_timer
 
-from localizerx.helpers import is_api_request, is_feature_enabled
+from django.middleware.locale import LocaleMiddleware
+from django.utils import translation
+from django.utils.cache import cc_delim_re, patch_vary_headers
+
+from localizerx.config import get_settings_snapshot
+from localizerx.dark_lang import (clean_accept_language, get_dark_lang_snapshot, get_preview_language,
+                                  is_cached_dark_lang_enabled, is_dark_lang_snapshot_cached)
+from localizerx.decisions import ENVIRON_DECISION_KEY, decide_request
+from localizerx.helpers import (get_bypass_matcher, get_supported_language, is_direct_activation_enabled,
+                                is_vary_normalization_enabled, truncate_accept_language)
+from localizerx.instrumentation import BYPASSED_REQUESTS, REGISTRY, get_exporter, record_marks
+from localizerx.preferences import (PREFERENCE_COOKIE_NAME, is_preference_cookie_enabled, load_preference_cookie,
+                                    update_preference_cookie)
+from localizerx.profiling import get_sampling_profiler
+from localizerx.sites import get_cached_site_snapshot, get_site_key, is_generation_check_due
+from localizerx.stats import get_language_stats
 from openedx.core.djangoapps.site_configuration import helpers as configuration_helpers
 
+# Removed in Django 4.0 along with storing the language in the session.
+LANGUAGE_SESSION_KEY = getattr(translation, 'LANGUAGE_SESSION_KEY', '_language')
+
+
+def get_user_language(request):
+    """
+    Get the language the user has picked, either in the session or the language cookie.
+
+    Open edX stores the user's language preference and the dark language preview in there.
+
+    Return: A supported language code or None.
+    """
+    session = getattr(request, 'session', None)
+    for language_code in (
+            session.get(LANGUAGE_SESSION_KEY) if session is not None else None,
+            request.COOKIES.get(get_settings_snapshot().language_cookie_name),
+    ):
+        if language_code:
+            language_code = get_supported_language(language_code)
+            if language_code:
+                return language_code
+    return None
+
+
+def is_async_chain(middleware, get_response):
+    """
+    Check whether Django hands the middleware an asynchronous `get_response`, and mark the middleware as such.
+
+    The asynchronous middlewares are called through `localizerx.coroutines.acall`.
+    """
+    if get_response is None or sys.version_info[0] < 3:
+        return False
+
+    from localizerx import coroutines
+    if not coroutines.is_coroutine_function(get_response):
+        return False
+    coroutines.mark_coroutine_function(middleware)
+    return True
+
+
+def normalize_vary_header(response, language_headers):
+    """
+    Replace `Accept-Language` in the response's `Vary` header with the headers the language actually depends on.
+
+    Args:
+        response: A django response.
+        language_headers: The request headers the response language depends on e.g. `('Cookie',)`.
+    """
+    if not response.has_header('Vary'):
+        return
+
+    vary_headers = [header for header in cc_delim_re.split(response['Vary']) if header]
+    other_headers = [header for header in vary_headers if header.lower() != 'accept-language']
+    if len(other_headers) == len(vary_headers):
+        return
+
+    if other_headers:
+        response['Vary'] = ', '.join(other_headers)
+    else:
+        del response['Vary']
+    patch_vary_headers(response, language_headers)
+
 
 class DefaultLocaleMiddleware(object):
     """
@@ -19,27 +97,402 @@ class DefaultLocaleMiddleware(object):
     as the default initial language, unless another one is set via sessions or cookies.
     Should be installed *before* any middleware that checks request.META['HTTP_ACCEPT_LANGUAGE'],
     specifically django.middleware.locale.LocaleMiddleware
+
+    The middleware works in both `MIDDLEWARE_CLASSES` and `MIDDLEWARE`, and in asynchronous
+    middleware chains under ASGI without being wrapped in a thread.
+
+    When `LOCALIZERX_DIRECT_ACTIVATION` is enabled the middleware activates the language itself,
+    and `DirectLocaleMiddleware` takes the place of Django's `LocaleMiddleware`.
+
+    When `LOCALIZERX_NORMALIZE_VARY` is enabled, `Accept-Language` is removed from the `Vary` header of the pages
+    in the site language, which don't depend on it, to keep the caches from storing a copy per browser. Only the
+    language cookie or the session can change the language of these pages, so they vary on `Cookie` instead.
+
+    The paths in `LOCALIZERX_BYPASS_URL_PREFIXES` e.g. the static files never render translated text, so they're
+    left untouched before looking the site up, and counted in the `bypassed_requests` metric.
+
+    The ordered `LOCALIZERX_PATH_LANGUAGES` rules enforce a language on some paths, or leave them untouched
+    with the `passthrough` language, e.g. `[["/es/", "es"], ["^/embed/[^/]+/$", "passthrough"]]`.
+    The first matching rule wins, and the API endpoints are always passthrough after the rules.
+
+    When `LOCALIZERX_CACHED_DARK_LANG` is enabled, the enforced language is checked against the released languages
+    so LocalizerX doesn't pick a language the `CachedDarkLangMiddleware` would remove.
+
+    The language is picked by `localizerx.decisions.decide` out of the request's host, path and headers,
+    the middleware only applies the decision to the request. If the `LocalizerXWSGIMiddleware` has already decided
+    and patched the WSGI environ, its decision is applied instead.
+
+    When `LOCALIZERX_PREFERENCE_COOKIE` is enabled, the middleware also keeps the user's cached language preference
+    in a signed cookie, see `localizerx.preferences`.
+
+    When `LOCALIZERX_LANGUAGE_STATS_PATH` is configured, the browser and enforced languages of the patched requests
+    are tallied per site, see `localizerx.stats`.
     """
 
-    def patch_request(self, request):
+    # The request headers the language depends on when it's enforced by the site.
+    site_language_headers = ('Cookie',)
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        """
+        Initialize the middleware, `get_response` is only provided by the new-style `MIDDLEWARE` setting.
+        """
+        self.get_response = get_response
+        self.direct_activation = is_direct_activation_enabled()
+        self.normalize_vary = is_vary_normalization_enabled()
+        self.preference_cookie = is_preference_cookie_enabled()
+        self.language_stats = get_language_stats()
+        self.is_async = is_async_chain(self, get_response)
+
+    def __call__(self, request):
+        """
+        Patch the request and pass it down the middleware chain.
+        """
+        if self.is_async:
+            from localizerx.coroutines import acall
+            return acall(self, request)
+
+        self.process_request(request)
+        return self.process_response(request, self.get_response(request))
+
+    def patch_request(self, request, language_code=None):
         """
         Enforce LANGUAGE_CODE regardless of the browser provided language.
 
         Django will use this value in the LocaleMiddleware to display the desired language.
         """
         if 'HTTP_ACCEPT_LANGUAGE' in request.META:
-            # Preserve the browser provided language just in case,
-            # the underscore prefix means that you probably shouldn't be using it anyway
-            request.META['_HTTP_ACCEPT_LANGUAGE'] = request.META['HTTP_ACCEPT_LANGUAGE']
+            # Preserve the browser provided language just in case, truncated if it's pathologically long.
+            # The underscore prefix means that you probably shouldn't be using it anyway.
+            request.META['_HTTP_ACCEPT_LANGUAGE'] = truncate_accept_language(request.META['HTTP_ACCEPT_LANGUAGE'])
 
-        language_code = configuration_helpers.get_value('LANGUAGE_CODE', settings.LANGUAGE_CODE)
+        if language_code is None:
+            language_code = configuration_helpers.get_value('LANGUAGE_CODE', get_settings_snapshot().language_code)
         request.META['HTTP_ACCEPT_LANGUAGE'] = language_code
 
+    def apply_decision(self, request, decision, patched=False):
+        """
+        Patch the request according to the LocalizerX decision.
+
+        Args:
+            request: A django request.
+            decision: The `Decision` of the request.
+            patched: Whether the `LocalizerXWSGIMiddleware` has already patched the request's headers.
+        """
+        if decision.language is None:
+            return
+
+        if self.normalize_vary and not decision.varies_on_browser:
+            request._localizerx_language_headers = self.site_language_headers  # pylint: disable=protected-access
+        if not patched:
+            self.patch_request(request, decision.language)
+        # Keep the decision around for the rest of the stack e.g. the `localizerx.cache` keys.
+        request.localizerx_language = decision.language
+        if self.direct_activation:
+            self.activate_language(request, decision.language)
+
+    def activate_language(self, request, language_code):  # pylint: disable=no-self-use
+        """
+        Activate the language right away, the same way Django's `LocaleMiddleware` would have done after the patch.
+        """
+        translation.activate(get_supported_language(language_code) or get_settings_snapshot().language_code)
+        request.LANGUAGE_CODE = request.localizerx_language = translation.get_language()
+
     def process_request(self, request):
         """
         Change the request's `HTTP_ACCEPT_LANGUAGE` to `settings.LANGUAGE_CODE`.
         """
-        # This middleware is only needed for regular browser pages.
-        # It is incompatible with the mobile apps and APIs in general.
-        if is_feature_enabled() and not is_api_request(request):
-            self.patch_request(request)
+        # The `LocalizerXWSGIMiddleware` may have decided already, before the request was built.
+        decision = request.META.get(ENVIRON_DECISION_KEY)
+        from_environ = decision is not None
+        if not from_environ:
+            decision = decide_request(request)
+
+        if decision.bypass:
+            request._localizerx_bypassed = True  # pylint: disable=protected-access
+            if not from_environ:
+                REGISTRY.increment(BYPASSED_REQUESTS)
+            return
+
+        if self.preference_cookie:
+            load_preference_cookie(request)
+        if self.language_stats is not None and decision.language is not None:
+            # The `LocalizerXWSGIMiddleware` has already moved the browser's header.
+            header_key = '_HTTP_ACCEPT_LANGUAGE' if from_environ else 'HTTP_ACCEPT_LANGUAGE'
+            self.language_stats.record(get_site_key(request), request.META.get(header_key, ''), decision.language)
+        self.apply_decision(request, decision, patched=from_environ)
+
+    def request_may_block(self, request):
+        """
+        Check whether `process_request` may query the database or a cache backend, or write a file.
+
+        The site snapshot, the dark language snapshot and the shared generation are usually cached or checked
+        recently, so most requests are processed without blocking.
+        """
+        if self.preference_cookie and PREFERENCE_COOKIE_NAME in request.COOKIES:
+            # Loading the cookie reads `request.user`, which may query the database.
+            return True
+        if self.language_stats is not None and self.language_stats.is_flush_due():
+            return True
+        if ENVIRON_DECISION_KEY in request.META or request.path in get_bypass_matcher():
+            return False
+        # The generation is checked first, since getting the cached site snapshot may check it.
+        return (
+            is_generation_check_due()
+            or get_cached_site_snapshot(request) is None
+            or (is_cached_dark_lang_enabled() and not is_dark_lang_snapshot_cached())
+        )
+
+    def response_may_block(self, request):
+        """
+        Check whether `process_response` may query the database or the shared generation, for the preference cookie.
+        """
+        return (
+            self.preference_cookie
+            and not getattr(request, '_localizerx_bypassed', False)
+            and hasattr(request, 'user')
+        )
+
+    def process_response(self, request, response):
+        """
+        Stop the caches from varying the pages in the site language on the browser's `Accept-Language`.
+        """
+        if getattr(request, '_localizerx_bypassed', False):
+            return response
+
+        language_headers = getattr(request, '_localizerx_language_headers', None)
+        if language_headers:
+            normalize_vary_header(response, language_headers)
+        if self.preference_cookie:
+            update_preference_cookie(request, response)
+        return response
+
+
+class DirectLocaleMiddleware(LocaleMiddleware):
+    """
+    Lightweight replacement of Django's `LocaleMiddleware` for the direct activation mode.
+
+    The language activated by the `DefaultLocaleMiddleware` is kept unless the user has picked another one,
+    which skips parsing the `Accept-Language` header again. The requests LocalizerX has left untouched
+    e.g. the API requests go through the regular `LocaleMiddleware` process.
+
+    The responses are handled by the `LocaleMiddleware` i.e. the `Content-Language` and `Vary` headers.
+    Since the URL language prefix isn't checked, `i18n_patterns` aren't supported in this mode.
+    """
+
+    def process_request(self, request):
+        """
+        Activate the user's language if they've picked one, otherwise keep the LocalizerX language.
+        """
+        if getattr(request, 'LANGUAGE_CODE', None) is None:
+            # Not activated by the `DefaultLocaleMiddleware`.
+            return super(DirectLocaleMiddleware, self).process_request(request)
+
+        user_language = get_user_language(request)
+        if user_language and user_language != request.LANGUAGE_CODE:
+            translation.activate(user_language)
+            request.LANGUAGE_CODE = translation.get_language()
+        return None
+
+
+class CachedDarkLangMiddleware(object):
+    """
+    Replacement of Open edX's `DarkLangMiddleware` backed by the cached `DarkLangSnapshot`.
+
+    `add_locale_middleware` swaps the middlewares when `LOCALIZERX_CACHED_DARK_LANG` is enabled.
+    Like the original, it removes the unreleased languages from the `Accept-Language` header and activates the
+    dark language the user previews, without reading the `DarkLangConfig` on every request.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        """
+        Initialize the middleware, `get_response` is only provided by the new-style `MIDDLEWARE` setting.
+        """
+        self.get_response = get_response
+        self.is_async = is_async_chain(self, get_response)
+
+    def __call__(self, request):
+        """
+        Clean the request and pass it down the middleware chain.
+        """
+        if self.is_async:
+            from localizerx.coroutines import acall
+            return acall(self, request)
+
+        self.process_request(request)
+        return self.get_response(request)
+
+    def request_may_block(self, request):  # pylint: disable=no-self-use
+        """
+        Check whether `process_request` may query the `DarkLangConfig`, or the user's preview language.
+        """
+        if not is_dark_lang_snapshot_cached():
+            return True
+        return get_dark_lang_snapshot().enabled and hasattr(request, 'user')
+
+    def response_may_block(self, request):  # pylint: disable=no-self-use,unused-argument
+        """
+        Never block, the response is left untouched.
+        """
+        return False
+
+    def process_response(self, request, response):  # pylint: disable=no-self-use,unused-argument
+        """
+        Return the response untouched, for `localizerx.coroutines.acall`.
+        """
+        return response
+
+    def process_request(self, request):  # pylint: disable=no-self-use
+        """
+        Remove the unreleased languages from the request, unless the user previews a dark language.
+        """
+        snapshot = get_dark_lang_snapshot()
+        if not snapshot.enabled:
+            return
+
+        accept_language = request.META.get('HTTP_ACCEPT_LANGUAGE')
+        if accept_language is not None and accept_language != '*':
+            request.META['HTTP_ACCEPT_LANGUAGE'] = clean_accept_language(accept_language, snapshot)
+
+        preview_language = get_preview_language(request)
+        if preview_language:
+            request.session[LANGUAGE_SESSION_KEY] = preview_language
+            request.META['HTTP_ACCEPT_LANGUAGE'] = preview_language
+
+
+class LocaleTimingMiddleware(object):
+    """
+    Timing marker for the locale middleware pipeline.
+
+    `add_locale_middleware` places this middleware around the locale-aware middlewares when
+    `LOCALIZERX_INSTRUMENTATION` is enabled. Each marker records a timestamp on the way in and on the way out,
+    and the outermost marker records the time spent between the markers in the instrumentation histograms.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        """
+        Initialize the middleware, `get_response` is only provided by the new-style `MIDDLEWARE` setting.
+        """
+        self.get_response = get_response
+        self.is_async = is_async_chain(self, get_response)
+
+    def __call__(self, request):
+        """
+        Time the rest of the middleware chain.
+        """
+        if self.is_async:
+            from localizerx.coroutines import acall
+            return acall(self, request)
+
+        self.process_request(request)
+        return self.process_response(request, self.get_response(request))
+
+    def request_may_block(self, request):  # pylint: disable=no-self-use,unused-argument
+        """
+        Never block, only a timestamp is recorded.
+        """
+        return False
+
+    def response_may_block(self, request):  # pylint: disable=no-self-use,unused-argument
+        """
+        Check whether recording the timings may export them, which writes a file or sends datagrams.
+        """
+        exporter = get_exporter()
+        return exporter is not None and exporter.is_export_due()
+
+    def process_request(self, request):  # pylint: disable=no-self-use
+        """
+        Record the time the request reached the marker.
+        """
+        marks = getattr(request, '_localizerx_request_marks', None)
+        if marks is None:
+            marks = request._localizerx_request_marks = []  # pylint: disable=protected-access
+            request._localizerx_response_marks = []  # pylint: disable=protected-access
+        marks.append(default_timer())
+
+    def process_response(self, request, response):  # pylint: disable=no-self-use
+        """
+        Record the time the response reached the marker, and the timings of the request if this is the last marker.
+        """
+        now = default_timer()
+        request_marks = getattr(request, '_localizerx_request_marks', None)
+        if request_marks is not None:
+            response_marks = request._localizerx_response_marks  # pylint: disable=protected-access
+            response_marks.append(now)
+            if len(response_marks) == len(request_marks):
+                record_marks(request_marks, response_marks)
+        return response
+
+
+class LocaleProfilingMiddleware(object):
+    """
+    Sampling profiler marker for the locale middleware pipeline.
+
+    `add_locale_middleware` places this middleware around the `DefaultLocaleMiddleware`, or the whole locale
+    middleware block, when `LOCALIZERX_PROFILING_PATH` is configured. The outer marker starts profiling a sampled
+    request, the inner one pauses while the view runs, and the outer one writes the profile if the request was
+    slow, see `localizerx.profiling`.
+
+    The requests aren't sampled in asynchronous middleware chains, see `localizerx.profiling`.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        """
+        Initialize the middleware, `get_response` is only provided by the new-style `MIDDLEWARE` setting.
+        """
+        self.get_response = get_response
+        self.is_async = is_async_chain(self, get_response)
+        self.profiler = None if self.is_async else get_sampling_profiler()
+
+    def __call__(self, request):
+        """
+        Profile the rest of the middleware chain.
+        """
+        if self.is_async:
+            from localizerx.coroutines import acall
+            return acall(self, request)
+
+        self.process_request(request)
+        return self.process_response(request, self.get_response(request))
+
+    def request_may_block(self, request):  # pylint: disable=no-self-use,unused-argument
+        """
+        Never block, the asynchronous chains aren't profiled.
+        """
+        return False
+
+    def response_may_block(self, request):  # pylint: disable=no-self-use,unused-argument
+        """
+        Never block, the asynchronous chains aren't profiled.
+        """
+        return False
+
+    def process_request(self, request):
+        """
+        Start or pause profiling the request.
+        """
+        if self.profiler is not None:
+            self.profiler.mark_request(request)
+
+    def process_response(self, request, response):
+        """
+        Resume or stop profiling the request, and write the profile if the request was slow.
+        """
+        if self.profiler is None:
+            return response
+
+        profiled = self.profiler.mark_response(request)
+        if profiled is not None:
+            self.profiler.dump(profiled, request.path)
+        return response
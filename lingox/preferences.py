@@ -0,0 +1,245 @@
+"""
+Cached language preferences for the LocalizerX module.
+
+Open edX's `LanguagePreferenceMiddleware` reads the `pref-lang` user preference from the database on every
+authenticated request. When `LOCALIZERX_PREFERENCE_CACHE` is enabled, the preference lookups of that middleware are
+served from a bounded in-process cache, which is invalidated when the preference is saved.
+
+With `LOCALIZERX_PREFERENCE_COOKIE` enabled as well, the preference is also kept in a signed cookie, so the other
+worker processes can fill their caches from the cookie instead of the database.
+
+The `post_save` signal only reaches the worker that saved the preference. With `LOCALIZERX_GENERATION_CACHE`
+configured, saving a language preference bumps a shared generation, the other workers then drop all their cached
+preferences and ignore the cookies signed for the previous generations, see `localizerx.generations`.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import functools
+
+import django
+from django.core import signing
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from localizerx.config import get_settings_snapshot
+from localizerx.generations import PREFERENCES_GENERATION, build_generation_counter
+from localizerx.lru import LRUCache
+
+LANGUAGE_KEY = 'pref-lang'
+
+PREFERENCE_COOKIE_NAME = 'localizerx-pref-lang'
+# Bump the version whenever the signed value changes, the cookies of the previous versions are ignored.
+PREFERENCE_COOKIE_SALT = 'localizerx.preferences.v2'
+
+# Cached as the preference of the users who don't have one, None means a cache miss.
+NO_PREFERENCE = ''
+
+# The preferences cache and its generation counter, created lazily so they pick up the configured size and TTL.
+_CACHES = {}
+
+
+def is_preference_cache_enabled():
+    """
+    Check if the language preferences should be cached.
+    """
+    return get_settings_snapshot().preference_cache
+
+
+def is_preference_cookie_enabled():
+    """
+    Check if the cached language preferences should be kept in a signed cookie as well.
+    """
+    return get_settings_snapshot().preference_cookie
+
+
+def get_preference_ttl():
+    """
+    Get the number of seconds a cached preference is considered fresh.
+    """
+    return get_settings_snapshot().preference_cache_ttl
+
+
+def get_preferences_generation():
+    """
+    Get the generation counter of the language preferences, or None if `LOCALIZERX_GENERATION_CACHE` isn't configured.
+    """
+    if 'generation' not in _CACHES:
+        _CACHES['generation'] = build_generation_counter(PREFERENCES_GENERATION)
+    return _CACHES['generation']
+
+
+def get_cookie_generation():
+    """
+    Get the generation the preference cookies are signed for, as last seen by this worker.
+    """
+    generation = get_preferences_generation()
+    if generation is None:
+        return 0
+    return generation.generation
+
+
+def get_preferences_cache():
+    """
+    Get the LRU cache of the language preferences, keyed by user id.
+
+    The preferences are dropped when another worker has saved a language preference, checked at most once per
+    `LOCALIZERX_GENERATION_CHECK_INTERVAL_MS`.
+    """
+    cache = _CACHES.get('preferences')
+    if cache is None:
+        get_preferences_generation()
+        cache = _CACHES['preferences'] = LRUCache(
+            maxsize=get_settings_snapshot().preference_cache_size,
+            ttl=get_preference_ttl(),
+        )
+
+    generation = _CACHES['generation']
+    if generation is not None and generation.has_changed():
+        cache.clear()
+    return cache
+
+
+def is_authenticated(user):
+    """
+    Check if the user is authenticated, `is_authenticated` is a method before Django 1.10.
+    """
+    if django.VERSION < (1, 10):
+        return user.is_authenticated()
+    return bool(user.is_authenticated)
+
+
+def cache_user_preference(get_user_preference):
+    """
+    Wrap Open edX's `get_user_preference` to serve the users' own language preference from the cache.
+
+    Args:
+        get_user_preference: The `openedx.core.djangoapps.user_api.preferences.api.get_user_preference` function.
+    Return: The wrapped function.
+    """
+    @functools.wraps(get_user_preference)
+    def cached_get_user_preference(requesting_user, preference_key, username=None):
+        """
+        Get the user preference, from the cache if it's the user's own language preference.
+        """
+        if preference_key != LANGUAGE_KEY or (username and username != requesting_user.username):
+            return get_user_preference(requesting_user, preference_key, username=username)
+
+        cache = get_preferences_cache()
+        language = cache.get(requesting_user.id)
+        if language is None:
+            language = get_user_preference(requesting_user, preference_key, username=username) or NO_PREFERENCE
+            cache.set(requesting_user.id, language)
+        return language or None
+
+    cached_get_user_preference.localizerx_cached = True
+    return cached_get_user_preference
+
+
+def patch_language_preference_middleware():
+    """
+    Make Open edX's `LanguagePreferenceMiddleware` look the language preferences up in the cache.
+
+    Return: True if the middleware was patched, False if it's not available.
+    """
+    try:
+        from openedx.core.djangoapps.lang_pref import middleware as lang_pref_middleware
+    except ImportError:
+        return False
+
+    get_user_preference = getattr(lang_pref_middleware, 'get_user_preference', None)
+    if get_user_preference is None:
+        return False
+
+    if not getattr(get_user_preference, 'localizerx_cached', False):
+        lang_pref_middleware.get_user_preference = cache_user_preference(get_user_preference)
+    return True
+
+
+def invalidate_user_preference(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Discard the cached language preference of a user when their `UserPreference` is saved or deleted.
+
+    The other workers are notified as well, but they can't tell which user has changed, so they drop all their
+    cached preferences.
+    """
+    if instance.key == LANGUAGE_KEY:
+        generation = get_preferences_generation()
+        if generation is not None:
+            generation.bump()
+        get_preferences_cache().pop(instance.user.id)
+
+
+def sign_preference(user_id, language):
+    """
+    Sign the language preference of a user for the preference cookie, along with the current generation.
+    """
+    return signing.dumps(
+        [user_id, language, get_cookie_generation()], salt=PREFERENCE_COOKIE_SALT, compress=True,
+    )
+
+
+def unsign_preference(value, user_id):
+    """
+    Get the language preference in a preference cookie.
+
+    Return: The language preference, `NO_PREFERENCE` or None if the cookie is invalid, expired, for another user or
+        signed before a preference was saved.
+    """
+    try:
+        cookie_user_id, language, generation = signing.loads(
+            value, salt=PREFERENCE_COOKIE_SALT, max_age=get_preference_ttl(),
+        )
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+
+    if cookie_user_id != user_id or generation != get_cookie_generation():
+        return None
+    return language
+
+
+def load_preference_cookie(request):
+    """
+    Fill the preferences cache from the request's preference cookie, unless the cache already has a value.
+    """
+    value = request.COOKIES.get(PREFERENCE_COOKIE_NAME)
+    user = getattr(request, 'user', None)
+    if not value or user is None or not is_authenticated(user):
+        return
+
+    cache = get_preferences_cache()
+    if cache.get(user.id) is None:
+        language = unsign_preference(value, user.id)
+        if language is not None:
+            cache.set(user.id, language)
+
+
+def update_preference_cookie(request, response):
+    """
+    Keep the response's preference cookie in sync with the cached preference of the user.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not is_authenticated(user):
+        return
+
+    cookie_value = request.COOKIES.get(PREFERENCE_COOKIE_NAME)
+    language = get_preferences_cache().get(user.id)
+    if language is None:
+        # e.g. the preference was just changed, the cookie shouldn't fill the other workers' caches with the old one.
+        if cookie_value:
+            response.delete_cookie(PREFERENCE_COOKIE_NAME)
+    elif not cookie_value or unsign_preference(cookie_value, user.id) != language:
+        response.set_cookie(
+            PREFERENCE_COOKIE_NAME,
+            sign_preference(user.id, language),
+            max_age=get_preference_ttl(),
+            httponly=True,
+            secure=get_settings_snapshot().session_cookie_secure,
+        )
+
+
+@receiver(setting_changed)
+def reset_preferences_cache(**kwargs):  # pylint: disable=unused-argument
+    """
+    Discard the cached preferences when the settings are modified e.g. via `override_settings`.
+    """
+    _CACHES.clear()
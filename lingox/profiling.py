@@ -0,0 +1,268 @@
+"""
+Opt-in sampling profiler of the slow requests in the locale middleware pipeline.
+
+When `LOCALIZERX_PROFILING_PATH` is configured, `add_locale_middleware` surrounds the `DefaultLocaleMiddleware`,
+or the whole locale middleware block with the `pipeline` scope, with `LocaleProfilingMiddleware` markers. A
+`LOCALIZERX_PROFILING_SAMPLE_RATE` fraction of the requests is profiled with `cProfile` between the markers, the
+view itself is left out. The profiles of the requests that spent at least `LOCALIZERX_PROFILING_THRESHOLD_MS`
+milliseconds between the markers are written as `pstats` dumps to that directory, and the oldest dumps are removed
+to keep at most `LOCALIZERX_PROFILING_MAX_FILES` files and `LOCALIZERX_PROFILING_MAX_BYTES` bytes.
+
+The requests that aren't sampled only cost a random number, and nothing is installed when the profiling is
+disabled. The profiler slows the sampled requests down, so their latency is overestimated.
+
+`cProfile` profiles the thread that enables it, and an asynchronous request would leave it enabled on the event
+loop while the request awaits a worker thread or the view, profiling the other requests instead. So the requests
+aren't sampled at all in asynchronous middleware chains.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import cProfile
+import itertools
+import logging
+import os
+import random
+import re
+import time
+from timeit import default_timer
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from localizerx.config import get_settings_snapshot
+
+LOGGER = logging.getLogger(__name__)
+
+PROFILING_MIDDLEWARE = 'localizerx.middleware.LocaleProfilingMiddleware'
+
+# The profiled part of the pipeline.
+MIDDLEWARE_SCOPE = 'middleware'  # Only the `DefaultLocaleMiddleware`.
+PIPELINE_SCOPE = 'pipeline'  # From the first to the last locale-aware middleware.
+PROFILING_SCOPES = (MIDDLEWARE_SCOPE, PIPELINE_SCOPE)
+
+PROFILE_SUFFIX = '.pstats'
+
+# The requested path is kept in the dump names, so the slow pages can be told apart without loading them.
+PATH_SLUG_RE = re.compile(r'[^A-Za-z0-9]+')
+PATH_SLUG_MAX_LENGTH = 48
+
+
+def add_profiling_markers(middleware_classes, scope, localizerx_middleware, stage_middlewares):
+    """
+    Surround the profiled middlewares with profiling markers.
+
+    Args:
+        middleware_classes: The middlewares tuple.
+        scope: `MIDDLEWARE_SCOPE` or `PIPELINE_SCOPE`.
+        localizerx_middleware: The name of the `DefaultLocaleMiddleware`.
+        stage_middlewares: The locale-aware middlewares, profiled along with the ones between them in the
+                           `PIPELINE_SCOPE`.
+    Return:
+        The new middlewares tuple.
+    """
+    if scope not in PROFILING_SCOPES:
+        raise ImproperlyConfigured('Unknown LOCALIZERX_PROFILING_SCOPE: {scope}, should be one of {scopes}'.format(
+            scope=scope, scopes=', '.join(PROFILING_SCOPES),
+        ))
+
+    if scope == MIDDLEWARE_SCOPE:
+        stage_middlewares = [localizerx_middleware]
+    indexes = [middleware_classes.index(class_name) for class_name in stage_middlewares]
+    first, last = min(indexes), max(indexes)
+    return (
+        middleware_classes[:first]
+        + (PROFILING_MIDDLEWARE,)
+        + middleware_classes[first:last + 1]
+        + (PROFILING_MIDDLEWARE,)
+        + middleware_classes[last + 1:]
+    )
+
+
+class ProfiledRequest(object):
+    """
+    The profile of a sampled request, paused while the request goes through the view.
+    """
+
+    __slots__ = ('profile', 'elapsed', 'resumed_at', 'running')
+
+    def __init__(self):
+        """
+        Start profiling the request.
+        """
+        self.profile = cProfile.Profile()
+        self.elapsed = 0.0
+        self.running = False
+        self.resume()
+
+    def resume(self):
+        """
+        Profile the request until the next pause.
+        """
+        self.resumed_at = default_timer()
+        self.running = True
+        self.profile.enable()
+
+    def pause(self):
+        """
+        Stop profiling the request, and add the time since the last resume to its elapsed time.
+        """
+        self.profile.disable()
+        self.running = False
+        self.elapsed += default_timer() - self.resumed_at
+
+
+class SamplingProfiler(object):
+    """
+    Profile a fraction of the requests, and keep the profiles of the slow ones in a rotating directory.
+
+    The directory may be shared by all the worker processes.
+    """
+
+    def __init__(self, path, sample_rate, threshold, max_files, max_bytes):
+        """
+        Initialize the profiler.
+
+        Args:
+            path: The directory of the dumps.
+            sample_rate: The fraction of the requests to profile, between 0 and 1.
+            threshold: The minimum number of seconds a request spends between the markers to keep its profile.
+            max_files: The maximum number of dumps in the directory.
+            max_bytes: The maximum total size of the dumps in the directory.
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._sequence = itertools.count()
+
+    def mark_request(self, request):
+        """
+        Start profiling a sampled request at the outer marker, and pause at the inner one before the view.
+        """
+        if not hasattr(request, '_localizerx_profile'):
+            profiled = None
+            if random.random() < self.sample_rate:
+                try:
+                    profiled = ProfiledRequest()
+                except ValueError:
+                    # Another profiler is already active in this thread e.g. a developer's one.
+                    LOGGER.debug('Could not profile the request, another profiler is active.')
+            request._localizerx_profile = profiled  # pylint: disable=protected-access
+            return
+
+        profiled = request._localizerx_profile  # pylint: disable=protected-access
+        if profiled is not None and profiled.running:
+            profiled.pause()
+
+    def mark_response(self, request):
+        """
+        Resume profiling the sampled request at the inner marker after the view, and stop at the outer one.
+
+        Return: The `ProfiledRequest` to write with `dump` if the request was slow, or None.
+        """
+        profiled = getattr(request, '_localizerx_profile', None)
+        if profiled is None:
+            return None
+
+        if not profiled.running:
+            profiled.resume()
+            return None
+
+        # Stopped early if the request was short-circuited before the inner marker.
+        profiled.pause()
+        request._localizerx_profile = None  # pylint: disable=protected-access
+        if profiled.elapsed < self.threshold:
+            return None
+        return profiled
+
+    def dump(self, profiled, path):
+        """
+        Write the profile of a slow request, and remove the oldest dumps beyond the limits.
+        """
+        name = '{timestamp}-{pid}-{sequence}-{elapsed}ms-{slug}{suffix}'.format(
+            timestamp=time.strftime('%Y%m%dT%H%M%S', time.gmtime()),
+            pid=os.getpid(),
+            sequence=next(self._sequence),
+            elapsed=int(profiled.elapsed * 1000),
+            slug=PATH_SLUG_RE.sub('_', path).strip('_')[:PATH_SLUG_MAX_LENGTH],
+            suffix=PROFILE_SUFFIX,
+        )
+        profile_path = os.path.join(self.path, name)
+        # The temporary file doesn't have the suffix, so the rotation of the other workers ignores it.
+        temp_path = '{path}.{pid}.tmp'.format(path=profile_path, pid=os.getpid())
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            profiled.profile.dump_stats(temp_path)
+            os.rename(temp_path, profile_path)
+            self.rotate()
+        except (IOError, OSError):
+            LOGGER.exception('Could not write the LocalizerX profile to %s', profile_path)
+
+    def rotate(self):
+        """
+        Remove the oldest dumps until there are at most `max_files` of them, weighing at most `max_bytes`.
+        """
+        dumps = []
+        for name in os.listdir(self.path):
+            if not name.endswith(PROFILE_SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                # Already removed by another worker.
+                continue
+            dumps.append((stat.st_mtime, name, stat.st_size))
+
+        dumps.sort(reverse=True)
+        total_bytes = 0
+        for index, (_mtime, name, size) in enumerate(dumps):
+            total_bytes += size
+            if index >= self.max_files or total_bytes > self.max_bytes:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+
+# Lazily configured state: the profiler of the current process.
+_STATE = {}
+
+
+def get_profiling_scope():
+    """
+    Get the profiled part of the pipeline, or None if `LOCALIZERX_PROFILING_PATH` isn't configured.
+    """
+    settings_snapshot = get_settings_snapshot()
+    if not settings_snapshot.profiling_path:
+        return None
+    return settings_snapshot.profiling_scope
+
+
+def get_sampling_profiler():
+    """
+    Get the sampling profiler of the current process, or None if `LOCALIZERX_PROFILING_PATH` isn't configured.
+    """
+    if 'profiler' not in _STATE:
+        settings_snapshot = get_settings_snapshot()
+        profiler = None
+        if settings_snapshot.profiling_path:
+            profiler = SamplingProfiler(
+                settings_snapshot.profiling_path,
+                sample_rate=settings_snapshot.profiling_sample_rate,
+                threshold=settings_snapshot.profiling_threshold / 1000.0,
+                max_files=settings_snapshot.profiling_max_files,
+                max_bytes=settings_snapshot.profiling_max_bytes,
+            )
+        _STATE['profiler'] = profiler
+    return _STATE['profiler']
+
+
+@receiver(setting_changed)
+def reset_sampling_profiler(**kwargs):  # pylint: disable=unused-argument
+    """
+    Discard the profiler when the settings are modified e.g. via `override_settings`.
+    """
+    _STATE.clear()
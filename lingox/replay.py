@@ -0,0 +1,224 @@
+"""
+Offline replay of access logs through the LocalizerX decisions.
+
+The log is streamed through a pipeline of generators, one line at a time, so a multi-GB log is replayed with a
+bounded memory. Only the counters of each site and path prefix are kept, at most `max_groups` of them: the requests
+of the other sites and path prefixes, e.g. scanners probing random paths, are counted under `OTHER`. The lines can
+be fanned out in chunks to a pool of processes, with a bounded number of chunks in flight.
+
+The sites are resolved like the `DefaultLocaleMiddleware` would without a request, i.e. with the site
+configuration `configuration_helpers` returns when there's no current site, unless their snapshots are cached e.g.
+loaded from the values dumped by the `localizerx_warmup_sites` command.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import gzip
+import io
+import re
+from collections import Counter, deque
+from itertools import islice
+
+from localizerx.decisions import DISABLED, PASSTHROUGH_PATH, decide
+
+try:
+    from urllib.parse import unquote
+except ImportError:  # Python 2.
+    from urllib import unquote
+
+# The outcomes of the replayed requests.
+PATCHED = 'patched'
+PASSTHROUGH = 'passthrough'
+BYPASSED = 'bypassed'
+DISABLED_SITE = 'disabled'
+OUTCOMES = (PATCHED, PASSTHROUGH, BYPASSED, DISABLED_SITE)
+
+# The lines that don't match the log format are counted under this outcome.
+UNPARSED = 'unparsed'
+
+# The nginx `combined` format, which is also gunicorn's default access log format. The named groups are the `path`,
+# and optionally the `host` and the `accept_language` if the log format includes them.
+COMBINED_LOG_RE = r'^\S+ \S+ \S+ \[[^\]]*\] "\S+ (?P<path>\S+)[^"]*"'
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# The site and path prefix of the requests counted once there are `max_groups` others.
+OTHER = '<other>'
+DEFAULT_MAX_GROUPS = 10000
+
+
+def open_log(path):
+    """
+    Open an access log as text, gzip compressed if its name ends with `.gz`.
+    """
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(io.BufferedReader(gzip.open(path, 'rb')), encoding='utf-8', errors='replace')
+    return io.open(path, encoding='utf-8', errors='replace')
+
+
+def parse_lines(lines, log_re, default_host):
+    """
+    Parse the requests out of the log lines.
+
+    Args:
+        lines: An iterable of the log lines.
+        log_re: The compiled regular expression of a log line.
+        default_host: The host of the lines that don't have one.
+    Return: A generator of `(host, path, accept_language)` tuples, or None for the lines that don't match.
+    """
+    for line in lines:
+        match = log_re.match(line)
+        if match is None:
+            yield None
+            continue
+
+        groups = match.groupdict()
+        # Like `request.path`, without the query string and decoded.
+        path = unquote(groups['path'].partition('?')[0])
+        yield groups.get('host') or default_host, path, groups.get('accept_language') or ''
+
+
+def get_path_prefix(path, depth):
+    """
+    Get the first `depth` segments of a path, e.g. `/courses/` for `/courses/course-v1:edX+DemoX+T1/about`.
+    """
+    parts = path.split('/', depth + 1)
+    if len(parts) > depth + 1:
+        return '/'.join(parts[:depth + 1]) + '/'
+    return path
+
+
+def get_outcome(decision):
+    """
+    Get the outcome of a `Decision` for the replay report.
+    """
+    if decision.bypass:
+        return BYPASSED
+    if decision.reason == PASSTHROUGH_PATH:
+        return PASSTHROUGH
+    if decision.reason == DISABLED:
+        return DISABLED_SITE
+    return PATCHED
+
+
+def replay_requests(requests, depth):
+    """
+    Decide the language of the parsed requests.
+
+    Args:
+        requests: An iterable of `(host, path, accept_language)` tuples or None, see `parse_lines`.
+        depth: The number of path segments to group the requests by.
+    Return: A generator of `(host, path_prefix, outcome)` tuples.
+    """
+    for request in requests:
+        if request is None:
+            yield None, None, UNPARSED
+            continue
+
+        host, path, accept_language = request
+        # The hosts are case insensitive, only the decision gets the logged one.
+        yield host.lower(), get_path_prefix(path, depth), get_outcome(decide(host, path, accept_language))
+
+
+def add_count(counts, groups, key, count, max_groups):
+    """
+    Count a `(host, path_prefix, outcome)` tuple, under the `OTHER` group if there are `max_groups` others already.
+
+    Args:
+        counts: A `Counter` of the `(host, path_prefix, outcome)` tuples.
+        groups: The set of the `(host, path_prefix)` groups in the counts.
+        key: The `(host, path_prefix, outcome)` tuple to count.
+        count: The number of requests to add.
+        max_groups: The maximum number of groups besides the `OTHER` one.
+    """
+    host, prefix, outcome = key
+    if outcome != UNPARSED and (host, prefix) not in groups:
+        if len(groups) >= max_groups:
+            host = prefix = OTHER
+        groups.add((host, prefix))
+    counts[(host, prefix, outcome)] += count
+
+
+def count_outcomes(lines, log_pattern, default_host, depth, max_groups=DEFAULT_MAX_GROUPS):
+    """
+    Replay the log lines and count the outcomes.
+
+    Return: A `Counter` of the `(host, path_prefix, outcome)` tuples, with at most `max_groups` sites and path
+        prefixes besides the `OTHER` one.
+    """
+    requests = parse_lines(lines, re.compile(log_pattern), default_host)
+    counts = Counter()
+    groups = set()
+    for key in replay_requests(requests, depth):
+        add_count(counts, groups, key, 1, max_groups)
+    return counts
+
+
+def merge_counts(counts, groups, other_counts, max_groups):
+    """
+    Add the counts of a chunk to the total counts, within the same `max_groups` limit.
+    """
+    for key, count in other_counts.items():
+        add_count(counts, groups, key, count, max_groups)
+
+
+def iter_chunks(lines, chunk_size):
+    """
+    Split the lines in lists of `chunk_size` lines.
+    """
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def count_chunk(args):
+    """
+    Count the outcomes of a chunk of lines in a worker process.
+    """
+    return count_outcomes(*args)
+
+
+def count_outcomes_in_pool(lines, log_pattern, default_host, depth, pool, processes, chunk_size=DEFAULT_CHUNK_SIZE,
+                           max_groups=DEFAULT_MAX_GROUPS):
+    """
+    Replay the log lines in a pool of processes and count the outcomes.
+
+    Unlike `pool.imap`, which reads the whole input ahead, at most two chunks per process are in flight.
+
+    Args:
+        pool: A `multiprocessing.Pool` instance.
+        processes: The number of processes in the pool.
+    Return: A `Counter` of the `(host, path_prefix, outcome)` tuples, with at most `max_groups` sites and path
+        prefixes besides the `OTHER` one.
+    """
+    counts = Counter()
+    groups = set()
+    pending = deque()
+    max_pending = 2 * processes
+    for chunk in iter_chunks(lines, chunk_size):
+        pending.append(pool.apply_async(count_chunk, [(chunk, log_pattern, default_host, depth, max_groups)]))
+        if len(pending) >= max_pending:
+            merge_counts(counts, groups, pending.popleft().get(), max_groups)
+    while pending:
+        merge_counts(counts, groups, pending.popleft().get(), max_groups)
+    return counts
+
+
+def summarize(counts):
+    """
+    Sum the outcomes of each site and path prefix.
+
+    Args:
+        counts: A `Counter` of the `(host, path_prefix, outcome)` tuples.
+    Return: A list of `(host, path_prefix, {outcome: count})` tuples, the busiest first.
+    """
+    rows = {}
+    for (host, prefix, outcome), count in counts.items():
+        if outcome != UNPARSED:
+            rows.setdefault((host, prefix), Counter())[outcome] += count
+    return sorted(
+        ((host, prefix, outcomes) for (host, prefix), outcomes in rows.items()),
+        key=lambda row: (-sum(row[2].values()), row[0], row[1]),
+    )
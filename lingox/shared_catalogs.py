@@ -0,0 +1,397 @@
+"""
+Memory-mapped translation catalogs shared by the worker processes.
+
+Django parses the gettext catalogs of every language into a dict of all the messages, in every worker process.
+The catalogs of the languages LocalizerX serves are compiled instead into a read-only file with a hash table of the
+messages, which is memory-mapped so all the workers on a machine share the same pages.
+
+The file name contains a fingerprint of the `.mo` files it was compiled from, so it's compiled again whenever they
+change e.g. in a new release. The first worker to need a catalog compiles it, the rest map it.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import gettext
+import glob
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.utils.translation import trans_real
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+LOGGER = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MAGIC = b'LXCAT\x00'
+FILE_EXTENSION = '.lxcat'
+
+# Magic, format version, entries count, buckets count, metadata offset and length.
+HEADER = struct.Struct('<6sHIIII')
+# Key offset and length, value offset and length. The empty buckets are all zeros.
+BUCKET = struct.Struct('<IIII')
+
+# Separates the message id from the plural index in the plural keys.
+PLURAL_SEPARATOR = b'\x00'
+
+DEFAULT_PLURAL_FORMS = 'nplurals=2; plural=(n != 1);'
+
+# The number of recently looked up messages kept in the process, a page uses the same few messages over and over.
+RECENT_MESSAGES_SIZE = 1024
+
+
+def encode_key(key):
+    """
+    Encode a catalog key, the plural keys are `(msgid, index)` tuples.
+    """
+    if isinstance(key, tuple):
+        msgid, index = key
+        return msgid.encode('utf-8') + PLURAL_SEPARATOR + str(index).encode('ascii')
+    return key.encode('utf-8')
+
+
+def decode_key(data):
+    """
+    Decode a catalog key encoded with `encode_key`.
+    """
+    msgid, separator, index = data.partition(PLURAL_SEPARATOR)
+    if separator:
+        return msgid.decode('utf-8'), int(index)
+    return msgid.decode('utf-8')
+
+
+def hash_key(data):
+    """
+    Hash an encoded key, the same way in every process unlike the built-in `hash`.
+    """
+    return zlib.crc32(data) & 0xffffffff
+
+
+def write_catalog(catalog, path, metadata):
+    """
+    Write the messages of a catalog to a file.
+
+    The file is written to a temporary file first then renamed, so the other processes never map a partial file.
+
+    Args:
+        catalog: The `{key: message}` mapping of a translation.
+        path: The path of the compiled catalog.
+        metadata: A JSON-serializable dict to store along the messages.
+    """
+    messages = {}
+    for key, value in catalog.items():
+        # Django 2.2+ catalogs may hold the same key more than once, the first one wins as in the lookups.
+        messages.setdefault(encode_key(key), value.encode('utf-8'))
+    entries = sorted(messages.items())
+
+    buckets_count = 8
+    while buckets_count < len(entries) * 2:
+        buckets_count *= 2
+    mask = buckets_count - 1
+
+    empty_bucket = (0, 0, 0, 0)
+    buckets = [empty_bucket] * buckets_count
+    offset = HEADER.size + BUCKET.size * buckets_count
+    for key, value in entries:
+        slot = hash_key(key) & mask
+        while buckets[slot] is not empty_bucket:
+            slot = (slot + 1) & mask
+        buckets[slot] = (offset, len(key), offset + len(key), len(value))
+        offset += len(key) + len(value)
+
+    metadata = json.dumps(metadata).encode('utf-8')
+
+    directory = os.path.dirname(path)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as catalog_file:
+        catalog_file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(entries), buckets_count, offset, len(metadata)))
+        catalog_file.write(b''.join(BUCKET.pack(*bucket) for bucket in buckets))
+        catalog_file.write(b''.join(key + value for key, value in entries))
+        catalog_file.write(metadata)
+
+    os.chmod(catalog_file.name, 0o644)
+    os.rename(catalog_file.name, path)
+
+
+class MappedCatalog(Mapping):
+    """
+    Read-only mapping of the messages in a compiled catalog file.
+
+    The messages are looked up in the memory-mapped hash table, only the recently looked up messages are kept in
+    the process memory.
+    """
+
+    def __init__(self, path):
+        """
+        Map the compiled catalog file.
+        """
+        with open(path, 'rb') as catalog_file:
+            self._map = mmap.mmap(catalog_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self._count, buckets_count, metadata_offset, metadata_length = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError('Not a compiled catalog: {path}'.format(path=path))
+
+        self._buckets_count = buckets_count
+        self._mask = buckets_count - 1
+        self._recent = {}
+        self.metadata = json.loads(self._map[metadata_offset:metadata_offset + metadata_length].decode('utf-8'))
+
+    def _find(self, key):
+        """
+        Find the bucket of an encoded key.
+
+        Return: The `(key_offset, key_length, value_offset, value_length)` tuple of the bucket, or None.
+        """
+        mapped, mask, key_length = self._map, self._mask, len(key)
+        slot = zlib.crc32(key) & mask  # Same as `hash_key(key) & mask`, inlined in this hot path.
+        while True:
+            bucket = BUCKET.unpack_from(mapped, HEADER.size + BUCKET.size * slot)
+            if not bucket[0]:
+                return None
+            if bucket[1] == key_length and mapped[bucket[0]:bucket[0] + key_length] == key:
+                return bucket
+            slot = (slot + 1) & mask
+
+    def _buckets(self):
+        """
+        Iterate over the non-empty buckets.
+        """
+        for slot in range(self._buckets_count):
+            bucket = BUCKET.unpack_from(self._map, HEADER.size + BUCKET.size * slot)
+            if bucket[0]:
+                yield bucket
+
+    def _lookup(self, key):
+        """
+        Get the translated message of a message id, or a `(msgid, plural_index)` tuple.
+
+        Return: The translated message, or None if it's not in the catalog.
+        """
+        try:
+            return self._recent[key]
+        except KeyError:
+            pass
+
+        bucket = self._find(encode_key(key))
+        message = None if bucket is None else self._map[bucket[2]:bucket[2] + bucket[3]].decode('utf-8')
+
+        if len(self._recent) >= RECENT_MESSAGES_SIZE:
+            self._recent.clear()
+        self._recent[key] = message
+        return message
+
+    def __getitem__(self, key):
+        """
+        Get the translated message, or raise a `KeyError` if it's not in the catalog.
+        """
+        message = self._lookup(key)
+        if message is None:
+            raise KeyError(key)
+        return message
+
+    def get(self, key, default=None):
+        """
+        Get the translated message, or `default` if it's not in the catalog.
+        """
+        message = self._lookup(key)
+        return default if message is None else message
+
+    def __contains__(self, key):
+        """
+        Check if the message is in the catalog.
+        """
+        return self._lookup(key) is not None
+
+    def __iter__(self):
+        """
+        Iterate over the message keys e.g. for the JavaScript catalog view.
+        """
+        for key_offset, key_length, _value_offset, _value_length in self._buckets():
+            yield decode_key(self._map[key_offset:key_offset + key_length])
+
+    def items(self):
+        """
+        Iterate over the `(key, message)` pairs, without looking each key up again.
+        """
+        for key_offset, key_length, value_offset, value_length in self._buckets():
+            key = decode_key(self._map[key_offset:key_offset + key_length])
+            yield key, self._map[value_offset:value_offset + value_length].decode('utf-8')
+
+    def __len__(self):
+        """
+        Get the number of messages.
+        """
+        return self._count
+
+
+class SharedTranslation(gettext.GNUTranslations):
+    """
+    Drop-in replacement of Django's `DjangoTranslation` backed by a `MappedCatalog`.
+
+    It falls back to the `settings.LANGUAGE_CODE` translation the same way `DjangoTranslation` does.
+    """
+
+    def __init__(self, language, catalog):  # pylint: disable=super-init-not-called
+        """
+        Set up the translation of `language` without parsing any `.mo` file.
+        """
+        gettext.NullTranslations.__init__(self)  # pylint: disable=non-parent-init-called
+        self._catalog = catalog
+        self._language = language
+        self._info = {'plural-forms': catalog.metadata['plural_forms']}
+        self._charset = 'utf-8'
+        self.plural = parse_plural_forms(catalog.metadata['plural_forms'])
+
+        # Same as `DjangoTranslation`, the default language and English don't need a fallback.
+        if language != settings.LANGUAGE_CODE and not language.startswith('en'):
+            self.add_fallback(trans_real.translation(settings.LANGUAGE_CODE))
+
+    def language(self):
+        """
+        Get the translation language.
+        """
+        return self._language
+
+    def to_language(self):
+        """
+        Get the translation language, as `get_language()` returns it.
+        """
+        return self._language
+
+    def __repr__(self):
+        """
+        Identify the translation in the logs.
+        """
+        return '<SharedTranslation lang:{language}>'.format(language=self._language)
+
+
+def parse_plural_forms(plural_forms):
+    """
+    Compile the plural expression of a `Plural-Forms` header, like `gettext.GNUTranslations` does.
+    """
+    plural = plural_forms.split(';')[1].split('plural=')[1]
+    return gettext.c2py(plural)
+
+
+def get_locale_dirs():
+    """
+    Get the directories Django looks up the translation catalogs in, in the same order.
+    """
+    locale_dirs = [os.path.join(os.path.dirname(django.__file__), 'conf', 'locale')]
+    locale_dirs.extend(os.path.join(app_config.path, 'locale') for app_config in apps.get_app_configs())
+    locale_dirs.extend(settings.LOCALE_PATHS)
+    return locale_dirs
+
+
+def get_catalog_fingerprint(language):
+    """
+    Get a fingerprint of the `.mo` files Django would load for the language.
+    """
+    fingerprint = hashlib.sha1()
+    fingerprint.update('{version}:{language}'.format(version=FORMAT_VERSION, language=language).encode('utf-8'))
+
+    for locale_dir in get_locale_dirs():
+        for path in gettext.find('django', locale_dir, [trans_real.to_locale(language)], all=True):
+            stat = os.stat(path)
+            fingerprint.update('{path}:{mtime}:{size}'.format(
+                path=path,
+                mtime=stat.st_mtime,
+                size=stat.st_size,
+            ).encode('utf-8'))
+
+    return fingerprint.hexdigest()[:16]
+
+
+def get_catalog_path(language, directory):
+    """
+    Get the path of the compiled catalog of the language, in the current release.
+    """
+    return os.path.join(directory, '{language}-{fingerprint}{extension}'.format(
+        language=language,
+        fingerprint=get_catalog_fingerprint(language),
+        extension=FILE_EXTENSION,
+    ))
+
+
+def compile_catalog(language, path):
+    """
+    Compile the Django catalog of the language into a shared catalog file.
+
+    The outdated catalogs of the language are removed, the processes that still map them are not affected.
+    """
+    translation = trans_real.DjangoTranslation(language)
+    write_catalog(translation._catalog, path, {  # pylint: disable=protected-access
+        'language': language,
+        'plural_forms': translation._info.get('plural-forms', DEFAULT_PLURAL_FORMS),  # pylint: disable=protected-access
+    })
+
+    pattern = os.path.join(os.path.dirname(path), '{language}-*{extension}'.format(
+        language=language,
+        extension=FILE_EXTENSION,
+    ))
+    for outdated_path in glob.glob(pattern):
+        if outdated_path != path:
+            for outdated_file in (outdated_path, outdated_path + '.lock'):
+                try:
+                    os.remove(outdated_file)
+                except OSError:
+                    pass  # Already removed by another process.
+
+
+def load_shared_translation(language, directory):
+    """
+    Load the shared translation of the language, compiling its catalog first if needed.
+
+    Return: A `SharedTranslation` instance.
+    """
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            pass  # Created by another process in the meantime.
+
+    path = get_catalog_path(language, directory)
+    if not os.path.exists(path):
+        lock_file = open(path + '.lock', 'a')
+        try:
+            if fcntl:
+                # Only the first worker compiles the catalog, the others wait for it.
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if not os.path.exists(path):
+                LOGGER.info('Compiling the shared translation catalog %s', path)
+                compile_catalog(language, path)
+        finally:
+            lock_file.close()
+
+    return SharedTranslation(language, MappedCatalog(path))
+
+
+def install_shared_translation(language, directory):
+    """
+    Make Django use the shared translation of the language.
+    """
+    translation = load_shared_translation(language, directory)
+    trans_real._translations[language] = translation  # pylint: disable=protected-access
+
+
+def get_shared_catalogs_dir():
+    """
+    Get the `LOCALIZERX_SHARED_CATALOGS_DIR` directory, or None if the shared catalogs are disabled.
+    """
+    return settings.ENV_TOKENS.get('LOCALIZERX_SHARED_CATALOGS_DIR')
@@ -0,0 +1,119 @@
+"""
+Site snapshots warm-up for the LocalizerX module.
+
+Every worker resolves the configuration of each site on its first request to it, so a deployment starts with a
+storm of site configuration lookups. The `localizerx_warmup_sites` command reads the LocalizerX values of all the
+enabled sites in one query, and writes them to the `LOCALIZERX_SITE_SNAPSHOTS_CACHE` shared cache or the
+`LOCALIZERX_SITE_SNAPSHOTS_PATH` file. The workers build their site snapshots out of them when the app is ready.
+
+The values are stored instead of the snapshots, so the workers compile the rules and apply their own settings.
+When `LOCALIZERX_GENERATION_CACHE` is configured, the values that were read before a site configuration was saved
+are ignored.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import json
+import logging
+import os
+
+from django.core.cache import caches
+
+from localizerx.config import get_settings_snapshot
+from localizerx.sites import build_site_snapshot, get_all_site_values, get_sites_generation, get_snapshots_cache
+
+LOGGER = logging.getLogger(__name__)
+
+SITE_SNAPSHOTS_CACHE_KEY = 'localizerx:site_snapshots'
+
+# Bump the version whenever the stored values change, the values of the other versions are ignored.
+SITE_SNAPSHOTS_FORMAT_VERSION = 1
+
+
+def dump_site_snapshots():
+    """
+    Get the values of all the enabled sites, along with the current generation of the site configurations.
+
+    Return: A JSON serializable dict.
+    """
+    generation = get_sites_generation()
+    return {
+        'version': SITE_SNAPSHOTS_FORMAT_VERSION,
+        # Fetched before the query, so the sites saved while it runs bump the generation past it.
+        'generation': generation.fetch() if generation is not None else None,
+        'sites': get_all_site_values(),
+    }
+
+
+def write_site_snapshots(data, path=None, cache_alias=None):
+    """
+    Write the dumped site values to a file, replacing it atomically, and/or to a shared cache.
+    """
+    if path:
+        temp_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+        with open(temp_path, 'w') as snapshots_file:
+            json.dump(data, snapshots_file)
+        os.rename(temp_path, path)
+    if cache_alias:
+        caches[cache_alias].set(SITE_SNAPSHOTS_CACHE_KEY, data, timeout=None)
+
+
+def read_site_snapshots(path=None, cache_alias=None):
+    """
+    Read the dumped site values from the shared cache, or the file if they aren't cached.
+
+    Return: The dict written by `write_site_snapshots`, or None.
+    """
+    data = None
+    if cache_alias:
+        data = caches[cache_alias].get(SITE_SNAPSHOTS_CACHE_KEY)
+    if data is None and path and os.path.exists(path):
+        with open(path) as snapshots_file:
+            data = json.load(snapshots_file)
+    return data
+
+
+def load_site_snapshots(data):
+    """
+    Fill the site snapshots cache out of the dumped site values.
+
+    Return: The number of sites loaded, 0 if the values are outdated.
+    """
+    if data.get('version') != SITE_SNAPSHOTS_FORMAT_VERSION:
+        LOGGER.warning('Ignored the LocalizerX site snapshots of version %s.', data.get('version'))
+        return 0
+
+    generation = get_sites_generation()
+    if generation is not None and data['generation'] != generation.generation:
+        LOGGER.warning('Ignored the LocalizerX site snapshots, a site configuration was saved since they were dumped.')
+        return 0
+
+    cache = get_snapshots_cache()
+    for domain, values in data['sites'].items():
+        cache.set(domain, build_site_snapshot(values))
+    return len(data['sites'])
+
+
+def warm_up_site_snapshots():
+    """
+    Load the site snapshots dumped by the `localizerx_warmup_sites` command, if it's configured.
+
+    Return: The number of sites loaded.
+    """
+    settings_snapshot = get_settings_snapshot()
+    if not settings_snapshot.site_snapshots_path and not settings_snapshot.site_snapshots_cache:
+        return 0
+
+    try:
+        data = read_site_snapshots(settings_snapshot.site_snapshots_path, settings_snapshot.site_snapshots_cache)
+    except Exception:  # pylint: disable=broad-except
+        # The sites are still resolved on their first request.
+        LOGGER.exception('Could not read the LocalizerX site snapshots.')
+        return 0
+
+    if data is None:
+        LOGGER.warning('No LocalizerX site snapshots to load, run the `localizerx_warmup_sites` command.')
+        return 0
+
+    count = load_site_snapshots(data)
+    LOGGER.info('Loaded the LocalizerX snapshots of %d sites.', count)
+    return count
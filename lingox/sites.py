@@ -0,0 +1,298 @@
+"""
+Per-site configuration snapshots for the LocalizerX module.
+
+Resolving the site configuration is expensive in Open edX since every `configuration_helpers.get_value` call walks
+the site's configuration JSON. The values LocalizerX needs are resolved once per site and kept in a bounded LRU cache
+until they expire or the site configuration is saved. With `LOCALIZERX_GENERATION_CACHE` configured, the other
+workers drop their snapshots as well, see `localizerx.generations`.
+
+With `LOCALIZERX_SITES_BY_HOST` enabled, the snapshots are built out of a map of all the enabled sites' values
+keyed by their domain instead of the current site, so they only need the request's host. The map is read in a single
+query and refreshed along with the snapshots, which lets LocalizerX run before the `CurrentSiteMiddleware` and
+resolve new hosts without a database query each.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import logging
+from collections import namedtuple
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from localizerx.config import get_settings_snapshot
+from localizerx.generations import SITES_GENERATION, build_generation_counter
+from localizerx.helpers import get_api_matcher, get_path_rules, is_feature_enabled
+from localizerx.lru import LRUCache
+from localizerx.matchers import PathMatcher, PathRules
+from openedx.core.djangoapps.site_configuration import helpers as configuration_helpers
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SiteSnapshot(namedtuple('SiteSnapshot', [
+        'enabled',
+        'language_code',
+        'api_matcher',
+        'path_rules',
+        'supported_languages',
+])):
+    """
+    Immutable view of the LocalizerX configuration of a single site.
+
+    It holds whether LocalizerX is `enabled` for the site, the `language_code` to enforce,
+    the `api_matcher` of the site's API endpoints, the `path_rules` of the site's `LOCALIZERX_PATH_LANGUAGES`
+    followed by its API endpoints as passthrough, and the `supported_languages` tuple to negotiate the language from,
+    which is empty unless the site allows negotiating the language with the browser.
+    """
+
+    __slots__ = ()
+
+
+# The site configuration keys LocalizerX reads.
+SITE_CONFIGURATION_KEYS = (
+    'ENABLE_LOCALIZERX',
+    'LANGUAGE_CODE',
+    'LOCALIZERX_API_URL_PREFIXES',
+    'LOCALIZERX_PATH_LANGUAGES',
+    'LOCALIZERX_SUPPORTED_LANGUAGES',
+)
+
+# The snapshots cache and the sites map, created lazily so they pick up the configured size and TTL.
+_CACHES = {}
+
+
+def get_sites_generation():
+    """
+    Get the generation counter of the site configurations, or None if `LOCALIZERX_GENERATION_CACHE` isn't configured.
+    """
+    if 'generation' not in _CACHES:
+        _CACHES['generation'] = build_generation_counter(SITES_GENERATION)
+    return _CACHES['generation']
+
+
+def is_generation_check_due():
+    """
+    Check whether the next `get_snapshots_cache` call may query the shared generation, or build its counter.
+    """
+    if 'generation' not in _CACHES:
+        return True
+    generation = _CACHES['generation']
+    return generation is not None and generation.is_check_due()
+
+
+def get_snapshots_cache():
+    """
+    Get the LRU cache of the site snapshots.
+
+    The snapshots are dropped when another worker has saved a site configuration, checked at most once per
+    `LOCALIZERX_GENERATION_CHECK_INTERVAL_MS`.
+    """
+    cache = _CACHES.get('snapshots')
+    if cache is None:
+        settings_snapshot = get_settings_snapshot()
+        get_sites_generation()
+        cache = _CACHES['snapshots'] = LRUCache(
+            maxsize=settings_snapshot.site_cache_size,
+            ttl=settings_snapshot.site_cache_ttl,
+        )
+
+    generation = _CACHES['generation']
+    if generation is not None and generation.has_changed():
+        cache.clear()
+        get_host_sites_cache().clear()
+    return cache
+
+
+def get_host_sites_cache():
+    """
+    Get the cache of the map of all the enabled sites' values, for `LOCALIZERX_SITES_BY_HOST`.
+    """
+    cache = _CACHES.get('host_sites')
+    if cache is None:
+        cache = _CACHES['host_sites'] = LRUCache(maxsize=1, ttl=get_settings_snapshot().site_cache_ttl)
+    return cache
+
+
+def get_site_key(request):
+    """
+    Get the cache key of the request's site.
+
+    The `CurrentSiteMiddleware` sets `request.site`, otherwise the request's host is used instead.
+    """
+    site = getattr(request, 'site', None)
+    if site is not None:
+        return site.domain
+    return request.get_host()
+
+
+def get_site_values(get_value=None):
+    """
+    Read the LocalizerX keys of a site configuration.
+
+    Args:
+        get_value: The `get_value(name)` function of a site configuration, defaults to the current site's one.
+    Return: A dict of the `SITE_CONFIGURATION_KEYS` values, None for the keys the site doesn't define.
+    """
+    if get_value is None:
+        get_value = configuration_helpers.get_value
+    return {key: get_value(key) for key in SITE_CONFIGURATION_KEYS}
+
+
+def build_site_snapshot(values=None):
+    """
+    Resolve the LocalizerX configuration of the current site, or of the given site configuration values.
+
+    Args:
+        values: The site configuration values read by `get_site_values`, defaults to the current site's ones.
+    Return: A `SiteSnapshot` instance.
+    """
+    if values is None:
+        values = get_site_values()
+        values['ENABLE_LOCALIZERX'] = is_feature_enabled()
+    settings_snapshot = get_settings_snapshot()
+    enabled = values.get('ENABLE_LOCALIZERX')
+    language_code = values.get('LANGUAGE_CODE')
+    api_prefixes = values.get('LOCALIZERX_API_URL_PREFIXES')
+    path_languages = values.get('LOCALIZERX_PATH_LANGUAGES')
+    supported_languages = values.get('LOCALIZERX_SUPPORTED_LANGUAGES')
+
+    if api_prefixes is None and path_languages is None:
+        # Most sites share the platform's rules, compiled once.
+        path_rules = get_path_rules()
+    else:
+        path_rules = PathRules(
+            settings_snapshot.path_languages if path_languages is None else path_languages,
+            settings_snapshot.api_url_prefixes if api_prefixes is None else api_prefixes,
+        )
+
+    return SiteSnapshot(
+        enabled=bool(settings_snapshot.feature_enabled if enabled is None else enabled),
+        language_code=settings_snapshot.language_code if language_code is None else language_code,
+        api_matcher=get_api_matcher() if api_prefixes is None else PathMatcher(api_prefixes),
+        path_rules=path_rules,
+        supported_languages=tuple(
+            settings_snapshot.supported_languages if supported_languages is None else supported_languages
+        ),
+    )
+
+
+def get_all_site_values():
+    """
+    Read the LocalizerX values of all the enabled sites, in a single query.
+
+    Return: A `{domain: values}` dict, see `get_site_values`.
+    """
+    from openedx.core.djangoapps.site_configuration.models import SiteConfiguration
+
+    return {
+        configuration.site.domain: get_site_values(configuration.get_value)
+        for configuration in SiteConfiguration.objects.filter(enabled=True).select_related('site')
+    }
+
+
+def get_host_sites():
+    """
+    Get the values of all the enabled sites keyed by their domain, read once per `LOCALIZERX_SITE_CACHE_TTL`.
+
+    Return: A `{domain: values}` dict, empty if the site configurations aren't available.
+    """
+    cache = get_host_sites_cache()
+    host_sites = cache.get('sites')
+    if host_sites is None:
+        try:
+            host_sites = get_all_site_values()
+        except ImportError:
+            LOGGER.warning('Could not import SiteConfiguration, all the hosts get the platform configuration.')
+            host_sites = {}
+        cache.set('sites', host_sites)
+    return host_sites
+
+
+def build_host_snapshot(host):
+    """
+    Resolve the LocalizerX configuration of a site by its host, out of the map of all the enabled sites.
+
+    Like Django's `get_current_site`, the host is looked up with its port, then without it. The unknown hosts get
+    the platform configuration.
+
+    Return: A `SiteSnapshot` instance.
+    """
+    host_sites = get_host_sites()
+    values = host_sites.get(host)
+    if values is None and ':' in host:
+        values = host_sites.get(host.rpartition(':')[0])
+    return build_site_snapshot(values or {})
+
+
+def get_cached_site_snapshot(request):
+    """
+    Get the LocalizerX configuration snapshot of the request's site, only if it's already cached.
+
+    Args:
+        request: A django request.
+    Return: A `SiteSnapshot` instance or None.
+    """
+    return get_snapshots_cache().get(get_site_key(request))
+
+
+def get_host_snapshot(site_key):
+    """
+    Get the LocalizerX configuration snapshot of a site by its cache key.
+
+    The snapshot is built with the current site configuration if it isn't cached yet, or with the site of the
+    host when `LOCALIZERX_SITES_BY_HOST` is enabled.
+
+    Args:
+        site_key: The site's domain or the request's host, see `get_site_key`.
+    Return: A `SiteSnapshot` instance.
+    """
+    cache = get_snapshots_cache()
+    snapshot = cache.get(site_key)
+    if snapshot is None:
+        if get_settings_snapshot().sites_by_host:
+            snapshot = build_host_snapshot(site_key)
+        else:
+            snapshot = build_site_snapshot()
+        cache.set(site_key, snapshot)
+    return snapshot
+
+
+def get_site_snapshot(request):
+    """
+    Get the LocalizerX configuration snapshot of the request's site.
+
+    Args:
+        request: A django request.
+    Return: A `SiteSnapshot` instance.
+    """
+    return get_host_snapshot(get_site_key(request))
+
+
+def invalidate_site_snapshot(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Discard the snapshot of a site when its `SiteConfiguration` is saved, and let the other workers know.
+    """
+    generation = get_sites_generation()
+    if generation is not None:
+        generation.bump()
+
+    get_host_sites_cache().clear()
+    cache = get_snapshots_cache()
+    site = getattr(instance, 'site', None)
+    if site is None or get_settings_snapshot().sites_by_host:
+        # The aliases of the site's domain can't be told apart from the other hosts, see `build_host_snapshot`.
+        cache.clear()
+        return
+
+    # The snapshots of the requests without `request.site` are keyed by their host, which may have a port.
+    for site_key in cache.keys():
+        if site_key == site.domain or site_key.rpartition(':')[0] == site.domain:
+            cache.pop(site_key)
+
+
+@receiver(setting_changed)
+def reset_site_snapshots(**kwargs):  # pylint: disable=unused-argument
+    """
+    Discard all the snapshots when the settings are modified e.g. via `override_settings`.
+    """
+    _CACHES.clear()
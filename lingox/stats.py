@@ -0,0 +1,361 @@
+"""
+Bounded-memory statistics of the browser languages each site receives, versus the languages LocalizerX enforces.
+
+When `LOCALIZERX_LANGUAGE_STATS_PATH` is configured, the `DefaultLocaleMiddleware` tallies the
+`(site, browser language, enforced language)` of the requests it patches. The browser language is the primary
+subtag of the first entry of the original `Accept-Language` header e.g. `ar` for `ar-SA,en;q=0.8`.
+
+The tallies are kept in a count-min sketch with a fixed number of counters, and the most frequent keys in a
+bounded set of heavy hitters, so the memory stays the same however diverse the headers are. The counts are never
+underestimated, and overestimated by at most `e * total / SKETCH_WIDTH` i.e. 0.13% of the total with a 98%
+probability.
+
+Each process periodically replaces its own stats file, and the `localizerx_merge_language_stats` command merges
+the files of all the workers. The file is written inline by the first request recorded after the interval, which is
+slower by the time it takes to serialize and write the stats.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import struct
+import threading
+from timeit import default_timer
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from localizerx.config import get_settings_snapshot
+
+LOGGER = logging.getLogger(__name__)
+
+# The sketch dimensions are fixed, so the files of all the workers can be merged.
+SKETCH_WIDTH = 2048
+SKETCH_DEPTH = 4  # The four 32 bits words of an MD5 digest.
+
+# The number of keys whose sketch indexes are kept, the memo is cleared when it's full.
+MAX_MEMOIZED_INDEXES = 1024
+
+# Bump the version whenever the file format changes, the files of the other versions can't be merged.
+STATS_FORMAT_VERSION = 1
+
+# The placeholder of the process id in `LOCALIZERX_LANGUAGE_STATS_PATH`, each worker writes its own file.
+PID_PLACEHOLDER = '{pid}'
+
+# The browser language of the requests without a usable `Accept-Language` header.
+UNKNOWN_LANGUAGE = '-'
+
+KEY_SEPARATOR = '\t'
+
+# The primary subtag of the header's first entry, the browsers list their preferred language first.
+PRIMARY_TAG_RE = re.compile(r'[ \t]{0,8}([A-Za-z]{1,8})(?:[-;, \t]|$)')
+
+
+def get_primary_tag(header):
+    """
+    Get the primary subtag of the browser's preferred language e.g. `ar` for `ar-SA,en;q=0.8`.
+
+    The match is anchored and bounded, so only the first few characters of the header are read.
+
+    Return: The lower case primary subtag, or `UNKNOWN_LANGUAGE`.
+    """
+    match = PRIMARY_TAG_RE.match(header)
+    if match is None:
+        return UNKNOWN_LANGUAGE
+    return match.group(1).lower()
+
+
+def get_sketch_indexes(key, width):
+    """
+    Hash a key into one index per row of the sketch.
+
+    The hash has to be the same in every process, unlike `hash()` which is randomized in Python 3.
+    """
+    return tuple(word % width for word in struct.unpack('<4I', hashlib.md5(key.encode('utf-8')).digest()))
+
+
+class CountMinSketch(object):
+    """
+    Fixed-size approximate counter of arbitrary keys.
+    """
+
+    __slots__ = ('width', 'rows', 'total', '_indexes')
+
+    def __init__(self, width=SKETCH_WIDTH):
+        """
+        Initialize an empty sketch.
+        """
+        self.width = width
+        self.rows = [[0] * width for _row in range(SKETCH_DEPTH)]
+        self.total = 0
+        self._indexes = {}
+
+    def get_indexes(self, key):
+        """
+        Get the indexes of a key, memoized since the same few keys are counted over and over.
+        """
+        indexes = self._indexes.get(key)
+        if indexes is None:
+            if len(self._indexes) >= MAX_MEMOIZED_INDEXES:
+                self._indexes.clear()
+            indexes = self._indexes[key] = get_sketch_indexes(key, self.width)
+        return indexes
+
+    def add(self, key, count=1):
+        """
+        Count a key.
+
+        Return: The new estimate of the key's count.
+        """
+        first, second, third, fourth = self.get_indexes(key)
+        rows = self.rows
+        rows[0][first] += count
+        rows[1][second] += count
+        rows[2][third] += count
+        rows[3][fourth] += count
+        self.total += count
+        return min(rows[0][first], rows[1][second], rows[2][third], rows[3][fourth])
+
+    def estimate(self, key):
+        """
+        Estimate the count of a key, which is never below its actual count.
+        """
+        return min(row[index] for row, index in zip(self.rows, self.get_indexes(key)))
+
+    def merge(self, other):
+        """
+        Add the counts of another sketch of the same width to this one.
+        """
+        if other.width != self.width:
+            raise ValueError('Cannot merge sketches of different widths: {width} and {other_width}'.format(
+                width=self.width, other_width=other.width,
+            ))
+        for row, other_row in zip(self.rows, other.rows):
+            for index, count in enumerate(other_row):
+                row[index] += count
+        self.total += other.total
+
+
+class HeavyHitters(object):
+    """
+    Bounded set of the keys with the highest estimated counts.
+
+    The candidates are pruned to the `capacity` best ones whenever their number doubles, so keeping them costs an
+    amortized constant time. A pruned key that keeps coming back is offered again with its full estimate.
+    """
+
+    __slots__ = ('capacity', 'estimates')
+
+    def __init__(self, capacity):
+        """
+        Initialize an empty set.
+        """
+        self.capacity = capacity
+        self.estimates = {}
+
+    def offer(self, key, estimate):
+        """
+        Offer a key with its current estimate.
+        """
+        self.estimates[key] = estimate
+        if len(self.estimates) > 2 * self.capacity:
+            self.prune()
+
+    def prune(self):
+        """
+        Only keep the `capacity` best keys.
+        """
+        self.estimates = dict(self.top())
+
+    def top(self):
+        """
+        Get the `capacity` best keys.
+
+        Return: A list of `(key, estimate)` tuples, the most frequent first.
+        """
+        return sorted(self.estimates.items(), key=lambda item: (-item[1], item[0]))[:self.capacity]
+
+
+class LanguageStats(object):
+    """
+    Tally the browser and enforced languages of each site, and periodically write them to a file.
+
+    The path contains `{pid}`, so each worker process writes its own file.
+    """
+
+    def __init__(self, path, interval, capacity, width=SKETCH_WIDTH):
+        """
+        Initialize empty stats.
+        """
+        self.path = path
+        self.interval = interval
+        self.sketch = CountMinSketch(width)
+        self.heavy_hitters = HeavyHitters(capacity)
+        self.next_flush_at = default_timer() + interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def record(self, site, header, language):
+        """
+        Count a request patched by LocalizerX.
+
+        Args:
+            site: The site's domain, see `localizerx.sites.get_site_key`.
+            header: The original `Accept-Language` header of the request.
+            language: The language LocalizerX enforced.
+        """
+        key = KEY_SEPARATOR.join((site, get_primary_tag(header), language))
+        with self._lock:
+            self.heavy_hitters.offer(key, self.sketch.add(key))
+        self.maybe_flush()
+
+    def merge(self, other):
+        """
+        Add the tallies of other stats, e.g. the stats file of another worker, to these ones.
+        """
+        self.sketch.merge(other.sketch)
+        # The candidates of both sides are estimated again with the merged counts.
+        estimates = self.heavy_hitters.estimates
+        estimates.update(other.heavy_hitters.estimates)
+        for key in estimates:
+            estimates[key] = self.sketch.estimate(key)
+        self.heavy_hitters.prune()
+
+    def top(self):
+        """
+        Get the most frequent tallies.
+
+        Return: A list of `(site, browser_language, enforced_language, estimate)` tuples, the most frequent first.
+        """
+        return [tuple(key.split(KEY_SEPARATOR)) + (estimate,) for key, estimate in self.heavy_hitters.top()]
+
+    def to_dict(self):
+        """
+        Get the stats as a JSON serializable dict.
+        """
+        with self._lock:
+            return {
+                'version': STATS_FORMAT_VERSION,
+                'width': self.sketch.width,
+                'total': self.sketch.total,
+                'rows': [list(row) for row in self.sketch.rows],
+                'heavy_hitters': [list(row) for row in self.top()],
+            }
+
+    @classmethod
+    def from_dict(cls, data, path=None, interval=0):
+        """
+        Load the stats out of a dict written by `to_dict`.
+        """
+        if data.get('version') != STATS_FORMAT_VERSION:
+            raise ValueError('Unsupported language stats version: {version}'.format(version=data.get('version')))
+
+        stats = cls(path, interval, capacity=len(data['heavy_hitters']), width=data['width'])
+        stats.sketch.rows = [list(row) for row in data['rows']]
+        stats.sketch.total = data['total']
+        for site, browser_language, language, estimate in data['heavy_hitters']:
+            stats.heavy_hitters.offer(KEY_SEPARATOR.join((site, browser_language, language)), estimate)
+        return stats
+
+    def is_flush_due(self):
+        """
+        Check whether the next recorded request writes the stats file.
+        """
+        return default_timer() >= self.next_flush_at
+
+    def maybe_flush(self):
+        """
+        Write the stats if the interval has elapsed, without blocking if another thread is writing.
+
+        The stats are written in the calling thread i.e. while serving the request being recorded.
+        """
+        if not self.is_flush_due():
+            return
+
+        if self._flush_lock.acquire(False):
+            try:
+                self.next_flush_at = default_timer() + self.interval
+                self.flush()
+            finally:
+                self._flush_lock.release()
+
+    def flush(self):
+        """
+        Replace the stats file of the current process atomically.
+        """
+        path = self.path.format(pid=os.getpid())
+        try:
+            write_stats_file(self, path)
+        except (IOError, OSError):
+            LOGGER.exception('Could not write the LocalizerX language stats to %s', path)
+
+
+def write_stats_file(stats, path):
+    """
+    Write the stats to a file, replacing it atomically.
+    """
+    temp_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+    with open(temp_path, 'w') as stats_file:
+        stats_file.write(json.dumps(stats.to_dict(), separators=(',', ':')))
+    os.rename(temp_path, path)
+
+
+def load_stats_file(path):
+    """
+    Load a stats file written by `LanguageStats.flush`.
+
+    Return: A `LanguageStats` instance.
+    """
+    with open(path) as stats_file:
+        return LanguageStats.from_dict(json.load(stats_file))
+
+
+# Lazily configured state: the stats of the current process.
+_STATE = {}
+
+
+def get_language_stats():
+    """
+    Get the language stats of the current process, or None if `LOCALIZERX_LANGUAGE_STATS_PATH` isn't configured.
+    """
+    if 'stats' not in _STATE:
+        settings_snapshot = get_settings_snapshot()
+        stats = None
+        if settings_snapshot.language_stats_path:
+            if PID_PLACEHOLDER not in settings_snapshot.language_stats_path:
+                raise ImproperlyConfigured(
+                    'LOCALIZERX_LANGUAGE_STATS_PATH should contain {placeholder}, otherwise the worker processes '
+                    'overwrite each other\'s stats: {path}'.format(
+                        placeholder=PID_PLACEHOLDER, path=settings_snapshot.language_stats_path,
+                    )
+                )
+            stats = LanguageStats(
+                settings_snapshot.language_stats_path,
+                interval=settings_snapshot.language_stats_interval,
+                capacity=settings_snapshot.language_stats_capacity,
+            )
+        _STATE['stats'] = stats
+    return _STATE['stats']
+
+
+@atexit.register
+def flush_at_exit():
+    """
+    Write the last tallies when the process exits.
+    """
+    stats = _STATE.get('stats')
+    if stats is not None:
+        stats.flush()
+
+
+@receiver(setting_changed)
+def reset_language_stats(**kwargs):  # pylint: disable=unused-argument
+    """
+    Discard the stats when the settings are modified e.g. via `override_settings`.
+    """
+    _STATE.clear()
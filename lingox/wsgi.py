@@ -0,0 +1,58 @@
+"""
+WSGI middleware for the LocalizerX module.
+
+The `LocalizerXWSGIMiddleware` wraps the WSGI application, e.g. in the `lms/wsgi.py` module::
+
+    from django.core.wsgi import get_wsgi_application
+    from localizerx.wsgi import LocalizerXWSGIMiddleware
+
+    application = LocalizerXWSGIMiddleware(get_wsgi_application())
+
+It patches the `HTTP_ACCEPT_LANGUAGE` of the WSGI environ before Django builds its request, so the components
+that don't go through the Django middlewares get the site language as well. The decision is made by
+`localizerx.decisions.decide_environ` with the site snapshots the `DefaultLocaleMiddleware` caches, and kept in the
+environ so the `DefaultLocaleMiddleware` applies the rest of it e.g. the `Vary` header without deciding again.
+"""
+from __future__ import absolute_import, unicode_literals
+
+from localizerx.decisions import ENVIRON_DECISION_KEY, decide_environ
+from localizerx.helpers import truncate_accept_language
+from localizerx.instrumentation import BYPASSED_REQUESTS, REGISTRY
+
+
+def patch_environ(environ, language_code):
+    """
+    Enforce the language on the WSGI environ, the same way `DefaultLocaleMiddleware.patch_request` does.
+    """
+    if 'HTTP_ACCEPT_LANGUAGE' in environ:
+        # Preserve the browser provided language just in case, truncated if it's pathologically long.
+        environ['_HTTP_ACCEPT_LANGUAGE'] = truncate_accept_language(environ['HTTP_ACCEPT_LANGUAGE'])
+    environ['HTTP_ACCEPT_LANGUAGE'] = language_code
+
+
+class LocalizerXWSGIMiddleware(object):
+    """
+    WSGI variant of the `DefaultLocaleMiddleware`, which runs before Django builds the request.
+
+    The requests to the sites that aren't cached yet are left to the `DefaultLocaleMiddleware`, which should stay
+    installed to resolve the site configuration, activate the language and normalize the `Vary` header.
+    """
+
+    def __init__(self, application):
+        """
+        Wrap the WSGI application.
+        """
+        self.application = application
+
+    def __call__(self, environ, start_response):
+        """
+        Patch the environ and pass it to the application.
+        """
+        decision = decide_environ(environ)
+        if decision is not None:
+            if decision.bypass:
+                REGISTRY.increment(BYPASSED_REQUESTS)
+            elif decision.language is not None:
+                patch_environ(environ, decision.language)
+            environ[ENVIRON_DECISION_KEY] = decision
+        return self.application(environ, start_response)
@@ -8,6 +8,10 @@ import re
 import sys
 
 from setuptools import setup
+from setuptools.command.build_py import build_py
+
+# The asynchronous middleware support uses the Python 3 syntax, and is never imported on Python 2.
+PYTHON3_ONLY_MODULES = ('coroutines',)
 
 
 def get_version(*file_paths):
@@ -23,6 +27,18 @@ def get_version(*file_paths):
     raise RuntimeError('Unable to find version string.')
 
 
+class BuildPy(build_py):
+    """
+    Leave the Python 3 only modules out of the Python 2 builds, so they aren't byte-compiled there.
+    """
+
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info[0] < 3:
+            modules = [module for module in modules if module[1] not in PYTHON3_ONLY_MODULES]
+        return modules
+
+
 VERSION = get_version('localizerx', '__init__.py')
 
 if sys.argv[-1] == 'tag':
@@ -44,8 +60,11 @@ setup(
     url='https://github.com/appsembler/localizerx',
     packages=[
         'localizerx',
+        'localizerx.management',
+        'localizerx.management.commands',
     ],
     include_package_data=True,
+    cmdclass={'build_py': BuildPy},
     install_requires=[
         "Django>=1.8,<2.1"
     ],
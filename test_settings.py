@@ -24,6 +24,15 @@ def root(*args):
 # Dummy value to emulate the Open edX site configuration helpers.
 MOCK_SITE_CONFIGS = {}
 
+# Dummy value to emulate the configuration values of all the sites, a list of dicts.
+MOCK_SITE_CONFIGURATIONS = []
+
+# Dummy value to emulate the users' preferences, i.e. `{username: {key: value}}`.
+MOCK_USER_PREFERENCES = {}
+
+# Dummy value to emulate the current `DarkLangConfig`, the keyword arguments of the mock model.
+MOCK_DARK_LANG_CONFIG = {}
+
 # Dummy value to emulate the Open edX `ENV_TOKENS` in `aws.py`.
 ENV_TOKENS = {}
 
@@ -0,0 +1,2 @@
+# Emulate the `openedx.core.djangoapps.dark_lang` constants.
+DARK_LANGUAGE_KEY = 'dark-lang'
@@ -1,2 +1,61 @@
+from __future__ import absolute_import, unicode_literals
+
+from django.conf import settings
+from django.utils.translation import LANGUAGE_SESSION_KEY
+from django.utils.translation.trans_real import parse_accept_lang_header
+
+from openedx.core.djangoapps.dark_lang import DARK_LANGUAGE_KEY
+from openedx.core.djangoapps.dark_lang.models import DarkLangConfig
+from openedx.core.djangoapps.user_api.preferences.api import get_user_preference
+
+
 class DarkLangMiddleware(object):
-    pass
+    """
+    Emulate the `DarkLangMiddleware` in `openedx.core.djangoapps.dark_lang.middleware`.
+
+    Like the real one, it reads the `DarkLangConfig` several times on every request.
+    """
+
+    @property
+    def released_langs(self):
+        language_options = DarkLangConfig.current().released_languages_list
+        if settings.LANGUAGE_CODE not in language_options:
+            language_options.append(settings.LANGUAGE_CODE)
+        return language_options
+
+    def process_request(self, request):
+        if not DarkLangConfig.current().enabled:
+            return
+        self._clean_accept_headers(request)
+        self._activate_preview_language(request)
+
+    def _fuzzy_match(self, lang_code):
+        if lang_code in self.released_langs:
+            return lang_code
+        lang_prefix = lang_code.partition('-')[0]
+        for released_lang in self.released_langs:
+            if lang_prefix == released_lang.partition('-')[0]:
+                return released_lang
+        return None
+
+    def _clean_accept_headers(self, request):
+        accept = request.META.get('HTTP_ACCEPT_LANGUAGE', None)
+        if accept is None or accept == '*':
+            return
+
+        new_accept = []
+        for lang, priority in parse_accept_lang_header(accept):
+            fuzzy_code = self._fuzzy_match(lang.lower())
+            if fuzzy_code:
+                new_accept.append('{};q={}'.format(fuzzy_code, priority))
+        request.META['HTTP_ACCEPT_LANGUAGE'] = ', '.join(new_accept)
+
+    def _activate_preview_language(self, request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return
+
+        preview_lang = get_user_preference(user, DARK_LANGUAGE_KEY)
+        if preview_lang:
+            request.session[LANGUAGE_SESSION_KEY] = preview_lang
+            request.META['HTTP_ACCEPT_LANGUAGE'] = preview_lang
@@ -0,0 +1,33 @@
+from __future__ import absolute_import, unicode_literals
+
+from django.conf import settings
+
+
+class DarkLangConfig(object):
+    """
+    Emulate the `DarkLangConfig` configuration model in `openedx.core.djangoapps.dark_lang.models`.
+
+    The current configuration is read from `settings.MOCK_DARK_LANG_CONFIG` instead of the database.
+    """
+
+    def __init__(self, enabled=False, released_languages='', enable_beta_languages=False, beta_languages=''):
+        self.enabled = enabled
+        self.released_languages = released_languages
+        self.enable_beta_languages = enable_beta_languages
+        self.beta_languages = beta_languages
+
+    @classmethod
+    def current(cls):
+        return cls(**settings.MOCK_DARK_LANG_CONFIG)
+
+    @property
+    def released_languages_list(self):
+        if not self.released_languages.strip():
+            return []
+        return sorted(language.lower().strip() for language in self.released_languages.split(','))
+
+    @property
+    def beta_languages_list(self):
+        if not self.beta_languages.strip():
+            return []
+        return sorted(language.lower().strip() for language in self.beta_languages.split(','))
@@ -0,0 +1,2 @@
+# Emulate the `openedx.core.djangoapps.lang_pref` constants.
+LANGUAGE_KEY = 'pref-lang'
@@ -1,2 +1,21 @@
+from __future__ import absolute_import, unicode_literals
+
+from django.utils.translation import LANGUAGE_SESSION_KEY
+
+from openedx.core.djangoapps.lang_pref import LANGUAGE_KEY
+from openedx.core.djangoapps.user_api.preferences.api import get_user_preference
+
+
 class LanguagePreferenceMiddleware(object):
-    pass
+    """
+    Emulate the `LanguagePreferenceMiddleware` in `openedx.core.djangoapps.lang_pref.middleware`.
+
+    Like the real one, it reads the user's language preference from the database on every authenticated request.
+    """
+
+    def process_request(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            user_pref = get_user_preference(user, LANGUAGE_KEY)
+            if user_pref:
+                request.session[LANGUAGE_SESSION_KEY] = user_pref
@@ -0,0 +1,53 @@
+from __future__ import absolute_import, unicode_literals
+
+from django.conf import settings
+
+
+class MockSite(object):
+    """
+    Emulate `django.contrib.sites.models.Site`.
+    """
+
+    def __init__(self, domain):
+        self.domain = domain
+
+
+class SiteConfigurationQuerySet(list):
+    """
+    Emulate the `SiteConfiguration` query sets.
+    """
+
+    def select_related(self, *fields):  # pylint: disable=unused-argument
+        return self
+
+
+class SiteConfigurationManager(object):
+    """
+    Emulate the `SiteConfiguration.objects` manager with the values listed in `settings.MOCK_SITE_CONFIGURATIONS`.
+
+    The domain of each site is the `SITE_NAME` of its values, `example.com` by default.
+    """
+
+    def filter(self, enabled=True):
+        return SiteConfigurationQuerySet([
+            SiteConfiguration(site=MockSite(values.get('SITE_NAME', 'example.com')), values=values, enabled=True)
+            for values in settings.MOCK_SITE_CONFIGURATIONS
+        ] if enabled else [])
+
+
+class SiteConfiguration(object):
+    """
+    Emulate the `SiteConfiguration` model in `openedx.core.djangoapps.site_configuration.models`.
+
+    The mock isn't a real Django model, but it can be used as a `post_save` sender in tests.
+    """
+
+    objects = SiteConfigurationManager()
+
+    def __init__(self, site=None, values=None, enabled=True):
+        self.site = site
+        self.values = values or {}
+        self.enabled = enabled
+
+    def get_value(self, name, default=None):
+        return self.values.get(name, default)
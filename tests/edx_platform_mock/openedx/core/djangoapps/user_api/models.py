@@ -0,0 +1,14 @@
+from __future__ import absolute_import, unicode_literals
+
+
+class UserPreference(object):
+    """
+    Emulate the `UserPreference` model in `openedx.core.djangoapps.user_api.models`.
+
+    The mock isn't a real Django model, but it can be used as a `post_save` sender in tests.
+    """
+
+    def __init__(self, user=None, key=None, value=None):
+        self.user = user
+        self.key = key
+        self.value = value
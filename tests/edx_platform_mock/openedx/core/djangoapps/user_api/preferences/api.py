@@ -0,0 +1,14 @@
+from __future__ import absolute_import, unicode_literals
+
+from django.conf import settings
+
+
+def get_user_preference(requesting_user, preference_key, username=None):
+    """
+    Emulate the `get_user_preference` in `openedx.core.djangoapps.user_api.preferences.api`.
+
+    The preferences are read from `settings.MOCK_USER_PREFERENCES` i.e. `{username: {key: value}}` instead of the
+    database.
+    """
+    username = username or requesting_user.username
+    return settings.MOCK_USER_PREFERENCES.get(username, {}).get(preference_key)
@@ -5,6 +5,7 @@ from __future__ import absolute_import, unicode_literals
 
 from django.conf.urls import url
 
+from localizerx.cache import cache_page
 from test_site import views
 
 urlpatterns = [
@@ -15,5 +16,7 @@ urlpatterns = [
     url(r'^reporting/api/$', views.api),
 
     url(r'^dashboard/$', views.home),
+    url(r'^counter/$', views.counter),
+    url(r'^cached_counter/$', cache_page(60)(views.counter)),
     url(r'^$', views.home),
 ]
@@ -1,5 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 
+from itertools import count
+
 from django.http.response import HttpResponse
 from django.utils.translation import ugettext as _
 
@@ -10,3 +12,10 @@ def api(request):
 
 def home(request):
     return HttpResponse(_('Hello World!'))
+
+
+VIEW_CALLS = count(1)
+
+
+def counter(request):
+    return HttpResponse('{greeting} {calls}'.format(greeting=_('Hello World!'), calls=next(VIEW_CALLS)))
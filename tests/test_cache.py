@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the LocalizerX language-aware cache keys.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import ddt
+
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from localizerx.cache import get_cache_key, get_page_key, get_request_language
+from localizerx.helpers import add_locale_middleware
+from localizerx.middleware import DefaultLocaleMiddleware
+
+MIDDLEWARE_CLASSES = (
+    ('localizerx.cache.UpdateCacheMiddleware',)
+    + add_locale_middleware([
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.contrib.sites.middleware.CurrentSiteMiddleware',
+        'openedx.core.djangoapps.lang_pref.middleware.LanguagePreferenceMiddleware',
+        'openedx.core.djangoapps.dark_lang.middleware.DarkLangMiddleware',
+        'django.middleware.locale.LocaleMiddleware',
+        'django.middleware.common.CommonMiddleware',
+    ])
+    + ('localizerx.cache.FetchFromCacheMiddleware',)
+)
+
+
+@ddt.ddt
+@override_settings(
+    ALLOWED_HOSTS=['*'],
+    LANGUAGE_CODE='eo',
+    FEATURES={'ENABLE_LOCALIZERX': True},
+    MIDDLEWARE_CLASSES=MIDDLEWARE_CLASSES,
+)
+class LanguageCacheKeyTest(TestCase):
+    """
+    Tests for caching the pages per site and language.
+    """
+
+    def setUp(self):
+        """
+        Start with an empty cache.
+        """
+        super(LanguageCacheKeyTest, self).setUp()
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+
+    def get(self, path, accept_language, host='testserver', secure=False):
+        """
+        Request a page and return its content.
+        """
+        response = self.client.get(path, HTTP_ACCEPT_LANGUAGE=accept_language, HTTP_HOST=host, secure=secure)
+        assert response.status_code == 200
+        return response.content.decode('utf-8')
+
+    @ddt.data('/counter/', '/cached_counter/')
+    def test_site_language_ignores_vary(self, path):
+        """
+        The pages in the site language shouldn't fragment on the `Vary: Accept-Language` of their responses.
+        """
+        response = self.client.get(path, HTTP_ACCEPT_LANGUAGE='ar-SA,ar;q=0.9')
+        assert 'Accept-Language' in response['Vary']
+        first = response.content.decode('utf-8')
+        assert first.startswith('Héllö Wörld!')
+        assert self.get(path, 'en') == first
+        assert self.get(path, 'fr-FR,fr;q=0.9,en;q=0.8,*;q=0.1') == first
+
+        caches['default'].clear()
+        with override_settings(FEATURES={'ENABLE_LOCALIZERX': False}):
+            # The browsers languages are cached separately without LocalizerX.
+            assert self.get(path, 'en') != self.get(path, 'ar-SA,ar;q=0.9')
+
+    @ddt.data('/counter/', '/cached_counter/')
+    def test_schemes_and_hosts(self, path):
+        """
+        The pages should be cached per scheme and host, like Django does, even when the hosts share a site.
+        """
+        page = self.get(path, 'en')
+        assert self.get(path, 'en') == page
+        assert self.get(path, 'en', secure=True) != page
+        assert self.get(path, 'en', host='testserver:8000') != page
+
+    @override_settings(MOCK_SITE_CONFIGS={'LOCALIZERX_SUPPORTED_LANGUAGES': ['en', 'eo']})
+    def test_negotiated_languages(self):
+        """
+        The negotiated languages should be cached separately, each regardless of the browser headers.
+        """
+        english = self.get('/counter/', 'en-US,en;q=0.9')
+        assert english.startswith('Hello World!')
+        assert self.get('/counter/', 'en-GB') == english
+
+        esperanto = self.get('/counter/', 'eo')
+        assert esperanto.startswith('Héllö Wörld!')
+        assert self.get('/counter/', 'fr') == esperanto, 'The site language is the fallback'
+
+    def test_sites_and_paths(self):
+        """
+        The pages should be cached per site and path.
+        """
+        page = self.get('/counter/', 'en')
+        assert self.get('/counter/', 'en', host='other.example.com') != page
+        assert self.get('/counter/?page=2', 'en') != page
+
+    def test_key_reuses_decision(self):
+        """
+        The key should use the language decided by the `DefaultLocaleMiddleware`.
+        """
+        request_factory = RequestFactory()
+        requests = [
+            request_factory.get('/counter/', HTTP_ACCEPT_LANGUAGE=accept_language)
+            for accept_language in ('en', 'ar')
+        ]
+        for request in requests:
+            DefaultLocaleMiddleware().process_request(request)
+            assert get_request_language(request) == 'eo'
+
+        self.get('/counter/', 'en')
+        keys = {get_cache_key(request) for request in requests}
+        assert len(keys) == 1
+        assert None not in keys
+
+    def test_time_zones(self):
+        """
+        The pages should be cached per time zone when `USE_TZ` is enabled, like Django does.
+        """
+        request = RequestFactory().get('/counter/')
+        request.LANGUAGE_CODE = 'eo'
+        with timezone.override('Europe/Paris'):
+            paris_key = get_page_key(request)
+        with timezone.override('Asia/Amman'):
+            assert get_page_key(request) != paris_key
+            assert get_page_key(request).endswith('.Asia/Amman')
+            with override_settings(USE_TZ=False):
+                assert get_page_key(request) == paris_key.rpartition('.')[0]
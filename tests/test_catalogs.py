@@ -0,0 +1,95 @@
+"""
+Tests for the LocalizerX translation catalogs warm-up.
+"""
+from __future__ import absolute_import, unicode_literals
+
+from mock import patch
+
+from django.apps import apps
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils.translation import trans_real
+
+from localizerx.catalogs import get_site_languages, get_warmup_languages, start_catalog_warmup, warm_up_catalogs
+
+
+@override_settings(
+    LANGUAGE_CODE='eo',
+    ENV_TOKENS={'LOCALIZERX_SUPPORTED_LANGUAGES': ['en', 'eo']},
+    MOCK_SITE_CONFIGURATIONS=[
+        {'LANGUAGE_CODE': 'ar'},
+        {'LANGUAGE_CODE': 'en', 'LOCALIZERX_SUPPORTED_LANGUAGES': ['ar', 'fr']},
+        {},
+    ],
+)
+class CatalogsWarmupTest(TestCase):
+    """
+    Tests for loading the translation catalogs ahead of the requests.
+    """
+
+    def setUp(self):
+        """
+        Start with no loaded catalogs.
+        """
+        super(CatalogsWarmupTest, self).setUp()
+        patcher = patch.dict(trans_real._translations, clear=True)  # pylint: disable=protected-access
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_warmup_languages(self):
+        """
+        The platform language should come first, then the supported and the site languages without duplicates.
+        """
+        assert get_warmup_languages() == ['eo', 'en', 'ar', 'fr']
+
+    def test_site_languages_without_database(self):
+        """
+        The warm-up should go on without the site languages if they can't be read.
+        """
+        with patch(
+            'openedx.core.djangoapps.site_configuration.models.SiteConfiguration.objects.filter',
+            side_effect=DatabaseError,
+        ):
+            assert get_site_languages() == []
+
+    def test_warm_up_catalogs(self):
+        """
+        The catalogs should be loaded into Django's translations cache.
+        """
+        duration = warm_up_catalogs(['ar', 'eo'])
+        assert duration > 0
+        assert set(trans_real._translations) == {'ar', 'eo'}  # pylint: disable=protected-access
+
+    def test_background_warmup(self):
+        """
+        The catalogs should be loaded in a background thread by default.
+        """
+        thread = start_catalog_warmup()
+        thread.join(10)
+        assert not thread.is_alive()
+        assert set(trans_real._translations) == {'eo', 'en', 'ar', 'fr'}  # pylint: disable=protected-access
+
+    @override_settings(ENV_TOKENS={'LOCALIZERX_WARMUP_IN_BACKGROUND': False})
+    def test_blocking_warmup(self):
+        """
+        The catalogs should be loaded right away if the background thread is disabled.
+        """
+        assert start_catalog_warmup() is None
+        assert 'eo' in trans_real._translations  # pylint: disable=protected-access
+
+    @override_settings(ENV_TOKENS={'LOCALIZERX_WARMUP_CATALOGS': True})
+    def test_warmup_on_ready(self):
+        """
+        The app should start the warm-up when it's ready, if enabled.
+        """
+        with patch('localizerx.apps.start_catalog_warmup') as start_warmup:
+            apps.get_app_config('localizerx').ready()
+        assert start_warmup.called
+
+    def test_no_warmup_by_default(self):
+        """
+        The app shouldn't load the catalogs unless the warm-up is enabled.
+        """
+        with patch('localizerx.apps.start_catalog_warmup') as start_warmup:
+            apps.get_app_config('localizerx').ready()
+        assert not start_warmup.called
@@ -0,0 +1,83 @@
+"""
+Tests for the LocalizerX settings snapshot.
+"""
+from __future__ import absolute_import, unicode_literals
+
+from mock import patch
+
+from django.apps import apps
+from django.conf import LazySettings
+from django.contrib.sites.requests import RequestSite
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from localizerx.config import DEFAULT_API_URL_PREFIXES, build_settings_snapshot, get_settings_snapshot
+from localizerx.middleware import DefaultLocaleMiddleware
+
+
+class SettingsSnapshotTest(TestCase):
+    """
+    Tests for freezing the LocalizerX settings.
+    """
+
+    @override_settings(
+        LANGUAGE_CODE='ar',
+        FEATURES={'ENABLE_LOCALIZERX': True},
+        ENV_TOKENS={'LOCALIZERX_SUPPORTED_LANGUAGES': ['en', 'ar'], 'LOCALIZERX_PREFERENCE_COOKIE': True},
+        USE_TZ=False,
+    )
+    def test_snapshot(self):
+        """
+        The snapshot should hold the settings with their defaults.
+        """
+        snapshot = get_settings_snapshot()
+        assert snapshot.feature_enabled
+        assert snapshot.language_code == 'ar'
+        assert snapshot.supported_languages == ('en', 'ar')
+        assert not snapshot.use_tz
+        assert snapshot.api_url_prefixes == DEFAULT_API_URL_PREFIXES
+        assert not snapshot.normalize_vary, 'Opt-in'
+        assert not snapshot.preference_cookie, 'The cookie needs the preference cache'
+
+    def test_immutable(self):
+        """
+        The snapshot can't be modified, and doesn't have a `__dict__` to grow.
+        """
+        snapshot = get_settings_snapshot()
+        with self.assertRaises(AttributeError):
+            snapshot.language_code = 'ar'
+        assert not hasattr(snapshot, '__dict__')
+
+    def test_rebuilt_on_change(self):
+        """
+        The snapshot should be rebuilt when the settings are modified, and restored afterwards.
+        """
+        assert get_settings_snapshot().language_code == 'eo'
+        with override_settings(LANGUAGE_CODE='ar'):
+            assert get_settings_snapshot().language_code == 'ar'
+        assert get_settings_snapshot().language_code == 'eo'
+
+    def test_built_on_ready(self):
+        """
+        The app should freeze the settings when it's ready.
+        """
+        with patch('localizerx.config.build_settings_snapshot', wraps=build_settings_snapshot) as build:
+            apps.get_app_config('localizerx').ready()
+        assert build.called
+
+    @override_settings(LANGUAGE_CODE='eo', FEATURES={'ENABLE_LOCALIZERX': True}, ALLOWED_HOSTS=['*'])
+    def test_middleware_skips_lazy_settings(self):
+        """
+        The middleware should only read the snapshot once the site's configuration is cached.
+        """
+        middleware = DefaultLocaleMiddleware()
+        request = RequestFactory().get('/dashboard/', HTTP_ACCEPT_LANGUAGE='ar')
+        request.site = RequestSite(request)
+        middleware.process_request(request)
+
+        request.META['HTTP_ACCEPT_LANGUAGE'] = 'ar'
+        response = HttpResponse()
+        with patch.object(LazySettings, '__getattr__', side_effect=AssertionError('settings read')):
+            middleware.process_request(request)
+            middleware.process_response(request, response)
+        assert request.META['HTTP_ACCEPT_LANGUAGE'] == 'eo'
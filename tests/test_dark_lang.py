@@ -0,0 +1,215 @@
+"""
+Tests for the LocalizerX cached dark language configuration.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import ddt
+from mock import Mock, patch
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models.signals import post_save
+from django.test import RequestFactory, TestCase, override_settings
+
+from localizerx.dark_lang import (get_dark_lang_snapshot, get_released_language, invalidate_dark_lang_snapshot,
+                                  is_cached_dark_lang_enabled)
+from localizerx.helpers import add_locale_middleware
+from localizerx.middleware import CachedDarkLangMiddleware, DefaultLocaleMiddleware
+from openedx.core.djangoapps.dark_lang.middleware import DarkLangMiddleware
+from openedx.core.djangoapps.dark_lang.models import DarkLangConfig
+
+DARK_LANG_MIDDLEWARE = 'openedx.core.djangoapps.dark_lang.middleware.DarkLangMiddleware'
+CACHED_DARK_LANG_MIDDLEWARE = 'localizerx.middleware.CachedDarkLangMiddleware'
+
+MIDDLEWARE_CLASSES = (
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.sites.middleware.CurrentSiteMiddleware',
+    'openedx.core.djangoapps.lang_pref.middleware.LanguagePreferenceMiddleware',
+    DARK_LANG_MIDDLEWARE,
+    'django.middleware.locale.LocaleMiddleware',
+)
+
+
+@ddt.ddt
+@override_settings(
+    LANGUAGE_CODE='eo',
+    MOCK_DARK_LANG_CONFIG={'enabled': True, 'released_languages': 'ar, en-us, fr-ca'},
+)
+class DarkLangSnapshotTest(TestCase):
+    """
+    Tests for caching the released languages.
+    """
+
+    def test_snapshot(self):
+        """
+        The released languages should include the platform language, like Open edX does.
+        """
+        snapshot = get_dark_lang_snapshot()
+        assert snapshot.enabled
+        assert snapshot.released_languages == {'ar', 'en-us', 'fr-ca', 'eo'}
+        assert snapshot.released_prefixes == {'ar': 'ar', 'en': 'en-us', 'fr': 'fr-ca', 'eo': 'eo'}
+
+    @override_settings(MOCK_DARK_LANG_CONFIG={'released_languages': 'ar'})
+    def test_disabled(self):
+        """
+        Nothing is released when the dark languages are disabled, since all the languages are available.
+        """
+        snapshot = get_dark_lang_snapshot()
+        assert not snapshot.enabled
+        assert not snapshot.released_languages
+
+    def test_cached(self):
+        """
+        The configuration should only be read once, until it's saved.
+        """
+        with patch.object(DarkLangConfig, 'current', wraps=DarkLangConfig.current) as current:
+            get_dark_lang_snapshot()
+            get_dark_lang_snapshot()
+            assert current.call_count == 1
+
+            invalidate_dark_lang_snapshot(DarkLangConfig, instance=DarkLangConfig())
+            get_dark_lang_snapshot()
+            assert current.call_count == 2
+
+    @ddt.unpack
+    @ddt.data(
+        ('ar', 'ar'),
+        ('AR', 'ar'),
+        ('en-us', 'en-us'),
+        ('en-gb', 'en-us'),
+        ('fr', 'fr-ca'),
+        ('de', 'eo'),
+    )
+    def test_released_language(self, language_code, released_language):
+        """
+        The closest released language should be used, or the platform language if there's none.
+        """
+        assert get_released_language(language_code) == released_language
+
+    @override_settings(MOCK_DARK_LANG_CONFIG={})
+    def test_released_language_when_disabled(self):
+        """
+        The language should be kept as is when the dark languages are disabled.
+        """
+        assert get_released_language('de') == 'de'
+
+
+@ddt.ddt
+@override_settings(
+    LANGUAGE_CODE='eo',
+    MOCK_DARK_LANG_CONFIG={'enabled': True, 'released_languages': 'ar, en-us, fr-ca'},
+)
+class CachedDarkLangMiddlewareTest(TestCase):
+    """
+    Tests for the replacement of Open edX's `DarkLangMiddleware`.
+    """
+
+    def setUp(self):
+        """
+        Initialize the request factory.
+        """
+        super(CachedDarkLangMiddlewareTest, self).setUp()
+        self.request_factory = RequestFactory()
+
+    @ddt.data(
+        'ar',
+        'en-US,en;q=0.9,ar;q=0.8',
+        'fr-fr;q=0.5, de;q=0.9, eo',
+        'de',
+        '*',
+        '',
+    )
+    def test_same_as_dark_lang(self, accept_language):
+        """
+        The `Accept-Language` header should be cleaned the same way Open edX's middleware does.
+        """
+        original = self.request_factory.get('/', HTTP_ACCEPT_LANGUAGE=accept_language)
+        DarkLangMiddleware().process_request(original)
+
+        cached = self.request_factory.get('/', HTTP_ACCEPT_LANGUAGE=accept_language)
+        CachedDarkLangMiddleware().process_request(cached)
+
+        assert cached.META['HTTP_ACCEPT_LANGUAGE'] == original.META['HTTP_ACCEPT_LANGUAGE']
+
+    @override_settings(MOCK_USER_PREFERENCES={'staff': {'dark-lang': 'de'}})
+    def test_preview_language(self):
+        """
+        The dark language the user previews should be activated.
+        """
+        request = self.request_factory.get('/', HTTP_ACCEPT_LANGUAGE='ar')
+        request.user = Mock(username='staff', is_authenticated=True)
+        request.session = {}
+        CachedDarkLangMiddleware().process_request(request)
+
+        assert request.META['HTTP_ACCEPT_LANGUAGE'] == 'de'
+        assert request.session['_language'] == 'de'
+
+    @override_settings(MOCK_DARK_LANG_CONFIG={})
+    def test_disabled(self):
+        """
+        The request should be left untouched when the dark languages are disabled.
+        """
+        request = self.request_factory.get('/', HTTP_ACCEPT_LANGUAGE='de')
+        CachedDarkLangMiddleware().process_request(request)
+        assert request.META['HTTP_ACCEPT_LANGUAGE'] == 'de'
+
+    @override_settings(
+        FEATURES={'ENABLE_LOCALIZERX': True},
+        ENV_TOKENS={'LOCALIZERX_CACHED_DARK_LANG': True},
+        MOCK_SITE_CONFIGS={'LANGUAGE_CODE': 'fr'},
+    )
+    def test_released_site_language(self):
+        """
+        The `DefaultLocaleMiddleware` should enforce the released variant of the site language.
+        """
+        request = self.request_factory.get('/dummy/')
+        DefaultLocaleMiddleware().process_request(request)
+        assert request.META['HTTP_ACCEPT_LANGUAGE'] == 'fr-ca'
+        assert request.localizerx_language == 'fr-ca'
+
+    @override_settings(
+        FEATURES={'ENABLE_LOCALIZERX': True},
+        ENV_TOKENS={'LOCALIZERX_CACHED_DARK_LANG': True},
+        MOCK_SITE_CONFIGS={'LANGUAGE_CODE': 'de'},
+    )
+    def test_unreleased_site_language(self):
+        """
+        The `DefaultLocaleMiddleware` should fall back to the platform language if the site language isn't released.
+        """
+        request = self.request_factory.get('/dummy/')
+        DefaultLocaleMiddleware().process_request(request)
+        assert request.localizerx_language == 'eo'
+
+
+class CachedDarkLangSetupTest(TestCase):
+    """
+    Tests for installing the `CachedDarkLangMiddleware`.
+    """
+
+    def test_middleware_substitution(self):
+        """
+        The `CachedDarkLangMiddleware` should take the place of Open edX's `DarkLangMiddleware`.
+        """
+        updated_middlewares = add_locale_middleware(MIDDLEWARE_CLASSES, cached_dark_lang=True)
+        assert DARK_LANG_MIDDLEWARE not in updated_middlewares
+        assert updated_middlewares.index(CACHED_DARK_LANG_MIDDLEWARE) == MIDDLEWARE_CLASSES.index(
+            DARK_LANG_MIDDLEWARE
+        ) + 1
+
+    def test_disabled_by_default(self):
+        """
+        Open edX's `DarkLangMiddleware` should be kept by default.
+        """
+        assert not is_cached_dark_lang_enabled()
+        assert DARK_LANG_MIDDLEWARE in add_locale_middleware(MIDDLEWARE_CLASSES)
+
+    @override_settings(ENV_TOKENS={'LOCALIZERX_CACHED_DARK_LANG': True}, MIDDLEWARE_CLASSES=MIDDLEWARE_CLASSES)
+    def test_ready(self):
+        """
+        The app should swap the middlewares and invalidate the cache when the configuration is saved.
+        """
+        with patch.object(post_save, 'connect') as connect:
+            apps.get_app_config('localizerx').ready()
+
+        connect.assert_any_call(invalidate_dark_lang_snapshot, sender=DarkLangConfig)
+        assert CACHED_DARK_LANG_MIDDLEWARE in settings.MIDDLEWARE_CLASSES
@@ -0,0 +1,132 @@
+"""
+Tests for the LocalizerX decision engine.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import ddt
+
+from django.conf import settings
+from django.test import RequestFactory, TestCase, override_settings
+
+from localizerx.decisions import (BYPASS_DECISION, BYPASSED, DISABLED, NEGOTIATED, PASSTHROUGH_PATH, PATH_RULE,
+                                  SITE_LANGUAGE, decide, decide_request, is_allowed_host)
+from localizerx.sites import get_snapshots_cache
+
+
+@ddt.ddt
+@override_settings(
+    LANGUAGE_CODE='eo',
+    FEATURES={'ENABLE_LOCALIZERX': True},
+    MOCK_SITE_CONFIGS={
+        'LANGUAGE_CODE': 'ar',
+        'LOCALIZERX_PATH_LANGUAGES': [['/es/', 'es'], ['/embed/', 'passthrough']],
+    },
+)
+class DecideTest(TestCase):
+    """
+    Tests for the `decide` function.
+    """
+
+    def setUp(self):
+        """
+        Clear the cached site snapshots.
+        """
+        super(DecideTest, self).setUp()
+        get_snapshots_cache().clear()
+
+    @ddt.unpack
+    @ddt.data(
+        ('/dashboard', ('ar', SITE_LANGUAGE, False, False)),
+        ('/es/courses', ('es', PATH_RULE, False, False)),
+        ('/embed/video', (None, PASSTHROUGH_PATH, False, True)),
+        ('/api/courses/', (None, PASSTHROUGH_PATH, False, True)),
+        ('/static/css/lms.css', (None, BYPASSED, True, True)),
+    )
+    def test_decide(self, path, decision):
+        """
+        The decision should only depend on the host, the path and the headers.
+        """
+        assert decide('a.example.com', path, 'en-US,en;q=0.9') == decision
+
+    def test_bypassed_without_site(self):
+        """
+        The bypassed paths shouldn't even look the site up, and share the same decision.
+        """
+        assert decide('a.example.com', '/static/css/lms.css') is BYPASS_DECISION
+        assert not get_snapshots_cache()
+
+    @override_settings(MOCK_SITE_CONFIGS={'ENABLE_LOCALIZERX': False})
+    def test_disabled(self):
+        """
+        Nothing should be enforced on the sites LocalizerX is disabled for.
+        """
+        assert decide('a.example.com', '/dashboard').reason == DISABLED
+        assert decide('a.example.com', '/dashboard').language is None
+
+    @override_settings(ENV_TOKENS={'LOCALIZERX_SUPPORTED_LANGUAGES': ['en', 'ar']})
+    def test_negotiated(self):
+        """
+        The browser's language should be negotiated when the site supports a few languages.
+        """
+        assert decide('a.example.com', '/dashboard', 'en-US,ar;q=0.8') == ('en', NEGOTIATED, False, True)
+        assert decide('a.example.com', '/es/', 'en-US,ar;q=0.8').reason == PATH_RULE
+
+    @override_settings(ALLOWED_HOSTS=['.example.com'])
+    def test_language_cookie_ignored(self):
+        """
+        The language cookie is left to Django's `LocaleMiddleware`, so it shouldn't change the decision.
+        """
+        request = RequestFactory().get('/dashboard', HTTP_HOST='a.example.com', HTTP_ACCEPT_LANGUAGE='en')
+        request.COOKIES[settings.LANGUAGE_COOKIE_NAME] = 'en'
+        assert decide_request(request) == ('ar', SITE_LANGUAGE, False, False)
+
+    @override_settings(
+        ENV_TOKENS={'LOCALIZERX_CACHED_DARK_LANG': True},
+        MOCK_DARK_LANG_CONFIG={'enabled': True, 'released_languages': 'en'},
+    )
+    def test_released_language(self):
+        """
+        The enforced language should be released when the cached dark languages are enabled.
+        """
+        assert decide('a.example.com', '/dashboard').language == 'eo'
+
+    def test_compact(self):
+        """
+        The decision can't be modified, and doesn't have a `__dict__` to grow.
+        """
+        decision = decide('a.example.com', '/dashboard')
+        assert not hasattr(decision, '__dict__')
+        with self.assertRaises(AttributeError):
+            decision.language = 'en'
+
+
+@ddt.ddt
+class AllowedHostTest(TestCase):
+    """
+    Tests for the `is_allowed_host` function.
+    """
+
+    @ddt.unpack
+    @ddt.data(
+        ('example.com', True),
+        ('example.com:8000', True),
+        ('a.example.org', True),
+        ('evil.com', False),
+        ('', False),
+    )
+    @override_settings(ALLOWED_HOSTS=['example.com', '.example.org'])
+    def test_allowed_hosts(self, host, allowed):
+        """
+        The hosts should be checked against `ALLOWED_HOSTS` the way Django does.
+        """
+        assert is_allowed_host(host) == allowed
+
+    @override_settings(ALLOWED_HOSTS=[])
+    def test_debug(self):
+        """
+        The local hosts should be allowed in `DEBUG` mode when `ALLOWED_HOSTS` is empty.
+        """
+        assert not is_allowed_host('localhost')
+        with override_settings(DEBUG=True):
+            assert is_allowed_host('localhost:8000')
+            assert not is_allowed_host('example.com')
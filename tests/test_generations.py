@@ -0,0 +1,212 @@
+"""
+Tests for the LocalizerX cross-process invalidation.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import shutil
+import tempfile
+
+from mock import Mock, patch
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_save
+from django.test import RequestFactory, TestCase, override_settings
+
+from localizerx import preferences
+from localizerx.generations import SITES_GENERATION, GenerationCounter, build_generation_counter
+from localizerx.preferences import (cache_user_preference, get_preferences_cache, get_preferences_generation,
+                                    invalidate_user_preference, load_preference_cookie, sign_preference)
+from localizerx.sites import get_site_snapshot, get_sites_generation
+from openedx.core.djangoapps.site_configuration.models import SiteConfiguration
+from openedx.core.djangoapps.user_api.models import UserPreference
+from openedx.core.djangoapps.user_api.preferences import api as preferences_api
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'localizerx-tests'},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GenerationCounterTest(TestCase):
+    """
+    Tests for the `GenerationCounter` class.
+    """
+
+    def setUp(self):
+        """
+        Start with an empty shared cache.
+        """
+        super(GenerationCounterTest, self).setUp()
+        caches['shared'].clear()
+
+    def test_disabled_by_default(self):
+        """
+        There's no counter unless `LOCALIZERX_GENERATION_CACHE` is configured.
+        """
+        assert build_generation_counter(SITES_GENERATION) is None
+
+    @override_settings(ENV_TOKENS={
+        'LOCALIZERX_GENERATION_CACHE': 'shared',
+        'LOCALIZERX_GENERATION_CHECK_INTERVAL_MS': 50,
+    })
+    def test_build(self):
+        """
+        The counter should use the configured cache and interval.
+        """
+        counter = build_generation_counter(SITES_GENERATION)
+        assert counter.cache_alias == 'shared'
+        assert counter.interval == 0.05
+
+    def test_bump(self):
+        """
+        The other workers should see the bumps, and the missing counter, on their next check.
+        """
+        worker = GenerationCounter(SITES_GENERATION, 'shared', interval=0)
+        other_worker = GenerationCounter(SITES_GENERATION, 'shared', interval=0)
+        assert not worker.has_changed()
+
+        other_worker.bump()
+        assert worker.has_changed()
+        assert not worker.has_changed(), 'Only changed once'
+
+        other_worker.bump()
+        assert worker.has_changed()
+
+        caches['shared'].clear()
+        assert worker.has_changed()
+
+    def test_interval(self):
+        """
+        The shared cache should be queried at most once per interval.
+        """
+        with patch('localizerx.generations.default_timer', return_value=100.0) as timer:
+            worker = GenerationCounter(SITES_GENERATION, 'shared', interval=1)
+            GenerationCounter(SITES_GENERATION, 'shared', interval=1).bump()
+
+            with patch.object(worker, 'fetch', wraps=worker.fetch) as fetch:
+                timer.return_value = 100.5
+                assert not worker.has_changed(), 'Not checked yet'
+                assert not fetch.called
+
+                timer.return_value = 101.0
+                assert worker.has_changed()
+                assert fetch.call_count == 1
+
+    def test_file_based_cache(self):
+        """
+        The counter should work with any cache backend shared by the workers e.g. the file based one.
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        file_caches = dict(LOCMEM_CACHES, shared={
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': directory,
+        })
+        with override_settings(CACHES=file_caches):
+            worker = GenerationCounter(SITES_GENERATION, 'shared', interval=0)
+            GenerationCounter(SITES_GENERATION, 'shared', interval=0).bump()
+            assert worker.has_changed()
+
+    def test_unavailable_cache(self):
+        """
+        The cached data should be kept if the shared cache is unavailable.
+        """
+        worker = GenerationCounter(SITES_GENERATION, 'shared', interval=0)
+        with patch.object(caches['shared'], 'get', side_effect=IOError):
+            assert not worker.has_changed()
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    LANGUAGE_CODE='eo',
+    FEATURES={'ENABLE_LOCALIZERX': True},
+    MOCK_SITE_CONFIGS={'LANGUAGE_CODE': 'ar'},
+    ENV_TOKENS={'LOCALIZERX_GENERATION_CACHE': 'shared', 'LOCALIZERX_GENERATION_CHECK_INTERVAL_MS': 0},
+)
+class SitesGenerationTest(TestCase):
+    """
+    Tests for invalidating the site snapshots of all the workers.
+    """
+
+    def test_other_worker_saves(self):
+        """
+        The snapshots should be dropped when another worker saves a site configuration.
+        """
+        caches['shared'].clear()
+        request = RequestFactory().get('/dashboard')
+        assert get_site_snapshot(request).language_code == 'ar'
+
+        with patch.dict(settings.MOCK_SITE_CONFIGS, {'LANGUAGE_CODE': 'en'}):
+            assert get_site_snapshot(request).language_code == 'ar', 'Should be served from the cache'
+
+            # Another worker saves the site configuration, this one doesn't get the signal.
+            GenerationCounter(SITES_GENERATION, 'shared', interval=0).bump()
+            assert get_site_snapshot(request).language_code == 'en'
+
+    def test_save_bumps(self):
+        """
+        Saving a site configuration should bump the shared generation.
+        """
+        caches['shared'].clear()
+        generation = get_sites_generation().fetch()
+        post_save.send(sender=SiteConfiguration, instance=SiteConfiguration())
+        assert get_sites_generation().fetch() == generation + 1
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    MOCK_USER_PREFERENCES={'learner': {'pref-lang': 'ar'}},
+    ENV_TOKENS={
+        'LOCALIZERX_PREFERENCE_CACHE': True,
+        'LOCALIZERX_PREFERENCE_COOKIE': True,
+        'LOCALIZERX_GENERATION_CACHE': 'shared',
+        'LOCALIZERX_GENERATION_CHECK_INTERVAL_MS': 0,
+    },
+)
+class PreferencesGenerationTest(TestCase):
+    """
+    Tests for invalidating the cached language preferences of all the workers.
+    """
+
+    def setUp(self):
+        """
+        Start with an empty shared cache, and fresh preference caches.
+        """
+        super(PreferencesGenerationTest, self).setUp()
+        caches['shared'].clear()
+        preferences._CACHES.clear()  # pylint: disable=protected-access
+        self.user = Mock(id=1, username='learner', is_authenticated=True)
+        self.get_user_preference = Mock(wraps=preferences_api.get_user_preference)
+        self.cached_get_user_preference = cache_user_preference(self.get_user_preference)
+
+    def test_other_worker_saves(self):
+        """
+        The cached preferences and the preference cookies should be dropped when another worker saves a preference.
+        """
+        assert self.cached_get_user_preference(self.user, 'pref-lang') == 'ar'
+        request = RequestFactory().get('/dashboard')
+        request.user = self.user
+        request.COOKIES[preferences.PREFERENCE_COOKIE_NAME] = sign_preference(self.user.id, 'ar')
+
+        with patch.dict(settings.MOCK_USER_PREFERENCES, {'learner': {'pref-lang': 'en'}}):
+            # Another worker, with its own caches, saves the new preference.
+            with patch.dict(preferences._CACHES, clear=True):  # pylint: disable=protected-access
+                assert self.cached_get_user_preference(self.user, 'pref-lang') == 'en'
+                invalidate_user_preference(UserPreference, UserPreference(self.user, 'pref-lang', 'en'))
+
+            load_preference_cookie(request)
+            assert get_preferences_cache().get(self.user.id) is None, 'The cookie is outdated'
+            assert self.cached_get_user_preference(self.user, 'pref-lang') == 'en'
+            assert self.get_user_preference.call_count == 3
+
+    def test_save_bumps(self):
+        """
+        Saving a language preference should bump the shared generation.
+        """
+        generation = get_preferences_generation().fetch()
+        invalidate_user_preference(UserPreference, UserPreference(self.user, 'time_zone', 'UTC'))
+        assert get_preferences_generation().fetch() == generation, 'Not a language preference'
+        invalidate_user_preference(UserPreference, UserPreference(self.user, 'pref-lang', 'en'))
+        assert get_preferences_generation().fetch() == generation + 1
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the LocalizerX locale pipeline instrumentation.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+from django.test import TestCase, override_settings
+
+from localizerx.helpers import add_locale_middleware
+from localizerx.instrumentation import (BYPASSED_REQUESTS, PIPELINE_STAGE, REGISTRY, TIMING_MIDDLEWARE, Exporter,
+                                        Histogram, Registry, record_marks, render_prometheus, render_statsd)
+
+LOCALIZERX_MIDDLEWARE = 'localizerx.middleware.DefaultLocaleMiddleware'
+
+MIDDLEWARE_CLASSES = (
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.sites.middleware.CurrentSiteMiddleware',
+    'openedx.core.djangoapps.lang_pref.middleware.LanguagePreferenceMiddleware',
+    'openedx.core.djangoapps.dark_lang.middleware.DarkLangMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.locale.LocaleMiddleware',
+)
+
+INSTRUMENTED_MIDDLEWARE_CLASSES = add_locale_middleware(MIDDLEWARE_CLASSES, instrument=True)
+
+
+class AddTimingMarkersTest(TestCase):
+    """
+    Tests for the instrumented `add_locale_middleware`.
+    """
+
+    def test_markers_placement(self):
+        """
+        Every locale-aware middleware should be surrounded by timing markers.
+        """
+        assert INSTRUMENTED_MIDDLEWARE_CLASSES == (
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            'django.contrib.sites.middleware.CurrentSiteMiddleware',
+            TIMING_MIDDLEWARE,
+            LOCALIZERX_MIDDLEWARE,
+            TIMING_MIDDLEWARE,
+            'openedx.core.djangoapps.lang_pref.middleware.LanguagePreferenceMiddleware',
+            TIMING_MIDDLEWARE,
+            'openedx.core.djangoapps.dark_lang.middleware.DarkLangMiddleware',
+            TIMING_MIDDLEWARE,
+            'django.middleware.common.CommonMiddleware',
+            TIMING_MIDDLEWARE,
+            'django.middleware.locale.LocaleMiddleware',
+            TIMING_MIDDLEWARE,
+        )
+
+    def test_not_instrumented_by_default(self):
+        """
+        No markers should be added unless the instrumentation is requested.
+        """
+        assert TIMING_MIDDLEWARE not in add_locale_middleware(MIDDLEWARE_CLASSES)
+
+
+class LocaleTimingMiddlewareTest(TestCase):
+    """
+    Tests for recording the stage timings.
+    """
+
+    def setUp(self):
+        """
+        Start with empty histograms.
+        """
+        super(LocaleTimingMiddlewareTest, self).setUp()
+        REGISTRY.clear()
+        self.addCleanup(REGISTRY.clear)
+
+    @override_settings(MIDDLEWARE_CLASSES=INSTRUMENTED_MIDDLEWARE_CLASSES, FEATURES={'ENABLE_LOCALIZERX': True})
+    def test_request_stages(self):
+        """
+        Every locale stage should be timed in both directions.
+        """
+        self.client.get('/', HTTP_ACCEPT_LANGUAGE='en')
+        self.client.get('/', HTTP_ACCEPT_LANGUAGE='en')
+
+        histograms = REGISTRY.collect()
+        stages = {stage for stage, _phase in histograms}
+        assert stages == {
+            'DefaultLocaleMiddleware',
+            'LanguagePreferenceMiddleware',
+            'DarkLangMiddleware',
+            'CommonMiddleware',  # Surrounded by the markers of its neighbours, so it's timed as well.
+            'LocaleMiddleware',
+            PIPELINE_STAGE,
+        }
+
+        for histogram in histograms.values():
+            assert histogram.count == 2
+
+    @override_settings(MIDDLEWARE_CLASSES=INSTRUMENTED_MIDDLEWARE_CLASSES)
+    def test_short_circuited_request(self):
+        """
+        Requests that didn't go through all the markers should be ignored.
+        """
+        record_marks([1.0, 2.0], [3.0, 4.0])
+        assert not REGISTRY.collect()
+
+
+class HistogramExportTest(TestCase):
+    """
+    Tests for the histograms and their exporters.
+    """
+
+    def setUp(self):
+        """
+        Prepare a registry with a few observations and a temporary directory.
+        """
+        super(HistogramExportTest, self).setUp()
+        self.registry = Registry()
+        self.registry.observe('LocaleMiddleware', 'request', 0.00002)
+        self.registry.observe('LocaleMiddleware', 'request', 0.003)
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+    def test_histogram_buckets(self):
+        """
+        Observations should be counted in the right buckets.
+        """
+        histogram = Histogram()
+        histogram.observe(0.00001)
+        histogram.observe(0.0002)
+        histogram.observe(10)
+        assert histogram.counts[0] == 1
+        assert histogram.counts[4] == 1
+        assert histogram.counts[-1] == 1
+        assert histogram.count == 3
+
+    def test_prometheus_format(self):
+        """
+        The histograms should be rendered as cumulative Prometheus histograms.
+        """
+        text = render_prometheus(self.registry.collect())
+        assert '# TYPE localizerx_locale_stage_seconds histogram' in text
+        assert 'stage="LocaleMiddleware",phase="request"' in text
+        assert ',le="1e-05"} 0\n' in text
+        assert ',le="2.5e-05"} 1\n' in text
+        assert ',le="0.005"} 2\n' in text
+        assert ',le="+Inf"} 2\n' in text
+        assert '_count{' in text
+
+    def test_prometheus_file_export(self):
+        """
+        The Prometheus exporter should replace the target file.
+        """
+        target = os.path.join(self.temp_dir, 'localizerx-{pid}.prom')
+        exporter = Exporter(self.registry, target=target, export_format='prometheus')
+        exporter.export()
+        exporter.export()
+
+        with open(target.format(pid=os.getpid())) as metrics_file:
+            assert metrics_file.read().count('# TYPE') == 1
+
+    def test_statsd_deltas(self):
+        """
+        The statsd exporter should only send the observations since the last export.
+        """
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(receiver.close)
+        receiver.bind(('127.0.0.1', 0))
+        receiver.settimeout(5)
+
+        exporter = Exporter(
+            self.registry,
+            target='udp://127.0.0.1:{port}'.format(port=receiver.getsockname()[1]),
+            export_format='statsd',
+        )
+        exporter.export()
+        assert receiver.recv(1024) == b'localizerx.locale_stage.LocaleMiddleware.request.count:2|c'
+
+        self.registry.observe('LocaleMiddleware', 'request', 0.003)
+        lines = render_statsd(self.registry.collect(), exporter._previous)  # pylint: disable=protected-access
+        assert 'localizerx.locale_stage.LocaleMiddleware.request.count:1|c' in lines
+        assert 'localizerx.locale_stage.LocaleMiddleware.request.le_5000us:1|c' in lines
+
+    def test_counters(self):
+        """
+        The counters should be summed over the threads and exported along with the histograms.
+        """
+        self.registry.increment(BYPASSED_REQUESTS)
+        thread = threading.Thread(target=self.registry.increment, args=(BYPASSED_REQUESTS,))
+        thread.start()
+        thread.join()
+        counters = self.registry.collect_counters()
+        assert counters == {BYPASSED_REQUESTS: 2}
+
+        text = render_prometheus(self.registry.collect(), counters)
+        assert '# TYPE localizerx_bypassed_requests_total counter' in text
+        assert 'localizerx_bypassed_requests_total{{pid="{pid}"}} 2\n'.format(pid=os.getpid()) in text
+
+        lines = render_statsd({}, {}, counters=counters, previous_counters={BYPASSED_REQUESTS: 1})
+        assert lines == ['localizerx.bypassed_requests:1|c']
+
+    def test_exited_threads(self):
+        """
+        The data of the exited threads should be kept in the totals, without keeping the threads around.
+        """
+        threads = [
+            threading.Thread(target=self.registry.observe, args=('LocaleMiddleware', 'request', 0.003))
+            for _index in range(3)
+        ] + [threading.Thread(target=self.registry.increment, args=(BYPASSED_REQUESTS,))]
+        for thread in threads:
+            thread.start()
+            thread.join()
+
+        assert self.registry.collect()[('LocaleMiddleware', 'request')].count == 5
+        assert self.registry.collect_counters() == {BYPASSED_REQUESTS: 1}
+        # pylint: disable=protected-access
+        assert list(self.registry._thread_histograms) == [threading.current_thread()]
+        assert not self.registry._thread_counters
+
+        self.registry.clear()
+        assert not self.registry.collect()
+        assert not self.registry.collect_counters()
+
+    def test_maybe_export_interval(self):
+        """
+        The exporter should only export once the interval has elapsed.
+        """
+        target = os.path.join(self.temp_dir, 'metrics.prom')
+        exporter = Exporter(self.registry, target=target, interval=3600)
+        exporter.maybe_export()
+        assert not os.path.exists(target)
+
+        exporter.next_export_at = 0
+        exporter.maybe_export()
+        assert os.path.exists(target)
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the LocalizerX path matchers.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import re
+
+import ddt
+from mock import patch
+
+from django.test import TestCase
+
+from localizerx.matchers import PASSTHROUGH, PathMatcher, PathRules, translate_glob
+
+
+@ddt.ddt
+class PathMatcherTest(TestCase):
+    """
+    Tests for the `PathMatcher` class.
+    """
+
+    patterns = [
+        '/api/v1/',
+        '/api/',
+        '/user_api/',
+        '/courses/*/xblock/',
+        '^/reporting/(api|v2)/',
+        '/static/?/',
+    ]
+
+    @ddt.unpack
+    @ddt.data(
+        {'path': '/', 'expected': None},
+        {'path': '/api', 'expected': None},
+        {'path': '/api/', 'expected': 1},
+        {'path': '/api/discussion/', 'expected': 1},
+        {'path': '/api/v1/', 'expected': 0},
+        {'path': '/api/v1/users/', 'expected': 0},
+        {'path': '/user_api/v1/', 'expected': 2},
+        {'path': '/courses/course-v1:edX+DemoX+T1/xblock/block-v1:edX/handler/', 'expected': 3},
+        {'path': '/courses/course-v1:edX+DemoX+T1/about', 'expected': None},
+        {'path': '/reporting/api/', 'expected': 4},
+        {'path': '/reporting/v2/report/', 'expected': 4},
+        {'path': '/reporting/', 'expected': None},
+        {'path': '/static/a/app.js', 'expected': 5},
+        {'path': '/static/app.js', 'expected': None},
+    )
+    def test_match(self, path, expected):
+        """
+        The matcher should find the first matching pattern in declaration order.
+        """
+        assert PathMatcher(self.patterns).match(path) == expected
+
+    @ddt.data(
+        ['/api/', '/api/v1/', '^/api/v1/'],
+        ['^/api/', '/api/v1/', '/api/'],
+    )
+    def test_declaration_order(self, patterns):
+        """
+        The first declared pattern should win regardless of its type or length.
+        """
+        assert PathMatcher(patterns).match('/api/v1/users/') == 0
+
+    def test_contains(self):
+        """
+        The `in` operator should check whether any pattern matches.
+        """
+        matcher = PathMatcher(['/api/', '/oauth2/*'])
+        assert '/oauth2/access_token' in matcher
+        assert '/api/' in matcher
+        assert '/dashboard' not in matcher
+
+    def test_empty_patterns(self):
+        """
+        An empty matcher should never match.
+        """
+        assert PathMatcher([]).match('/api/') is None
+
+    def test_many_prefixes(self):
+        """
+        Many overlapping prefixes should be handled correctly.
+        """
+        patterns = ['/api/v{version}/'.format(version=version) for version in range(100)]
+        matcher = PathMatcher(patterns)
+        assert matcher.match('/api/v42/users/') == 42
+        assert matcher.match('/api/v4/users/') == 4
+        assert matcher.match('/api/v10/users/') == 10
+        assert matcher.match('/api/v100/users/') is None
+
+    @ddt.data(
+        '^/courses/(',
+        '/courses/[z-a]/',
+        '^/(?P<lang>es|fr)/',
+        '^/(es|fr)/\\1/',
+        '^/(?P<lang>es)/(?P=lang)/',
+    )
+    def test_invalid_patterns(self, pattern):
+        """
+        The invalid patterns and the ones that can't be combined should be logged and never match.
+        """
+        with patch('localizerx.matchers.LOGGER') as logger:
+            matcher = PathMatcher([pattern, '^/(api|v2)/', '/es/'])
+        assert logger.warning.called
+        assert matcher.match('/es/es/') == 2
+        assert matcher.match('/v2/') == 1
+
+    def test_escaped_backslash(self):
+        """
+        An escaped backslash followed by a digit isn't a backreference.
+        """
+        assert PathMatcher(['^/a\\\\1']).match('/a\\1') == 0
+
+    @ddt.unpack
+    @ddt.data(
+        {'pattern': '/a*', 'path': '/abc/d', 'matches': True},
+        {'pattern': '/a?c', 'path': '/abc', 'matches': True},
+        {'pattern': '/a[bc]d', 'path': '/acd', 'matches': True},
+        {'pattern': '/a[!bc]d', 'path': '/acd', 'matches': False},
+        {'pattern': '/a[!bc]d', 'path': '/aed', 'matches': True},
+        {'pattern': '/a[b', 'path': '/a[b', 'matches': True},
+        {'pattern': '/a.b*', 'path': '/axb', 'matches': False},
+    )
+    def test_translate_glob(self, pattern, path, matches):
+        """
+        Wildcard patterns should match path prefixes.
+        """
+        assert bool(re.match(translate_glob(pattern), path)) == matches
+
+
+@ddt.ddt
+class PathRulesTest(TestCase):
+    """
+    Tests for the `PathRules` class.
+    """
+
+    rules = [
+        ['/es/', 'es'],
+        ['/es/embed/', 'passthrough'],
+        ['^/(fr|fr-ca)/', 'fr'],
+        ['/courses/*/about', 'ar'],
+    ]
+
+    @ddt.unpack
+    @ddt.data(
+        ('/', None),
+        ('/es/about', 'es'),
+        ('/es/embed/video', 'es'),
+        ('/fr-ca/', 'fr'),
+        ('/courses/course-v1:edX+DemoX+T1/about', 'ar'),
+        ('/api/es/', PASSTHROUGH),
+        ('/dashboard', None),
+    )
+    def test_lookup(self, path, language):
+        """
+        The first matching rule should win, then the passthrough patterns.
+        """
+        path_rules = PathRules(self.rules, passthrough_patterns=['/api/'])
+        assert path_rules.lookup(path) == language
+
+    def test_passthrough_before_api(self):
+        """
+        The rules come before the passthrough patterns, so they can enforce a language on an API path.
+        """
+        path_rules = PathRules([['/api/', 'passthrough'], ['/api/i18n/', 'ar']], passthrough_patterns=['/api/'])
+        assert path_rules.lookup('/api/i18n/') == PASSTHROUGH
+        assert PathRules([['/api/i18n/', 'ar']], ['/api/']).lookup('/api/i18n/') == 'ar'
+
+    def test_many_rules(self):
+        """
+        Many rules are compiled into a single matcher.
+        """
+        rules = [['/section-{index}/'.format(index=index), 'ar'] for index in range(500)]
+        path_rules = PathRules(rules + [['/section-', 'passthrough']])
+        assert path_rules.lookup('/section-499/page') == 'ar'
+        assert path_rules.lookup('/section-500/page') == PASSTHROUGH
+        assert path_rules.matcher.match('/section-42/') == 42
+
+    def test_invalid_rules(self):
+        """
+        The malformed rules and the invalid patterns should be skipped without breaking the other rules.
+        """
+        rules = [['/es/'], ['^/(?P<lang>fr)/', 'fr'], ['^/(ar', 'ar'], ['/fr/', 'fr'], ['^/es/(\\w+)/', 'es']]
+        with patch('localizerx.matchers.LOGGER') as logger:
+            path_rules = PathRules(rules, passthrough_patterns=['/api/'])
+        assert logger.warning.call_count == 3
+        assert path_rules.lookup('/fr/') == 'fr'
+        assert path_rules.lookup('/es/about/') == 'es'
+        assert path_rules.lookup('/ar/') is None
+        assert path_rules.lookup('/api/') == PASSTHROUGH
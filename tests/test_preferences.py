@@ -0,0 +1,208 @@
+"""
+Tests for the LocalizerX cached language preferences.
+"""
+from __future__ import absolute_import, unicode_literals
+
+from mock import Mock, patch
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db.models.signals import post_save
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from localizerx.helpers import add_locale_middleware
+from localizerx.preferences import (PREFERENCE_COOKIE_NAME, PREFERENCE_COOKIE_SALT, cache_user_preference,
+                                    get_preferences_cache, invalidate_user_preference, sign_preference,
+                                    unsign_preference, update_preference_cookie)
+from openedx.core.djangoapps.lang_pref import middleware as lang_pref_middleware
+from openedx.core.djangoapps.user_api.models import UserPreference
+from openedx.core.djangoapps.user_api.preferences import api as preferences_api
+
+MIDDLEWARE_CLASSES = add_locale_middleware([
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.sites.middleware.CurrentSiteMiddleware',
+    'openedx.core.djangoapps.lang_pref.middleware.LanguagePreferenceMiddleware',
+    'openedx.core.djangoapps.dark_lang.middleware.DarkLangMiddleware',
+    'django.middleware.locale.LocaleMiddleware',
+    'django.middleware.common.CommonMiddleware',
+])
+
+PREFERENCE_CACHE_TOKENS = {
+    'LOCALIZERX_PREFERENCE_CACHE': True,
+    'LOCALIZERX_PREFERENCE_COOKIE': True,
+}
+
+
+@override_settings(MOCK_USER_PREFERENCES={'learner': {'pref-lang': 'ar', 'time_zone': 'UTC'}})
+class PreferenceCacheTest(TestCase):
+    """
+    Tests for caching the users' language preference.
+    """
+
+    def setUp(self):
+        """
+        Wrap a mock of Open edX's `get_user_preference`.
+        """
+        super(PreferenceCacheTest, self).setUp()
+        self.user = Mock(id=1, username='learner')
+        self.get_user_preference = Mock(wraps=preferences_api.get_user_preference)
+        self.cached_get_user_preference = cache_user_preference(self.get_user_preference)
+
+    def test_cached(self):
+        """
+        The language preference should only be read once.
+        """
+        assert self.cached_get_user_preference(self.user, 'pref-lang') == 'ar'
+        assert self.cached_get_user_preference(self.user, 'pref-lang') == 'ar'
+        assert self.get_user_preference.call_count == 1
+
+    @override_settings(MOCK_USER_PREFERENCES={})
+    def test_no_preference_cached(self):
+        """
+        The users without a language preference should be cached as well.
+        """
+        assert self.cached_get_user_preference(self.user, 'pref-lang') is None
+        assert self.cached_get_user_preference(self.user, 'pref-lang') is None
+        assert self.get_user_preference.call_count == 1
+
+    def test_other_preferences_not_cached(self):
+        """
+        The other preferences, and the preferences of the other users, should be read as usual.
+        """
+        other_user = Mock(id=2, username='staff')
+        assert self.cached_get_user_preference(self.user, 'time_zone') == 'UTC'
+        assert self.cached_get_user_preference(other_user, 'pref-lang', username='learner') == 'ar'
+        assert self.get_user_preference.call_count == 2
+        assert len(get_preferences_cache()) == 0
+
+    def test_invalidated_on_save(self):
+        """
+        The cached preference should be discarded when the user's language preference is saved.
+        """
+        self.cached_get_user_preference(self.user, 'pref-lang')
+
+        invalidate_user_preference(UserPreference, UserPreference(self.user, 'time_zone', 'UTC'))
+        assert get_preferences_cache().get(self.user.id) == 'ar'
+
+        invalidate_user_preference(UserPreference, UserPreference(self.user, 'pref-lang', 'en'))
+        assert get_preferences_cache().get(self.user.id) is None
+
+    @override_settings(ENV_TOKENS={'LOCALIZERX_PREFERENCE_CACHE': True})
+    def test_patched_on_ready(self):
+        """
+        The app should patch `LanguagePreferenceMiddleware` once, and connect the invalidation signal.
+        """
+        with patch.object(lang_pref_middleware, 'get_user_preference', preferences_api.get_user_preference):
+            with patch.object(post_save, 'connect') as connect:
+                apps.get_app_config('localizerx').ready()
+                patched = lang_pref_middleware.get_user_preference
+                apps.get_app_config('localizerx').ready()
+
+            assert patched.localizerx_cached
+            assert lang_pref_middleware.get_user_preference is patched
+            connect.assert_any_call(invalidate_user_preference, sender=UserPreference)
+
+    def test_not_patched_by_default(self):
+        """
+        The language preferences shouldn't be cached unless `LOCALIZERX_PREFERENCE_CACHE` is enabled.
+        """
+        with patch.object(lang_pref_middleware, 'get_user_preference', preferences_api.get_user_preference):
+            apps.get_app_config('localizerx').ready()
+            assert lang_pref_middleware.get_user_preference is preferences_api.get_user_preference
+
+
+class PreferenceCookieTest(TestCase):
+    """
+    Tests for the signed preference cookie.
+    """
+
+    def test_signed(self):
+        """
+        The cookie should only be trusted for the user it was signed for.
+        """
+        value = sign_preference(1, 'ar')
+        assert unsign_preference(value, 1) == 'ar'
+        assert unsign_preference(value, 2) is None
+        assert unsign_preference(value + 'x', 1) is None
+        assert unsign_preference(signing.dumps([1, 'ar', 0], salt='another-salt'), 1) is None
+        assert unsign_preference(signing.dumps('ar', salt=PREFERENCE_COOKIE_SALT), 1) is None
+        assert unsign_preference(signing.dumps([1, 'ar', 1], salt=PREFERENCE_COOKIE_SALT), 1) is None, 'Outdated'
+
+    @override_settings(ENV_TOKENS={'LOCALIZERX_PREFERENCE_CACHE_TTL': -1})
+    def test_expired(self):
+        """
+        The cookie shouldn't be trusted after the cache TTL.
+        """
+        assert unsign_preference(sign_preference(1, 'ar'), 1) is None
+
+
+@override_settings(
+    LANGUAGE_CODE='eo',
+    FEATURES={'ENABLE_LOCALIZERX': True},
+    MIDDLEWARE_CLASSES=MIDDLEWARE_CLASSES,
+    SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+    ENV_TOKENS=PREFERENCE_CACHE_TOKENS,
+    MOCK_USER_PREFERENCES={'learner': {'pref-lang': 'ar'}},
+)
+class PreferenceCookieMiddlewareTest(TestCase):
+    """
+    Tests for keeping the cached preference in a cookie through the middleware.
+    """
+
+    def setUp(self):
+        """
+        Log a user in, with the cached `LanguagePreferenceMiddleware` and an empty cache.
+        """
+        super(PreferenceCookieMiddlewareTest, self).setUp()
+        get_preferences_cache().clear()
+        self.user = User.objects.create_user('learner', 'learner@example.com', 'password')
+        self.client.login(username='learner', password='password')
+
+        self.get_user_preference = Mock(wraps=preferences_api.get_user_preference)
+        patcher = patch.object(
+            lang_pref_middleware, 'get_user_preference', cache_user_preference(self.get_user_preference),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cookie_set(self):
+        """
+        The cached preference should be set in the cookie, and used by the workers that don't have it cached.
+        """
+        response = self.client.get('/')
+        assert unsign_preference(response.cookies[PREFERENCE_COOKIE_NAME].value, self.user.id) == 'ar'
+        assert self.get_user_preference.call_count == 1
+
+        get_preferences_cache().clear()  # e.g. the next request is served by another worker.
+        response = self.client.get('/')
+        assert PREFERENCE_COOKIE_NAME not in response.cookies, 'The cookie is up to date'
+        assert self.get_user_preference.call_count == 1, 'The preference is read from the cookie'
+        assert self.client.session['_language'] == 'ar'
+
+    def test_cookie_deleted_on_change(self):
+        """
+        The cookie should be deleted when the preference changes, so it can't bring the old preference back.
+        """
+        self.client.get('/')
+        factory = RequestFactory()
+        factory.cookies = self.client.cookies
+        request = factory.get('/')
+        request.user = self.user
+        assert PREFERENCE_COOKIE_NAME in request.COOKIES
+
+        # The preference was saved while the request was processed.
+        invalidate_user_preference(UserPreference, UserPreference(self.user, 'pref-lang', 'en'))
+        response = HttpResponse()
+        update_preference_cookie(request, response)
+        assert response.cookies[PREFERENCE_COOKIE_NAME].value == ''
+
+    def test_anonymous(self):
+        """
+        No cookie should be set for anonymous users.
+        """
+        self.client.logout()
+        response = self.client.get('/')
+        assert PREFERENCE_COOKIE_NAME not in response.cookies
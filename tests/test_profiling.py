@@ -0,0 +1,210 @@
+"""
+Tests for the LocalizerX sampling profiler.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+from unittest import skipIf
+
+from mock import patch
+
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from localizerx.helpers import add_locale_middleware
+from localizerx.instrumentation import TIMING_MIDDLEWARE
+from localizerx.middleware import LocaleProfilingMiddleware
+from localizerx.profiling import PROFILING_MIDDLEWARE, SamplingProfiler, get_profiling_scope, get_sampling_profiler
+
+LOCALIZERX_MIDDLEWARE = 'localizerx.middleware.DefaultLocaleMiddleware'
+
+MIDDLEWARE_CLASSES = (
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.sites.middleware.CurrentSiteMiddleware',
+    'openedx.core.djangoapps.lang_pref.middleware.LanguagePreferenceMiddleware',
+    'openedx.core.djangoapps.dark_lang.middleware.DarkLangMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.locale.LocaleMiddleware',
+)
+
+
+class AddProfilingMarkersTest(TestCase):
+    """
+    Tests for the profiled `add_locale_middleware`.
+    """
+
+    def test_middleware_scope(self):
+        """
+        Only the `DefaultLocaleMiddleware` should be profiled by default, inside its timing markers.
+        """
+        assert add_locale_middleware(MIDDLEWARE_CLASSES, instrument=True, profile_scope='middleware')[1:7] == (
+            'django.contrib.sites.middleware.CurrentSiteMiddleware',
+            TIMING_MIDDLEWARE,
+            PROFILING_MIDDLEWARE,
+            LOCALIZERX_MIDDLEWARE,
+            PROFILING_MIDDLEWARE,
+            TIMING_MIDDLEWARE,
+        )
+
+    def test_pipeline_scope(self):
+        """
+        The whole locale block should be profiled with the `pipeline` scope.
+        """
+        assert add_locale_middleware(MIDDLEWARE_CLASSES, profile_scope='pipeline') == (
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            'django.contrib.sites.middleware.CurrentSiteMiddleware',
+            PROFILING_MIDDLEWARE,
+            LOCALIZERX_MIDDLEWARE,
+            'openedx.core.djangoapps.lang_pref.middleware.LanguagePreferenceMiddleware',
+            'openedx.core.djangoapps.dark_lang.middleware.DarkLangMiddleware',
+            'django.middleware.common.CommonMiddleware',
+            'django.middleware.locale.LocaleMiddleware',
+            PROFILING_MIDDLEWARE,
+        )
+
+    def test_unknown_scope(self):
+        """
+        A typo in the scope should be reported when the app is ready.
+        """
+        with self.assertRaises(ImproperlyConfigured):
+            add_locale_middleware(MIDDLEWARE_CLASSES, profile_scope='view')
+
+    def test_disabled_by_default(self):
+        """
+        Nothing should be profiled unless `LOCALIZERX_PROFILING_PATH` is configured.
+        """
+        assert get_profiling_scope() is None
+        assert get_sampling_profiler() is None
+        assert PROFILING_MIDDLEWARE not in add_locale_middleware(MIDDLEWARE_CLASSES)
+
+
+class SamplingProfilerTest(TestCase):
+    """
+    Tests for profiling the sampled requests and rotating the dumps.
+    """
+
+    def setUp(self):
+        """
+        Write the dumps in a temporary directory.
+        """
+        super(SamplingProfilerTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'profiles')
+
+    def get_dumps(self):
+        """
+        Get the names of the dumps, oldest first.
+        """
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(os.listdir(self.path), key=lambda name: os.stat(os.path.join(self.path, name)).st_mtime)
+
+    @override_settings(FEATURES={'ENABLE_LOCALIZERX': True})
+    def test_pipeline(self):
+        """
+        The locale block should be profiled, without the view.
+        """
+        env_tokens = {
+            'LOCALIZERX_PROFILING_PATH': self.path,
+            'LOCALIZERX_PROFILING_SCOPE': 'pipeline',
+            'LOCALIZERX_PROFILING_SAMPLE_RATE': 1,
+            'LOCALIZERX_PROFILING_THRESHOLD_MS': 0,
+        }
+        middleware_classes = add_locale_middleware(MIDDLEWARE_CLASSES, profile_scope='pipeline')
+        with override_settings(ENV_TOKENS=env_tokens, MIDDLEWARE_CLASSES=middleware_classes):
+            response = self.client.get('/dashboard/', HTTP_ACCEPT_LANGUAGE='en')
+        assert response.status_code == 200
+
+        dumps = self.get_dumps()
+        assert len(dumps) == 1
+        assert dumps[0].endswith('-dashboard.pstats')
+
+        stats = pstats.Stats(os.path.join(self.path, dumps[0]))
+        functions = {(os.path.basename(filename), name) for filename, _line, name in stats.stats}
+        assert ('middleware.py', 'process_request') in functions
+        assert ('views.py', 'home') not in functions, 'The view should not be profiled'
+
+    def test_sampling_and_threshold(self):
+        """
+        Only the sampled requests that are slower than the threshold should be kept.
+        """
+        profiler = SamplingProfiler(self.path, sample_rate=0.5, threshold=3600, max_files=10, max_bytes=10 ** 6)
+        request = RequestFactory().get('/dashboard/')
+        with patch('localizerx.profiling.random.random', return_value=0.7):
+            profiler.mark_request(request)
+        assert request._localizerx_profile is None  # pylint: disable=protected-access
+
+        request = RequestFactory().get('/dashboard/')
+        with patch('localizerx.profiling.random.random', return_value=0.3):
+            profiler.mark_request(request)
+        assert profiler.mark_response(request) is None, 'Faster than the threshold'
+
+    def test_short_circuited_request(self):
+        """
+        The profile should be kept if a middleware returned the response before the inner marker.
+        """
+        middleware = LocaleProfilingMiddleware()
+        middleware.profiler = SamplingProfiler(self.path, sample_rate=1, threshold=0, max_files=10, max_bytes=10 ** 6)
+        request = RequestFactory().get('/dashboard/')
+        middleware.process_request(request)
+        # Both markers get the response in the old-style `MIDDLEWARE_CLASSES`.
+        middleware.process_response(request, None)
+        middleware.process_response(request, None)
+        assert len(self.get_dumps()) == 1
+
+    @skipIf(sys.version_info[0] < 3, 'Asynchronous middleware is only supported on Python 3.')
+    def test_async_chain(self):
+        """
+        The requests shouldn't be sampled in an asynchronous chain, the profile would follow the event loop.
+        """
+        import asyncio
+        from localizerx.coroutines import mark_coroutine_function
+
+        loop = asyncio.new_event_loop()
+        response = HttpResponse()
+
+        def get_response(request):  # pylint: disable=unused-argument
+            """
+            Emulate an asynchronous `get_response` without the `async` syntax, which Python 2 can't parse.
+            """
+            future = loop.create_future()
+            future.set_result(response)
+            return future
+
+        env_tokens = {'LOCALIZERX_PROFILING_PATH': self.path, 'LOCALIZERX_PROFILING_SAMPLE_RATE': 1}
+        with override_settings(ENV_TOKENS=env_tokens):
+            middleware = LocaleProfilingMiddleware(get_response=mark_coroutine_function(get_response))
+            assert LocaleProfilingMiddleware().profiler is not None
+        assert middleware.is_async and middleware.profiler is None
+
+        request = RequestFactory().get('/dashboard/')
+        try:
+            assert loop.run_until_complete(middleware(request)) is response
+        finally:
+            loop.close()
+        assert not hasattr(request, '_localizerx_profile')
+
+    def test_rotation(self):
+        """
+        The oldest dumps should be removed to keep the number of files and the disk usage bounded.
+        """
+        os.makedirs(self.path)
+        for index in range(5):
+            dump_path = os.path.join(self.path, 'old-{index}.pstats'.format(index=index))
+            with open(dump_path, 'w') as dump_file:
+                dump_file.write('x' * 100)
+            os.utime(dump_path, (index, index))
+        with open(os.path.join(self.path, 'other.txt'), 'w') as other_file:
+            other_file.write('x' * 1000)
+
+        SamplingProfiler(self.path, sample_rate=1, threshold=0, max_files=4, max_bytes=10 ** 6).rotate()
+        assert self.get_dumps() == ['old-1.pstats', 'old-2.pstats', 'old-3.pstats', 'old-4.pstats', 'other.txt']
+
+        SamplingProfiler(self.path, sample_rate=1, threshold=0, max_files=4, max_bytes=250).rotate()
+        assert self.get_dumps() == ['old-3.pstats', 'old-4.pstats', 'other.txt']
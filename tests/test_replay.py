@@ -0,0 +1,178 @@
+"""
+Tests for the LocalizerX access log replay.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import gzip
+import io
+import os
+import re
+import shutil
+import tempfile
+
+import ddt
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from localizerx.replay import (BYPASSED, COMBINED_LOG_RE, OTHER, PASSTHROUGH, PATCHED, UNPARSED, count_outcomes,
+                               get_path_prefix, parse_lines)
+from localizerx.sites import get_snapshots_cache
+
+LOG_LINES = [
+    '127.0.0.1 - - [18/Oct/2026:10:00:00 +0000] "GET /dashboard HTTP/1.1" 200 512 "-" "Mozilla/5.0"\n',
+    '127.0.0.1 - - [18/Oct/2026:10:00:01 +0000] "GET /courses/course-v1%3AedX%2BDemoX/about?x=1 HTTP/1.1" 200 1 '
+    '"-" "Mozilla/5.0"\n',
+    '127.0.0.1 - - [18/Oct/2026:10:00:02 +0000] "GET /api/courses/v1/courses/ HTTP/1.1" 200 1 "-" "okhttp"\n',
+    '127.0.0.1 - - [18/Oct/2026:10:00:03 +0000] "GET /static/css/lms.css HTTP/1.1" 200 1 "-" "Mozilla/5.0"\n',
+    'garbage\n',
+]
+
+
+@ddt.ddt
+class ReplayTest(SimpleTestCase):
+    """
+    Tests for the replay pipeline.
+    """
+
+    @ddt.unpack
+    @ddt.data(
+        ('/courses/course-v1:edX+DemoX/about', 1, '/courses/'),
+        ('/courses/course-v1:edX+DemoX/about', 2, '/courses/course-v1:edX+DemoX/'),
+        ('/heartbeat', 1, '/heartbeat'),
+        ('/', 1, '/'),
+    )
+    def test_path_prefix(self, path, depth, prefix):
+        """
+        The requests should be grouped by the first segments of their path.
+        """
+        assert get_path_prefix(path, depth) == prefix
+
+    def test_parse_lines(self):
+        """
+        The path should be decoded without its query string, like `request.path`.
+        """
+        requests = list(parse_lines(LOG_LINES, re.compile(COMBINED_LOG_RE), 'a.example.com'))
+        assert requests[1] == ('a.example.com', '/courses/course-v1:edX+DemoX/about', '')
+        assert requests[-1] is None
+
+    def test_custom_format(self):
+        """
+        The host and the `Accept-Language` header can be parsed out of the lines with a custom format.
+        """
+        log_re = re.compile(r'^(?P<host>\S+) "(?P<accept_language>[^"]*)" (?P<path>\S+)')
+        requests = list(parse_lines(['b.example.com "ar" /dashboard\n'], log_re, 'a.example.com'))
+        assert requests == [('b.example.com', '/dashboard', 'ar')]
+
+    @override_settings(FEATURES={'ENABLE_LOCALIZERX': True})
+    def test_count_outcomes(self):
+        """
+        The requests should be counted per site, path prefix and outcome.
+        """
+        get_snapshots_cache().clear()
+        counts = count_outcomes(iter(LOG_LINES), COMBINED_LOG_RE, 'a.example.com', 1)
+        assert counts == {
+            ('a.example.com', '/dashboard', PATCHED): 1,
+            ('a.example.com', '/courses/', PATCHED): 1,
+            ('a.example.com', '/api/', PASSTHROUGH): 1,
+            ('a.example.com', '/static/', BYPASSED): 1,
+            (None, None, UNPARSED): 1,
+        }
+
+    @override_settings(FEATURES={'ENABLE_LOCALIZERX': True})
+    def test_max_groups(self):
+        """
+        The distinct sites and paths beyond `max_groups` should be counted together, however many there are.
+        """
+        get_snapshots_cache().clear()
+        lines = [
+            '127.0.0.1 - - [18/Oct/2026:10:00:00 +0000] "GET /{path} HTTP/1.1" 404 1 "-" "scanner"\n'.format(
+                path=path,
+            )
+            for path in ['dashboard', 'dashboard', 'wp-login.php', '.env', 'admin.php', 'dashboard']
+        ]
+        counts = count_outcomes(iter(lines), COMBINED_LOG_RE, 'A.example.com', 1, max_groups=2)
+        assert counts == {
+            ('a.example.com', '/dashboard', PATCHED): 3,
+            ('a.example.com', '/wp-login.php', PATCHED): 1,
+            (OTHER, OTHER, PATCHED): 2,
+        }
+
+
+class ReplayCommandTest(SimpleTestCase):
+    """
+    Tests for the `localizerx_replay_log` management command.
+    """
+
+    def setUp(self):
+        """
+        Write the log, both plain and compressed.
+        """
+        super(ReplayCommandTest, self).setUp()
+        get_snapshots_cache().clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.log_path = os.path.join(self.directory, 'access.log')
+        with io.open(self.log_path, 'w', encoding='utf-8') as log_file:
+            log_file.writelines(LOG_LINES)
+        self.gzip_path = os.path.join(self.directory, 'access.log.1.gz')
+        with gzip.open(self.gzip_path, 'wb') as log_file:
+            log_file.write(''.join(LOG_LINES).encode('utf-8'))
+
+    def replay(self, *args, **options):
+        """
+        Run the command and get its output rows.
+        """
+        stdout = io.StringIO()
+        call_command('localizerx_replay_log', *args, stdout=stdout, stderr=io.StringIO(), **options)
+        return [line.split() for line in stdout.getvalue().splitlines()]
+
+    def test_disabled(self):
+        """
+        The requests to a disabled site should be counted as such, unless the command simulates enabling it.
+        """
+        rows = self.replay(self.log_path, host='a.example.com')
+        assert rows[0] == ['site', 'prefix', 'patched', 'passthrough', 'bypassed', 'disabled', 'total']
+        assert rows[-1] == ['total', '0', '0', '1', '3', '4']
+
+        rows = self.replay(self.log_path, host='a.example.com', enable=True)
+        assert rows[-1] == ['total', '2', '1', '1', '0', '4']
+
+    def test_api_prefixes(self):
+        """
+        The command can simulate other API prefixes.
+        """
+        rows = self.replay(self.log_path, enable=True, api_prefixes=['/courses/'])
+        assert ['localhost', '/courses/', '0', '1', '0', '0', '1'] in rows
+        assert ['localhost', '/api/', '1', '0', '0', '0', '1'] in rows
+
+    def test_gzip_in_pool(self):
+        """
+        The compressed logs should be replayed the same, in a pool of processes as well.
+        """
+        rows = self.replay(self.log_path, self.gzip_path, enable=True, processes=2, chunk_size=2)
+        assert rows[-1] == ['total', '4', '2', '2', '0', '8']
+
+        rows = self.replay(self.log_path, self.gzip_path, enable=True, processes=2, chunk_size=2, max_groups=2)
+        assert len(rows) == 5, 'The header, 2 groups, the other group and the totals'
+        assert rows[-1] == ['total', '4', '2', '2', '0', '8']
+
+    @override_settings(MOCK_SITE_CONFIGURATIONS=[
+        {'SITE_NAME': 'a.example.com', 'ENABLE_LOCALIZERX': True},
+        {'SITE_NAME': 'b.example.com', 'ENABLE_LOCALIZERX': False},
+    ])
+    def test_site_snapshots(self):
+        """
+        The sites dumped by the `localizerx_warmup_sites` command should be replayed with their own configuration.
+        """
+        snapshots_path = os.path.join(self.directory, 'sites.json')
+        with override_settings(ENV_TOKENS={'LOCALIZERX_SITE_SNAPSHOTS_PATH': snapshots_path}):
+            call_command('localizerx_warmup_sites', stdout=io.StringIO())
+            log_path = os.path.join(self.directory, 'hosts.log')
+            with io.open(log_path, 'w', encoding='utf-8') as log_file:
+                log_file.write('a.example.com /dashboard\nb.example.com /dashboard\n')
+
+            rows = self.replay(log_path, log_format=r'^(?P<host>\S+) (?P<path>\S+)', enable=True)
+        assert ['a.example.com', '/dashboard', '1', '0', '0', '0', '1'] in rows
+        assert ['b.example.com', '/dashboard', '0', '0', '0', '1', '1'] in rows
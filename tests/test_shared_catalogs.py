@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the LocalizerX shared translation catalogs.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import os
+import shutil
+import tempfile
+
+from mock import patch
+
+from django.test import TestCase, override_settings
+from django.utils import translation
+from django.utils.translation import trans_real
+
+from localizerx.catalogs import warm_up_catalogs
+from localizerx.shared_catalogs import (MappedCatalog, SharedTranslation, get_catalog_path, load_shared_translation,
+                                        write_catalog)
+
+
+class SharedCatalogsTest(TestCase):
+    """
+    Tests for compiling and mapping the shared catalogs.
+    """
+
+    def setUp(self):
+        """
+        Start with an empty catalogs directory and no loaded catalogs.
+        """
+        super(SharedCatalogsTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        patcher = patch.dict(trans_real._translations, clear=True)  # pylint: disable=protected-access
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(translation.activate, 'eo')
+
+    def test_mapped_catalog(self):
+        """
+        The mapped catalog should behave like a read-only dict.
+        """
+        path = os.path.join(self.directory, 'test.lxcat')
+        messages = {
+            'Hello World!': 'Héllö Wörld!',
+            'menu\x04Open': 'Öpén',
+            ('%(count)d item', 0): '%(count)d ïtém',
+            ('%(count)d item', 1): '%(count)d ïtéms',
+        }
+        write_catalog(messages, path, {'plural_forms': 'nplurals=2; plural=(n != 1);'})
+
+        catalog = MappedCatalog(path)
+        assert dict(catalog.items()) == messages
+        assert set(catalog) == set(messages)
+        assert len(catalog) == 4
+        assert catalog['menu\x04Open'] == 'Öpén'
+        assert catalog[('%(count)d item', 1)] == '%(count)d ïtéms'
+        assert catalog.get('Goodbye') is None
+        assert 'Goodbye' not in catalog
+        with self.assertRaises(KeyError):
+            catalog['Hello World']  # pylint: disable=pointless-statement
+
+    @patch('localizerx.shared_catalogs.RECENT_MESSAGES_SIZE', 2)
+    def test_recent_messages_bounded(self):
+        """
+        Only a few recently looked up messages should be kept in the process memory.
+        """
+        path = os.path.join(self.directory, 'test.lxcat')
+        write_catalog({'a': 'A', 'b': 'B', 'c': 'C'}, path, {'plural_forms': 'nplurals=2; plural=(n != 1);'})
+
+        catalog = MappedCatalog(path)
+        assert [catalog.get(key) for key in 'abcab'] == ['A', 'B', 'C', 'A', 'B']
+        assert len(catalog._recent) <= 2  # pylint: disable=protected-access
+
+    def test_same_messages_as_django(self):
+        """
+        The shared translation should have the same messages as Django's, plurals included.
+        """
+        shared = load_shared_translation('ar', self.directory)
+        django_translation = trans_real.DjangoTranslation('ar')
+
+        # pylint: disable=protected-access
+        assert dict(shared._catalog.items()) == dict(django_translation._catalog.items())
+        for number in (0, 1, 2, 5, 11, 100):
+            assert shared.plural(number) == django_translation.plural(number)
+
+    def test_translation(self):
+        """
+        Django should translate with the installed shared translation, and fall back to the default language.
+        """
+        with override_settings(ENV_TOKENS={'LOCALIZERX_SHARED_CATALOGS_DIR': self.directory}):
+            warm_up_catalogs(['eo', 'ar'])
+
+            assert isinstance(trans_real.translation('ar'), SharedTranslation)
+            translation.activate('eo')
+            assert translation.gettext('Hello World!').startswith('Héllö Wörld!')
+            assert translation.get_language() == 'eo'
+
+            translation.activate('ar')
+            assert translation.gettext('Hello World!').startswith('Héllö Wörld!'), 'Falls back to the default language'
+            assert translation.ngettext('%(size)d byte', '%(size)d bytes', 1) != '%(size)d byte'
+            assert translation.get_language() == 'ar'
+
+    def test_compiled_once(self):
+        """
+        The catalog should only be compiled by the first process.
+        """
+        load_shared_translation('eo', self.directory)
+        with patch('localizerx.shared_catalogs.compile_catalog') as compile_catalog:
+            load_shared_translation('eo', self.directory)
+        assert not compile_catalog.called
+
+    def test_outdated_catalogs(self):
+        """
+        The catalogs of the previous releases should be removed after compiling a new one.
+        """
+        outdated_path = os.path.join(self.directory, 'eo-0123456789abcdef.lxcat')
+        write_catalog({}, outdated_path, {'plural_forms': 'nplurals=2; plural=(n != 1);'})
+        load_shared_translation('eo', self.directory)
+
+        assert not os.path.exists(outdated_path)
+        assert os.path.exists(get_catalog_path('eo', self.directory))
@@ -0,0 +1,113 @@
+"""
+Tests for the LocalizerX site snapshots warm-up.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from localizerx.generations import SITES_GENERATION, GenerationCounter
+from localizerx.site_warmup import (dump_site_snapshots, load_site_snapshots, read_site_snapshots,
+                                    warm_up_site_snapshots, write_site_snapshots)
+from localizerx.sites import get_snapshots_cache
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'localizerx-warmup-tests'},
+}
+
+
+@override_settings(
+    CACHES=CACHES,
+    LANGUAGE_CODE='eo',
+    FEATURES={'ENABLE_LOCALIZERX': False},
+    MOCK_SITE_CONFIGURATIONS=[
+        {'SITE_NAME': 'a.example.com', 'LANGUAGE_CODE': 'ar', 'ENABLE_LOCALIZERX': True},
+        {'SITE_NAME': 'b.example.com', 'LOCALIZERX_API_URL_PREFIXES': ['/reporting/api/']},
+    ],
+)
+class SiteWarmupTest(TestCase):
+    """
+    Tests for dumping and loading the site snapshots.
+    """
+
+    def setUp(self):
+        """
+        Start with empty caches, and write the files in a temporary directory.
+        """
+        super(SiteWarmupTest, self).setUp()
+        caches['shared'].clear()
+        get_snapshots_cache().clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'sites.json')
+
+    def test_dump_and_load(self):
+        """
+        The snapshots should be built out of the dumped values of each site.
+        """
+        data = dump_site_snapshots()
+        assert sorted(data['sites']) == ['a.example.com', 'b.example.com']
+
+        assert load_site_snapshots(data) == 2
+        first, second = get_snapshots_cache().get('a.example.com'), get_snapshots_cache().get('b.example.com')
+        assert first.enabled and first.language_code == 'ar'
+        assert not second.enabled, 'Falls back to the platform flag'
+        assert second.language_code == 'eo'
+        assert '/reporting/api/' in second.api_matcher
+
+    def test_file_and_cache(self):
+        """
+        The values should be read from the shared cache first, then from the file.
+        """
+        data = dump_site_snapshots()
+        write_site_snapshots(data, path=self.path, cache_alias='shared')
+        assert read_site_snapshots(self.path, 'shared') == data
+
+        caches['shared'].clear()
+        assert read_site_snapshots(self.path, 'shared') == data
+        assert read_site_snapshots(os.path.join(self.directory, 'missing.json')) is None
+
+    def test_outdated(self):
+        """
+        The values read before a site configuration was saved should be ignored.
+        """
+        with override_settings(ENV_TOKENS={'LOCALIZERX_GENERATION_CACHE': 'shared'}):
+            data = dump_site_snapshots()
+            GenerationCounter(SITES_GENERATION, 'shared', interval=0).bump()
+
+        with override_settings(ENV_TOKENS={'LOCALIZERX_GENERATION_CACHE': 'shared'}):
+            assert load_site_snapshots(data) == 0
+            assert load_site_snapshots(dump_site_snapshots()) == 2
+
+    def test_warm_up(self):
+        """
+        The workers should load the values written by the command, if they're configured.
+        """
+        assert warm_up_site_snapshots() == 0, 'Not configured'
+
+        with override_settings(ENV_TOKENS={'LOCALIZERX_SITE_SNAPSHOTS_PATH': self.path}):
+            assert warm_up_site_snapshots() == 0, 'Not written yet'
+
+            stdout = io.StringIO()
+            call_command('localizerx_warmup_sites', stdout=stdout)
+            assert 'values of 2 sites' in stdout.getvalue()
+
+            assert warm_up_site_snapshots() == 2
+            assert get_snapshots_cache().get('a.example.com').language_code == 'ar'
+
+    def test_command_destinations(self):
+        """
+        The command should write to the given cache, and needs a destination.
+        """
+        call_command('localizerx_warmup_sites', cache='shared', stdout=io.StringIO())
+        assert read_site_snapshots(cache_alias='shared')['sites']
+
+        with self.assertRaises(CommandError):
+            call_command('localizerx_warmup_sites', stdout=io.StringIO())
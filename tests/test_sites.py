@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the LocalizerX site snapshots.
+"""
+from __future__ import absolute_import, unicode_literals
+
+from mock import patch
+
+from django.conf import settings
+from django.db.models.signals import post_save
+from django.test import RequestFactory, TestCase, override_settings
+
+from localizerx.decisions import NEGOTIATED, SITE_LANGUAGE, decide_environ
+from localizerx.lru import LRUCache
+from localizerx.matchers import PASSTHROUGH
+from localizerx.middleware import DefaultLocaleMiddleware
+from localizerx.sites import (build_host_snapshot, get_host_sites, get_host_sites_cache, get_site_snapshot,
+                              get_snapshots_cache)
+from openedx.core.djangoapps.site_configuration import helpers as configuration_helpers
+from openedx.core.djangoapps.site_configuration.models import SiteConfiguration
+
+# pylint: disable=no-member
+
+
+class DummySite(object):
+    """
+    Minimal stand-in for `django.contrib.sites.models.Site`.
+    """
+
+    def __init__(self, domain):
+        self.domain = domain
+
+
+@override_settings(
+    LANGUAGE_CODE='eo',
+    FEATURES={'ENABLE_LOCALIZERX': True},
+    MOCK_SITE_CONFIGS={'LANGUAGE_CODE': 'ar'},
+)
+class SiteSnapshotTest(TestCase):
+    """
+    Tests for the `get_site_snapshot` helper.
+    """
+
+    def setUp(self):
+        """
+        Set up the request factory and clear the cached snapshots.
+        """
+        super(SiteSnapshotTest, self).setUp()
+        self.request_factory = RequestFactory()
+        get_snapshots_cache().clear()
+
+    def get_request(self, domain='a.example.com', path='/dashboard'):
+        """
+        Get a request for the given site.
+        """
+        request = self.request_factory.get(path, HTTP_ACCEPT_LANGUAGE='en')
+        request.site = DummySite(domain)
+        return request
+
+    def test_snapshot_values(self):
+        """
+        The snapshot should hold the resolved site configuration.
+        """
+        snapshot = get_site_snapshot(self.get_request())
+        assert snapshot.enabled
+        assert snapshot.language_code == 'ar'
+        assert '/api/' in snapshot.api_matcher
+        assert '/reporting/api/' not in snapshot.api_matcher
+
+    def test_resolved_once_per_site(self):
+        """
+        The site configuration should be resolved once per site, regardless of the number of requests.
+        """
+        middleware = DefaultLocaleMiddleware()
+        with patch.object(configuration_helpers, 'get_value', wraps=configuration_helpers.get_value) as get_value:
+            for _ in range(5):
+                middleware.process_request(self.get_request('a.example.com'))
+            calls_for_one_site = get_value.call_count
+
+            for _ in range(5):
+                middleware.process_request(self.get_request('b.example.com'))
+            assert get_value.call_count == 2 * calls_for_one_site
+
+    def test_invalidate_on_save(self):
+        """
+        Saving the site configuration should discard the site's snapshot.
+        """
+        request = self.get_request()
+        assert get_site_snapshot(request).language_code == 'ar'
+
+        with patch.dict(settings.MOCK_SITE_CONFIGS, {'LANGUAGE_CODE': 'en'}):
+            assert get_site_snapshot(request).language_code == 'ar', 'Should be served from the cache'
+
+            post_save.send(sender=SiteConfiguration, instance=SiteConfiguration(site=DummySite('a.example.com')))
+            assert get_site_snapshot(request).language_code == 'en'
+
+    @override_settings(ALLOWED_HOSTS=['example.com'])
+    def test_invalidate_host_with_port(self):
+        """
+        Saving the site configuration should discard the snapshots keyed by the site's host and port as well.
+        """
+        request = self.request_factory.get('/dashboard', HTTP_HOST='example.com:8000')
+        assert get_site_snapshot(request).language_code == 'ar'
+
+        with patch.dict(settings.MOCK_SITE_CONFIGS, {'LANGUAGE_CODE': 'en'}):
+            post_save.send(sender=SiteConfiguration, instance=SiteConfiguration(site=DummySite('example.com')))
+            assert get_site_snapshot(request).language_code == 'en'
+
+    @override_settings(MOCK_SITE_CONFIGS={'LOCALIZERX_API_URL_PREFIXES': ['/reporting/api/']})
+    def test_site_api_prefixes(self):
+        """
+        The site configuration can override the API prefixes.
+        """
+        snapshot = get_site_snapshot(self.get_request())
+        assert '/reporting/api/' in snapshot.api_matcher
+        assert '/api/' not in snapshot.api_matcher
+
+    @override_settings(
+        ENV_TOKENS={'LOCALIZERX_PATH_LANGUAGES': [['/es/', 'es']]},
+        MOCK_SITE_CONFIGS={'LOCALIZERX_API_URL_PREFIXES': ['/reporting/api/']},
+    )
+    def test_site_api_prefixes_in_path_rules(self):
+        """
+        The site's API prefixes should be passthrough after the platform's path rules.
+        """
+        path_rules = get_site_snapshot(self.get_request()).path_rules
+        assert path_rules.lookup('/es/') == 'es'
+        assert path_rules.lookup('/reporting/api/') == PASSTHROUGH
+        assert path_rules.lookup('/api/') is None
+
+    @override_settings(ENV_TOKENS={'LOCALIZERX_PATH_LANGUAGES': [['/es/', 'es']]})
+    def test_shared_path_rules(self):
+        """
+        The sites without their own rules should share the platform's compiled rules.
+        """
+        snapshot = get_site_snapshot(self.get_request('a.example.com'))
+        assert snapshot.path_rules is get_site_snapshot(self.get_request('b.example.com')).path_rules
+        assert snapshot.path_rules.lookup('/es/') == 'es'
+        assert snapshot.path_rules.lookup('/api/') == PASSTHROUGH
+
+    @override_settings(ENV_TOKENS={'LOCALIZERX_SITE_CACHE_SIZE': 2})
+    def test_bounded_cache(self):
+        """
+        The cache should not grow beyond the configured size.
+        """
+        for index in range(10):
+            get_site_snapshot(self.get_request('{index}.example.com'.format(index=index)))
+        assert len(get_snapshots_cache()) == 2
+
+
+@override_settings(
+    LANGUAGE_CODE='eo',
+    FEATURES={'ENABLE_LOCALIZERX': True},
+    MOCK_SITE_CONFIGS={
+        'LANGUAGE_CODE': 'ar',
+        'LOCALIZERX_PATH_LANGUAGES': [
+            ['/es/embed/', 'passthrough'],
+            ['/es/', 'es'],
+            ['^/courses/[^/]+/about', 'fr'],
+        ],
+    },
+)
+class PathLanguagesTest(TestCase):
+    """
+    Tests for the per-site `LOCALIZERX_PATH_LANGUAGES` rules.
+    """
+
+    def setUp(self):
+        """
+        Set up the request factory and clear the cached snapshots.
+        """
+        super(PathLanguagesTest, self).setUp()
+        self.request_factory = RequestFactory()
+        get_snapshots_cache().clear()
+
+    def process_request(self, path):
+        """
+        Process a request for the path through the `DefaultLocaleMiddleware`.
+        """
+        request = self.request_factory.get(path, HTTP_ACCEPT_LANGUAGE='en')
+        request.site = DummySite('a.example.com')
+        DefaultLocaleMiddleware().process_request(request)
+        return request
+
+    def test_path_language(self):
+        """
+        The rule's language should be enforced instead of the site language.
+        """
+        assert self.process_request('/es/dashboard').META['HTTP_ACCEPT_LANGUAGE'] == 'es'
+        assert self.process_request('/courses/course-v1:edX+DemoX+T1/about').META['HTTP_ACCEPT_LANGUAGE'] == 'fr'
+        assert self.process_request('/dashboard').META['HTTP_ACCEPT_LANGUAGE'] == 'ar'
+
+    def test_passthrough(self):
+        """
+        The passthrough paths should be left untouched, like the API endpoints.
+        """
+        for path in ('/es/embed/video', '/api/courses/'):
+            request = self.process_request(path)
+            assert request.META['HTTP_ACCEPT_LANGUAGE'] == 'en'
+            assert not hasattr(request, 'localizerx_language')
+
+    @override_settings(ENV_TOKENS={'LOCALIZERX_SUPPORTED_LANGUAGES': ['en', 'ar']})
+    def test_path_language_skips_negotiation(self):
+        """
+        The rule's language should be enforced even if the site negotiates the language with the browser.
+        """
+        assert self.process_request('/es/').META['HTTP_ACCEPT_LANGUAGE'] == 'es'
+        assert self.process_request('/dashboard').META['HTTP_ACCEPT_LANGUAGE'] == 'en'
+
+    @override_settings(MOCK_SITE_CONFIGS={
+        'LANGUAGE_CODE': 'ar',
+        'LOCALIZERX_PATH_LANGUAGES': [['^/(?P<lang>fr)/', 'fr'], ['^/(es', 'es'], ['/es/'], ['/fr/', 'fr']],
+        'LOCALIZERX_API_URL_PREFIXES': ['^/api/(', '/api/'],
+    })
+    def test_invalid_rules(self):
+        """
+        The invalid rules should be skipped instead of failing every request of the site.
+        """
+        assert self.process_request('/fr/').META['HTTP_ACCEPT_LANGUAGE'] == 'fr'
+        assert self.process_request('/es/').META['HTTP_ACCEPT_LANGUAGE'] == 'ar'
+        assert self.process_request('/api/courses/').META['HTTP_ACCEPT_LANGUAGE'] == 'en'
+
+
+@override_settings(
+    LANGUAGE_CODE='eo',
+    ALLOWED_HOSTS=['.example.com'],
+    FEATURES={'ENABLE_LOCALIZERX': False},
+    ENV_TOKENS={'LOCALIZERX_SITES_BY_HOST': True},
+    MOCK_SITE_CONFIGS={'LANGUAGE_CODE': 'fr'},
+    MOCK_SITE_CONFIGURATIONS=[
+        {'SITE_NAME': 'a.example.com', 'LANGUAGE_CODE': 'ar', 'ENABLE_LOCALIZERX': True},
+        {'SITE_NAME': 'b.example.com:8000', 'ENABLE_LOCALIZERX': True, 'LOCALIZERX_SUPPORTED_LANGUAGES': ['ar']},
+    ],
+)
+class SitesByHostTest(TestCase):
+    """
+    Tests for resolving the site snapshots by the request's host, with `LOCALIZERX_SITES_BY_HOST` enabled.
+    """
+
+    def setUp(self):
+        """
+        Clear the cached snapshots and sites.
+        """
+        super(SitesByHostTest, self).setUp()
+        get_snapshots_cache().clear()
+        get_host_sites_cache().clear()
+
+    def test_build_host_snapshot(self):
+        """
+        The hosts should be looked up with their port then without it, the unknown ones get the platform settings.
+        """
+        assert build_host_snapshot('a.example.com').language_code == 'ar'
+        assert build_host_snapshot('a.example.com:8000').language_code == 'ar'
+        assert build_host_snapshot('b.example.com:8000').supported_languages == ('ar',)
+
+        unknown = build_host_snapshot('c.example.com')
+        assert (unknown.enabled, unknown.language_code) == (False, 'eo'), 'Not the current site configuration'
+
+    def test_single_query(self):
+        """
+        All the sites should be read at once, until a site configuration is saved.
+        """
+        with patch.object(SiteConfiguration.objects, 'filter', wraps=SiteConfiguration.objects.filter) as query:
+            for host in ('a.example.com', 'b.example.com:8000', 'c.example.com'):
+                get_site_snapshot(RequestFactory().get('/dashboard', HTTP_HOST=host))
+            assert query.call_count == 1
+
+            post_save.send(sender=SiteConfiguration, instance=SiteConfiguration())
+            get_host_sites()
+            assert query.call_count == 2
+
+    def test_invalidate_renamed_site(self):
+        """
+        Saving a site configuration should discard the snapshots of all the hosts, e.g. the site's former domain.
+        """
+        request = RequestFactory().get('/dashboard', HTTP_HOST='a.example.com:8000')
+        assert get_site_snapshot(request).language_code == 'ar'
+
+        configurations = [{'SITE_NAME': 'z.example.com', 'LANGUAGE_CODE': 'ar'}]
+        with patch.object(settings, 'MOCK_SITE_CONFIGURATIONS', configurations):
+            post_save.send(sender=SiteConfiguration, instance=SiteConfiguration(site=DummySite('z.example.com')))
+            assert get_site_snapshot(request).language_code == 'eo'
+
+    def test_middleware_without_site(self):
+        """
+        The middleware should use the site of the request's host, without `request.site`.
+        """
+        request = RequestFactory().get('/dashboard', HTTP_HOST='a.example.com', HTTP_ACCEPT_LANGUAGE='en')
+        DefaultLocaleMiddleware().process_request(request)
+        assert request.META['HTTP_ACCEPT_LANGUAGE'] == 'ar'
+
+    def test_decide_environ(self):
+        """
+        The WSGI middleware should resolve the allowed hosts that aren't cached yet.
+        """
+        environ = RequestFactory().get('/dashboard', HTTP_HOST='b.example.com:8000', HTTP_ACCEPT_LANGUAGE='ar').environ
+        assert decide_environ(environ).reason == NEGOTIATED
+
+        environ = RequestFactory().get('/dashboard', HTTP_HOST='a.example.com').environ
+        assert decide_environ(environ).reason == SITE_LANGUAGE
+
+        environ = RequestFactory().get('/dashboard', HTTP_HOST='evil.com').environ
+        assert decide_environ(environ) is None
+        assert 'evil.com' not in get_snapshots_cache()
+
+
+class LRUCacheTest(TestCase):
+    """
+    Tests for the `LRUCache` class.
+    """
+
+    def test_eviction(self):
+        """
+        The least recently used entry should be evicted first.
+        """
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.get('a') == 1
+        cache.set('c', 3)
+
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert 'c' in cache
+
+    def test_ttl(self):
+        """
+        Expired entries should be treated as missing.
+        """
+        cache = LRUCache(maxsize=2, ttl=10)
+        with patch('localizerx.lru.default_timer', return_value=100):
+            cache.set('a', 1)
+        with patch('localizerx.lru.default_timer', return_value=105):
+            assert cache.get('a') == 1
+        with patch('localizerx.lru.default_timer', return_value=111):
+            assert cache.get('a', 'missing') == 'missing'
+            assert not cache
+
+    def test_pop_and_clear(self):
+        """
+        Entries can be removed individually or all at once.
+        """
+        cache = LRUCache()
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.keys() == ['a', 'b']
+        assert cache.pop('a') == 1
+        assert cache.pop('a') is None
+        cache.clear()
+        assert not cache
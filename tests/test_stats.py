@@ -0,0 +1,179 @@
+"""
+Tests for the LocalizerX language stats.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+
+import ddt
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory, TestCase, override_settings
+
+from localizerx.decisions import ENVIRON_DECISION_KEY, SITE_LANGUAGE, Decision
+from localizerx.middleware import DefaultLocaleMiddleware
+from localizerx.stats import (MAX_MEMOIZED_INDEXES, UNKNOWN_LANGUAGE, CountMinSketch, LanguageStats, get_language_stats,
+                              get_primary_tag, load_stats_file, write_stats_file)
+
+
+@ddt.ddt
+class LanguageStatsTest(TestCase):
+    """
+    Tests for the bounded-memory tallies.
+    """
+
+    @ddt.unpack
+    @ddt.data(
+        ('ar-SA,en;q=0.8', 'ar'),
+        ('EN;q=0.9', 'en'),
+        (' fr ,ar', 'fr'),
+        ('', UNKNOWN_LANGUAGE),
+        ('*', UNKNOWN_LANGUAGE),
+        ('abcdefghij', UNKNOWN_LANGUAGE),
+        ('x' * 100000, UNKNOWN_LANGUAGE),
+    )
+    def test_primary_tag(self, header, tag):
+        """
+        The browser language should be the primary subtag of the header's first entry.
+        """
+        assert get_primary_tag(header) == tag
+
+    def test_sketch_bounds(self):
+        """
+        The estimates should never be below the actual counts, and the memoized indexes should stay bounded.
+        """
+        sketch = CountMinSketch(width=64)
+        for index in range(5000):
+            sketch.add('key-{index}'.format(index=index % 500))
+        assert sketch.total == 5000
+        assert all(sketch.estimate('key-{index}'.format(index=index)) >= 10 for index in range(500))
+        assert len(sketch._indexes) <= MAX_MEMOIZED_INDEXES  # pylint: disable=protected-access
+
+    def test_heavy_hitters(self):
+        """
+        The most frequent tallies should be found among arbitrarily diverse keys, with a bounded memory.
+        """
+        stats = LanguageStats(None, interval=3600, capacity=4)
+        for index in range(10000):
+            stats.record('a.example.com', 'ar-SA,en', 'ar')
+            stats.record('site{index}.example.com'.format(index=index), 'ar', 'ar')
+        stats.record('b.example.com', 'fr', 'en')
+
+        site, browser_language, language, estimate = stats.top()[0]
+        assert (site, browser_language, language) == ('a.example.com', 'ar', 'ar')
+        assert 10000 <= estimate <= 10000 + 3 * stats.sketch.total // stats.sketch.width, 'Within the sketch error'
+        assert len(stats.heavy_hitters.estimates) <= 8
+
+    def test_merge(self):
+        """
+        The stats of the workers should be summed, including the candidates only one of them has.
+        """
+        first = LanguageStats(None, interval=3600, capacity=4)
+        second = LanguageStats(None, interval=3600, capacity=4)
+        for _index in range(3):
+            first.record('a.example.com', 'ar', 'ar')
+            second.record('a.example.com', 'ar', 'ar')
+        second.record('b.example.com', 'fr', 'en')
+
+        first.merge(LanguageStats.from_dict(second.to_dict()))
+        assert first.top() == [('a.example.com', 'ar', 'ar', 6), ('b.example.com', 'fr', 'en', 1)]
+        assert first.sketch.total == 7
+
+    def test_merge_different_widths(self):
+        """
+        Sketches of different widths can't be merged.
+        """
+        with self.assertRaises(ValueError):
+            LanguageStats(None, 0, 4).merge(LanguageStats(None, 0, 4, width=64))
+
+
+@override_settings(LANGUAGE_CODE='eo', FEATURES={'ENABLE_LOCALIZERX': True})
+class LanguageStatsMiddlewareTest(TestCase):
+    """
+    Tests for the `DefaultLocaleMiddleware` tallies and the merge command.
+    """
+
+    def setUp(self):
+        """
+        Write the stats files in a temporary directory.
+        """
+        super(LanguageStatsMiddlewareTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'stats-{pid}.json')
+
+    def test_disabled_by_default(self):
+        """
+        Nothing should be tallied unless `LOCALIZERX_LANGUAGE_STATS_PATH` is configured.
+        """
+        assert get_language_stats() is None
+        assert DefaultLocaleMiddleware().language_stats is None
+
+    def test_path_without_pid(self):
+        """
+        A path shared by all the workers should be reported, since they would overwrite each other's stats.
+        """
+        path = os.path.join(self.directory, 'stats.json')
+        with override_settings(ENV_TOKENS={'LOCALIZERX_LANGUAGE_STATS_PATH': path}):
+            with self.assertRaises(ImproperlyConfigured):
+                get_language_stats()
+            with self.assertRaises(ImproperlyConfigured):
+                DefaultLocaleMiddleware()
+
+    def test_middleware(self):
+        """
+        The middleware should tally the patched requests, with the browser language before the patch.
+        """
+        with override_settings(ENV_TOKENS={'LOCALIZERX_LANGUAGE_STATS_PATH': self.path}):
+            middleware = DefaultLocaleMiddleware()
+            middleware.process_request(RequestFactory().get('/dashboard', HTTP_ACCEPT_LANGUAGE='ar-SA,en'))
+            middleware.process_request(RequestFactory().get('/api/courses/', HTTP_ACCEPT_LANGUAGE='ar'))
+
+            request = RequestFactory().get('/dashboard', HTTP_ACCEPT_LANGUAGE='eo', _HTTP_ACCEPT_LANGUAGE='fr')
+            request.META[ENVIRON_DECISION_KEY] = Decision('eo', SITE_LANGUAGE, False, False)
+            middleware.process_request(request)
+
+            stats = get_language_stats()
+            assert stats.top() == [('testserver', 'ar', 'eo', 1), ('testserver', 'fr', 'eo', 1)]
+            stats.flush()
+
+        assert load_stats_file(self.path.format(pid=os.getpid())).top() == stats.top()
+
+    def test_merge_command(self):
+        """
+        The command should merge the files of the workers, and write the merged stats if asked to.
+        """
+        for index, browser_language in enumerate(['ar', 'fr', 'ar']):
+            stats = LanguageStats(None, interval=3600, capacity=4)
+            stats.record('a.example.com', browser_language, 'ar')
+            write_stats_file(stats, os.path.join(self.directory, 'worker-{index}.json'.format(index=index)))
+
+        output = os.path.join(self.directory, 'merged.json')
+        stdout = io.StringIO()
+        call_command(
+            'localizerx_merge_language_stats',
+            *[os.path.join(self.directory, 'worker-{index}.json'.format(index=index)) for index in range(3)],
+            output=output, stdout=stdout
+        )
+        rows = [line.split() for line in stdout.getvalue().splitlines()]
+        assert rows == [
+            ['site', 'browser', 'enforced', 'requests', 'share'],
+            ['a.example.com', 'ar', 'ar', '2', '66.7%'],
+            ['a.example.com', 'fr', 'ar', '1', '33.3%'],
+            ['total', '3'],
+        ]
+        assert load_stats_file(output).sketch.total == 3
+
+    def test_merge_command_invalid_file(self):
+        """
+        The files that aren't stats files should be reported.
+        """
+        path = os.path.join(self.directory, 'invalid.json')
+        with io.open(path, 'w', encoding='utf-8') as stats_file:
+            stats_file.write('{"version": 0}')
+        with self.assertRaises(CommandError):
+            call_command('localizerx_merge_language_stats', path, stdout=io.StringIO())
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the LocalizerX WSGI middleware.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import sys
+from wsgiref.util import setup_testing_defaults
+
+import ddt
+
+from django.core.handlers.wsgi import WSGIHandler, WSGIRequest
+from django.test import TestCase, override_settings
+
+from localizerx.decisions import BYPASS_DECISION, ENVIRON_DECISION_KEY, SITE_LANGUAGE, get_environ_path
+from localizerx.instrumentation import BYPASSED_REQUESTS, REGISTRY
+from localizerx.sites import get_host_snapshot, get_snapshots_cache
+from localizerx.wsgi import LocalizerXWSGIMiddleware
+
+
+def make_environ(path='/dashboard/', **extra):
+    """
+    Build a WSGI environ for the `127.0.0.1` host.
+    """
+    environ = dict(PATH_INFO=path, HTTP_ACCEPT_LANGUAGE='en', **extra)
+    setup_testing_defaults(environ)
+    return environ
+
+
+def dummy_application(environ, start_response):  # pylint: disable=unused-argument
+    """
+    Return the environ as is, so the tests can inspect it.
+    """
+    return environ
+
+
+@override_settings(
+    LANGUAGE_CODE='eo',
+    ALLOWED_HOSTS=['*'],
+    FEATURES={'ENABLE_LOCALIZERX': True},
+    MOCK_SITE_CONFIGS={'LANGUAGE_CODE': 'ar'},
+)
+class LocalizerXWSGIMiddlewareTest(TestCase):
+    """
+    Tests for the `LocalizerXWSGIMiddleware` class.
+    """
+
+    def setUp(self):
+        """
+        Wrap the dummy application, and clear the cached snapshots and counters.
+        """
+        super(LocalizerXWSGIMiddlewareTest, self).setUp()
+        self.middleware = LocalizerXWSGIMiddleware(dummy_application)
+        get_snapshots_cache().clear()
+        REGISTRY.clear()
+
+    def test_uncached_site(self):
+        """
+        The sites that aren't cached yet should be left to the `DefaultLocaleMiddleware`.
+        """
+        environ = self.middleware(make_environ(), None)
+        assert environ['HTTP_ACCEPT_LANGUAGE'] == 'en'
+        assert ENVIRON_DECISION_KEY not in environ
+        assert not get_snapshots_cache(), 'The site should not be resolved without a request'
+
+    def test_cached_site(self):
+        """
+        The environ should be patched with the cached site's language, and keep the browser's language.
+        """
+        get_host_snapshot('127.0.0.1')
+        environ = self.middleware(make_environ(), None)
+        assert environ['HTTP_ACCEPT_LANGUAGE'] == 'ar'
+        assert environ['_HTTP_ACCEPT_LANGUAGE'] == 'en'
+        assert environ[ENVIRON_DECISION_KEY].reason == SITE_LANGUAGE
+
+    def test_script_name(self):
+        """
+        The path rules should be matched against the full path, like Django's `request.path`.
+        """
+        get_host_snapshot('127.0.0.1')
+        environ = self.middleware(make_environ('/courses/', SCRIPT_NAME='/api'), None)
+        assert environ['HTTP_ACCEPT_LANGUAGE'] == 'en'
+
+    def test_bypassed(self):
+        """
+        The bypassed paths should be counted without looking the site up.
+        """
+        environ = self.middleware(make_environ('/static/css/lms.css'), None)
+        assert environ[ENVIRON_DECISION_KEY] is BYPASS_DECISION
+        assert environ['HTTP_ACCEPT_LANGUAGE'] == 'en'
+        assert REGISTRY.collect_counters()[BYPASSED_REQUESTS] == 1
+
+
+@override_settings(
+    LANGUAGE_CODE='eo',
+    ALLOWED_HOSTS=['*'],
+    FEATURES={'ENABLE_LOCALIZERX': True},
+)
+class WSGIStackTest(TestCase):
+    """
+    Tests for the `LocalizerXWSGIMiddleware` in front of the Django application and its `DefaultLocaleMiddleware`.
+    """
+
+    def setUp(self):
+        """
+        Wrap the Django application.
+        """
+        super(WSGIStackTest, self).setUp()
+        self.application = LocalizerXWSGIMiddleware(WSGIHandler())
+        get_snapshots_cache().clear()
+        REGISTRY.clear()
+
+    def get(self, path):
+        """
+        Get the path through the WSGI stack.
+
+        Return: The response status, headers dict and the environ.
+        """
+        environ = make_environ(path)
+        result = {}
+
+        def start_response(status, headers, exc_info=None):  # pylint: disable=unused-argument
+            """
+            Keep the response status and headers.
+            """
+            result.update(status=status, headers=dict(headers))
+
+        b''.join(self.application(environ, start_response))
+        return result['status'], result['headers'], environ
+
+    def test_same_as_django_middleware(self):
+        """
+        The responses should be the same whether the Django middleware or the WSGI middleware decides.
+        """
+        _status, first_headers, first_environ = self.get('/')
+        assert ENVIRON_DECISION_KEY not in first_environ, 'Decided by the Django middleware'
+
+        _status, headers, environ = self.get('/')
+        assert ENVIRON_DECISION_KEY in environ, 'Decided by the WSGI middleware'
+        assert environ['_HTTP_ACCEPT_LANGUAGE'] == 'en', 'The browser language should only be preserved once'
+        assert headers['Content-Language'] == first_headers['Content-Language'] == 'eo'
+        assert headers['Vary'] == first_headers['Vary']
+
+    def test_bypassed_counted_once(self):
+        """
+        The bypassed requests should be counted once, by the WSGI middleware.
+        """
+        self.get('/static/css/lms.css')
+        assert REGISTRY.collect_counters()[BYPASSED_REQUESTS] == 1
+
+
+@ddt.ddt
+class EnvironPathTest(TestCase):
+    """
+    Tests for the `get_environ_path` helper.
+    """
+
+    @ddt.data(
+        {'PATH_INFO': '/dashboard/'},
+        {'PATH_INFO': ''},
+        {'PATH_INFO': 'dashboard'},
+        {'PATH_INFO': '/courses/', 'SCRIPT_NAME': '/lms/'},
+        {'PATH_INFO': '/caf\xc3\xa9/'},
+        {'PATH_INFO': '/courses/', 'SCRIPT_NAME': '/lms', 'SCRIPT_URL': '/rewritten/courses/'},
+    )
+    def test_same_as_django(self, environ):
+        """
+        The path should be the same as Django's `request.path`.
+        """
+        if sys.version_info[0] < 3:
+            environ = {key: value.encode('latin-1') for key, value in environ.items()}
+        setup_testing_defaults(environ)
+        assert get_environ_path(environ) == WSGIRequest(environ).path
+
+    @override_settings(FORCE_SCRIPT_NAME='/lms')
+    def test_force_script_name(self):
+        """
+        The `FORCE_SCRIPT_NAME` setting should take precedence over the environ.
+        """
+        environ = {'PATH_INFO': str('/courses/')}
+        setup_testing_defaults(environ)
+        assert get_environ_path(environ) == WSGIRequest(environ).path == '/lms/courses/'
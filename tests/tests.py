@@ -4,15 +4,27 @@ Tests for LocalizerX.
 """
 from __future__ import absolute_import, unicode_literals
 
+import sys
+from unittest import skipIf
+
 import ddt
-from mock import patch
+from mock import Mock, patch
 
+import django
+from django.apps import apps
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
 from django.test import RequestFactory, TestCase, override_settings
+from django.utils import translation
 
-from localizerx.helpers import add_locale_middleware, is_api_request, is_feature_enabled
-from localizerx.middleware import DefaultLocaleMiddleware
+from localizerx.helpers import (add_locale_middleware, is_api_request, is_feature_enabled, negotiate_language,
+                                parse_accept_language, truncate_accept_language)
+from localizerx.instrumentation import BYPASSED_REQUESTS, REGISTRY
+from localizerx.middleware import (CachedDarkLangMiddleware, DefaultLocaleMiddleware, DirectLocaleMiddleware,
+                                   normalize_vary_header)
+from localizerx.preferences import PREFERENCE_COOKIE_NAME, sign_preference
+from localizerx.sites import get_host_snapshot, get_site_snapshot
 
 # The disable below because pylint is not recognizing request.META.
 # pylint: disable=no-member
@@ -101,6 +113,146 @@ class DefaultLocaleMiddlewareTest(TestCase):
         assert req.META['_HTTP_ACCEPT_LANGUAGE'] == 'en',  \
             'Should preserve the original language in another META variable.'
 
+    @override_settings(LANGUAGE_CODE='eo', FEATURES={'ENABLE_LOCALIZERX': True})
+    def test_new_style_middleware(self):
+        """
+        Test the middleware when it's instantiated with `get_response` by the `MIDDLEWARE` setting.
+        """
+        response = HttpResponse()
+        middleware = DefaultLocaleMiddleware(get_response=lambda request: response)
+
+        req = self.request_factory.get('/dummy/')
+        req.META['HTTP_ACCEPT_LANGUAGE'] = 'en'
+
+        assert middleware(req) is response
+        assert req.META['HTTP_ACCEPT_LANGUAGE'] == 'eo'
+        assert req.META['_HTTP_ACCEPT_LANGUAGE'] == 'en'
+
+    @skipIf(sys.version_info[0] < 3, 'Asynchronous middleware is only supported on Python 3.')
+    @override_settings(LANGUAGE_CODE='eo', FEATURES={'ENABLE_LOCALIZERX': True})
+    def test_async_middleware(self):
+        """
+        Test the middleware in an asynchronous middleware chain.
+        """
+        import asyncio
+        from localizerx.coroutines import is_coroutine_function, mark_coroutine_function
+
+        loop = asyncio.new_event_loop()
+        response = HttpResponse()
+
+        def get_response(request):  # pylint: disable=unused-argument
+            """
+            Emulate an asynchronous `get_response` without the `async` syntax, which Python 2 can't parse.
+            """
+            future = loop.create_future()
+            future.set_result(response)
+            return future
+
+        middleware = DefaultLocaleMiddleware(get_response=mark_coroutine_function(get_response))
+        assert is_coroutine_function(middleware), 'Django should recognize the middleware as asynchronous'
+
+        req = self.request_factory.get('/dummy/')
+        req.META['HTTP_ACCEPT_LANGUAGE'] = 'en'
+        get_site_snapshot(req)  # Warm the cache, so the middleware doesn't need a thread.
+
+        try:
+            assert loop.run_until_complete(middleware(req)) is response
+        finally:
+            loop.close()
+
+        assert req.META['HTTP_ACCEPT_LANGUAGE'] == 'eo'
+
+    @skipIf(sys.version_info[0] < 3, 'Asynchronous middleware is only supported on Python 3.')
+    @override_settings(
+        LANGUAGE_CODE='eo',
+        FEATURES={'ENABLE_LOCALIZERX': True},
+        ENV_TOKENS={
+            'LOCALIZERX_PREFERENCE_CACHE': True,
+            'LOCALIZERX_PREFERENCE_COOKIE': True,
+            'LOCALIZERX_CACHED_DARK_LANG': True,
+        },
+        MOCK_DARK_LANG_CONFIG={'enabled': True, 'released_languages': 'eo, ar'},
+        MOCK_USER_PREFERENCES={},
+    )
+    def test_async_middleware_blocking_work(self):
+        """
+        The work that may block the event loop should be done in a thread, and only that work.
+        """
+        import asyncio
+        import threading
+        from localizerx.coroutines import mark_coroutine_function
+
+        loop = asyncio.new_event_loop()
+        response = HttpResponse()
+
+        def get_response(request):  # pylint: disable=unused-argument
+            """
+            Emulate an asynchronous `get_response` without the `async` syntax, which Python 2 can't parse.
+            """
+            future = loop.create_future()
+            future.set_result(response)
+            return future
+
+        dark_lang_middleware = CachedDarkLangMiddleware(get_response=mark_coroutine_function(get_response))
+        middleware = DefaultLocaleMiddleware(get_response=dark_lang_middleware)
+        assert middleware.is_async and dark_lang_middleware.is_async
+
+        threads = {}
+
+        def record_thread(name, process):
+            """
+            Record the thread a middleware step runs in.
+            """
+            def wrapper(*args):
+                """
+                Call the middleware step.
+                """
+                threads[name] = threading.current_thread()
+                return process(*args)
+            return wrapper
+
+        for name, instance in (('localizerx', middleware), ('dark_lang', dark_lang_middleware)):
+            instance.process_request = record_thread(name + '.request', instance.process_request)
+            instance.process_response = record_thread(name + '.response', instance.process_response)
+
+        user = Mock(id=1, username='learner', is_authenticated=True)
+        try:
+            # Nothing is cached yet, and the user's preference cookie and preview language are read.
+            req = self.request_factory.get('/dummy/', HTTP_ACCEPT_LANGUAGE='en')
+            req.COOKIES[PREFERENCE_COOKIE_NAME] = sign_preference(user.id, 'ar')
+            req.user, req.session = user, {}
+            assert loop.run_until_complete(middleware(req)) is response
+            assert req.META['HTTP_ACCEPT_LANGUAGE'] == 'eo;q=1.0', 'Cleaned by the dark lang middleware'
+            assert threads['localizerx.request'] is not threading.current_thread()
+            assert threads['localizerx.response'] is not threading.current_thread()
+            assert threads['dark_lang.request'] is not threading.current_thread()
+
+            # An anonymous request is processed with the cached snapshots only.
+            threads.clear()
+            req = self.request_factory.get('/dummy/', HTTP_ACCEPT_LANGUAGE='en')
+            assert loop.run_until_complete(middleware(req)) is response
+            assert len(threads) == 4
+            assert all(thread is threading.current_thread() for thread in threads.values())
+        finally:
+            loop.close()
+
+    @skipIf(django.VERSION < (1, 10), 'The MIDDLEWARE setting was introduced in Django 1.10.')
+    @override_settings(
+        LANGUAGE_CODE='eo',
+        FEATURES={'ENABLE_LOCALIZERX': True},
+        MIDDLEWARE=[
+            'django.contrib.sites.middleware.CurrentSiteMiddleware',
+            LOCALIZERX_MIDDLEWARE,
+            'django.middleware.locale.LocaleMiddleware',
+        ],
+    )
+    def test_new_style_middleware_in_request(self):
+        """
+        Test the middleware within the new-style `MIDDLEWARE` setting.
+        """
+        res = self.client.get('/', HTTP_ACCEPT_LANGUAGE='en')
+        self.assertContains(res, 'Héllö Wörld')
+
     @ddt.data('/api/', '/user_api/')
     @override_settings(LANGUAGE_CODE='ar', FEATURES={'ENABLE_LOCALIZERX': True})
     def test_api_views(self, api_url):
@@ -178,6 +330,225 @@ class DefaultLocaleMiddlewareTest(TestCase):
             self.assertContains(res, data['expected'], msg_prefix=msg_prefix)
 
 
+@ddt.ddt
+@override_settings(
+    LANGUAGE_CODE='en',
+    FEATURES={'ENABLE_LOCALIZERX': True},
+    ENV_TOKENS={'LOCALIZERX_DIRECT_ACTIVATION': True},
+    MOCK_SITE_CONFIGS={'LANGUAGE_CODE': 'eo'},
+    MIDDLEWARE_CLASSES=add_locale_middleware(UNMODIFIED_MIDDLEWARE_CLASSES, direct_activation=True),
+)
+class DirectActivationTest(TestCase):
+    """
+    Tests for the direct translation activation mode.
+    """
+
+    def setUp(self):
+        """
+        Restore the active language after each test.
+        """
+        super(DirectActivationTest, self).setUp()
+        self.addCleanup(translation.activate, settings.LANGUAGE_CODE)
+        self.request_factory = RequestFactory()
+
+    def test_middleware_substitution(self):
+        """
+        The `DirectLocaleMiddleware` should take the place of Django's `LocaleMiddleware`.
+        """
+        updated_middlewares = add_locale_middleware(UNMODIFIED_MIDDLEWARE_CLASSES, direct_activation=True)
+        assert 'django.middleware.locale.LocaleMiddleware' not in updated_middlewares
+        assert updated_middlewares.index('localizerx.middleware.DirectLocaleMiddleware') == (
+            UNMODIFIED_MIDDLEWARE_CLASSES.index('django.middleware.locale.LocaleMiddleware') + 1
+        )
+
+    def test_activation(self):
+        """
+        The `DefaultLocaleMiddleware` should activate the site language.
+        """
+        req = self.request_factory.get('/dummy/', HTTP_ACCEPT_LANGUAGE='en')
+        DefaultLocaleMiddleware().process_request(req)
+
+        assert req.LANGUAGE_CODE == 'eo'
+        assert translation.get_language() == 'eo'
+        assert req.META['HTTP_ACCEPT_LANGUAGE'] == 'eo', 'The header should be patched for the other middlewares.'
+
+    @override_settings(MOCK_SITE_CONFIGS={'LANGUAGE_CODE': 'fr'})
+    def test_unavailable_language(self):
+        """
+        An unavailable site language should fall back to `settings.LANGUAGE_CODE` like the `LocaleMiddleware` does.
+        """
+        req = self.request_factory.get('/dummy/')
+        DefaultLocaleMiddleware().process_request(req)
+        assert req.LANGUAGE_CODE == 'en'
+
+    @override_settings(ENV_TOKENS={})
+    def test_disabled_by_default(self):
+        """
+        The `DefaultLocaleMiddleware` should leave the activation to the `LocaleMiddleware` by default.
+        """
+        req = self.request_factory.get('/dummy/')
+        DefaultLocaleMiddleware().process_request(req)
+        assert not hasattr(req, 'LANGUAGE_CODE')
+
+    @ddt.unpack
+    @ddt.data(
+        {'cookie': None, 'expected': 'eo'},
+        {'cookie': 'ar', 'expected': 'ar'},
+        {'cookie': 'fr', 'expected': 'eo'},
+    )
+    def test_user_language(self, cookie, expected):
+        """
+        The `DirectLocaleMiddleware` should respect the language the user has picked.
+        """
+        req = self.request_factory.get('/dummy/', HTTP_ACCEPT_LANGUAGE='en')
+        if cookie:
+            req.COOKIES[settings.LANGUAGE_COOKIE_NAME] = cookie
+
+        DefaultLocaleMiddleware().process_request(req)
+        with patch('django.utils.translation.get_language_from_request') as get_language_from_request:
+            DirectLocaleMiddleware().process_request(req)
+            assert not get_language_from_request.called, 'The headers should not be parsed again.'
+
+        assert req.LANGUAGE_CODE == expected
+        assert translation.get_language() == expected
+
+    def test_api_requests(self):
+        """
+        The API requests should get the regular `LocaleMiddleware` treatment.
+        """
+        req = self.request_factory.get('/api/', HTTP_ACCEPT_LANGUAGE='ar')
+        DefaultLocaleMiddleware().process_request(req)
+        DirectLocaleMiddleware().process_request(req)
+        assert req.LANGUAGE_CODE == 'ar'
+
+    def test_response_headers(self):
+        """
+        The responses should be translated with the same headers the `LocaleMiddleware` sets.
+        """
+        response = self.client.get('/', HTTP_ACCEPT_LANGUAGE='en')
+        self.assertContains(response, 'Héllö Wörld')
+        assert response['Content-Language'] == 'eo'
+        assert response['Vary'] == 'Accept-Language, Cookie'
+
+
+@ddt.ddt
+@override_settings(
+    LANGUAGE_CODE='eo',
+    FEATURES={'ENABLE_LOCALIZERX': True},
+    ENV_TOKENS={'LOCALIZERX_NORMALIZE_VARY': True},
+    MIDDLEWARE_CLASSES=add_locale_middleware(UNMODIFIED_MIDDLEWARE_CLASSES),
+)
+class VaryHeaderTest(TestCase):
+    """
+    Tests for the `Vary` header normalization.
+    """
+
+    @ddt.unpack
+    @ddt.data(
+        {'vary': None, 'expected': None},
+        {'vary': 'Accept-Encoding', 'expected': 'Accept-Encoding'},
+        {'vary': 'Accept-Language', 'expected': 'Cookie'},
+        {'vary': 'Accept-Encoding, accept-language', 'expected': 'Accept-Encoding, Cookie'},
+        {'vary': 'Cookie,Accept-Language', 'expected': 'Cookie'},
+    )
+    def test_normalize_vary_header(self, vary, expected):
+        """
+        `Accept-Language` should be replaced, the rest of the `Vary` header should be kept as is.
+        """
+        response = HttpResponse()
+        if vary:
+            response['Vary'] = vary
+
+        normalize_vary_header(response, ('Cookie',))
+        assert response.get('Vary') == expected
+
+    @ddt.unpack
+    @ddt.data(
+        {'path': '/', 'overrides': {}, 'varies_on_browser': False},
+        {'path': '/api/', 'overrides': {}, 'varies_on_browser': True},
+        {'path': '/', 'overrides': {'FEATURES': {}}, 'varies_on_browser': True},
+        {'path': '/', 'overrides': {'ENV_TOKENS': {'LOCALIZERX_NORMALIZE_VARY': False}}, 'varies_on_browser': True},
+        {'path': '/', 'overrides': {'ENV_TOKENS': {}}, 'varies_on_browser': True},  # Disabled by default.
+        {
+            'path': '/',
+            'overrides': {'MOCK_SITE_CONFIGS': {'LOCALIZERX_SUPPORTED_LANGUAGES': ['en', 'eo']}},
+            'varies_on_browser': True,
+        },
+    )
+    def test_vary_in_request(self, path, overrides, varies_on_browser):
+        """
+        Only the pages in the site language should stop varying on `Accept-Language`.
+        """
+        with override_settings(**overrides):
+            response = self.client.get(path, HTTP_ACCEPT_LANGUAGE='en')
+
+        vary_headers = response['Vary'].split(', ')
+        assert ('Accept-Language' in vary_headers) == varies_on_browser
+        assert 'Cookie' in vary_headers
+
+
+@ddt.ddt
+@override_settings(LANGUAGE_CODE='eo', FEATURES={'ENABLE_LOCALIZERX': True})
+class BypassTest(TestCase):
+    """
+    Tests for leaving the static files and health checks untouched.
+    """
+
+    def setUp(self):
+        """
+        Start counting the bypassed requests from zero.
+        """
+        super(BypassTest, self).setUp()
+        REGISTRY.clear()
+        self.addCleanup(REGISTRY.clear)
+        self.request_factory = RequestFactory()
+
+    @ddt.unpack
+    @ddt.data(
+        ('/static/css/lms-main.css', True),
+        ('/media/course_image.png', True),
+        ('/heartbeat', True),
+        ('/xblock/resource/problem/js/capa.js', True),
+        ('/assets/logo.png', True),
+        ('/dashboard/', False),
+        ('/courses/', False),
+    )
+    @override_settings(STATIC_URL='/assets/')
+    def test_bypassed(self, path, bypassed):
+        """
+        The default bypass list should cover the static and media files, the health checks and the XBlock resources.
+        """
+        request = self.request_factory.get(path, HTTP_ACCEPT_LANGUAGE='en')
+        with patch('localizerx.decisions.get_host_snapshot', wraps=get_host_snapshot) as get_snapshot:
+            DefaultLocaleMiddleware().process_request(request)
+
+        assert get_snapshot.called != bypassed, 'The site should not be looked up for the bypassed paths'
+        assert (request.META['HTTP_ACCEPT_LANGUAGE'] == 'en') == bypassed
+        assert REGISTRY.collect_counters().get(BYPASSED_REQUESTS, 0) == int(bypassed)
+
+    @override_settings(ENV_TOKENS={'LOCALIZERX_BYPASS_URL_PREFIXES': ['/custom/', '/courses/*/xblock/']})
+    def test_custom_bypass_list(self):
+        """
+        The bypass list should be configurable, with the same patterns as the API prefixes.
+        """
+        for path, bypassed in [('/custom/', True), ('/courses/x/xblock/y/', True), ('/static/', False)]:
+            request = self.request_factory.get(path, HTTP_ACCEPT_LANGUAGE='en')
+            DefaultLocaleMiddleware().process_request(request)
+            assert (request.META['HTTP_ACCEPT_LANGUAGE'] == 'en') == bypassed, path
+
+    def test_response_untouched(self):
+        """
+        The response of a bypassed request should be left untouched as well.
+        """
+        middleware = DefaultLocaleMiddleware()
+        request = self.request_factory.get('/static/app.js')
+        middleware.process_request(request)
+
+        response = HttpResponse()
+        response['Vary'] = 'Accept-Language'
+        assert middleware.process_response(request, response)['Vary'] == 'Accept-Language'
+
+
 @ddt.ddt
 class IsFeatureEnabledHelperTest(TestCase):
     """
@@ -245,10 +616,10 @@ class IsFeatureEnabledHelperTest(TestCase):
         Test different combinations of feature flags.
         """
         with patch(
-            target='localizerx.middleware.is_feature_enabled',
+            target='localizerx.sites.is_feature_enabled',
             return_value=data['is_feature_enabled'],
         ):
-            from localizerx.middleware import is_feature_enabled as patched_is_feature_enabled
+            from localizerx.sites import is_feature_enabled as patched_is_feature_enabled
             assert patched_is_feature_enabled() == data['is_feature_enabled']
             res = self.client.get('/', HTTP_ACCEPT_LANGUAGE='en')
 
@@ -305,6 +676,142 @@ class APIRequestHelperTest(TestCase):
         """
         assert is_api_request(self.request_factory.get(path)) == should_be_api
 
+    @override_settings(ENV_TOKENS={
+        'LOCALIZERX_API_URL_PREFIXES': [
+            '/api/',
+            '/courses/*/xblock/',
+            '^/oauth2/(access_token|revoke_token)',
+        ]
+    })
+    @ddt.unpack
+    @ddt.data(
+        {'path': '/courses/course-v1:edX+DemoX+T1/xblock/block-v1:edX/handler/', 'should_be_api': True},
+        {'path': '/courses/course-v1:edX+DemoX+T1/courseware/', 'should_be_api': False},
+        {'path': '/oauth2/access_token/', 'should_be_api': True},
+        {'path': '/oauth2/authorize/', 'should_be_api': False},
+    )
+    def test_endpoints_patterns(self, path, should_be_api):
+        """
+        Tests the `is_api_request` helper with wildcard and regular expression patterns.
+        """
+        assert is_api_request(self.request_factory.get(path)) == should_be_api
+
+
+@ddt.ddt
+class AcceptLanguageHelpersTest(TestCase):
+    """
+    Tests for the `Accept-Language` parsing and negotiation helpers.
+    """
+
+    @ddt.unpack
+    @ddt.data(
+        {'header': '', 'expected': []},
+        {'header': 'en', 'expected': [('en', 1.0)]},
+        {'header': 'en-US,en;q=0.9,ar;q=0.8', 'expected': [('en-us', 1.0), ('en', 0.9), ('ar', 0.8)]},
+        {'header': 'ar;q=0.5, fr ; q=0.7, de', 'expected': [('de', 1.0), ('fr', 0.7), ('ar', 0.5)]},
+        {'header': 'en;q=0.5,fr;q=0.5', 'expected': [('en', 0.5), ('fr', 0.5)]},
+        {'header': 'en;q=0,fr', 'expected': [('fr', 1.0)]},
+        {'header': 'en;q=abc,fr;q=2,de;level=1,*;q=0.1', 'expected': [('*', 0.1)]},
+        {'header': 'en_US,e n,12,ar', 'expected': [('ar', 1.0)]},
+    )
+    def test_parse_accept_language(self, header, expected):
+        """
+        The parser should order the languages by quality and skip the malformed entries.
+        """
+        assert parse_accept_language(header) == expected
+
+    @ddt.unpack
+    @ddt.data(
+        {'header': 'fr-FR,fr;q=0.9,ar;q=0.8', 'expected': 'ar', 'message': 'The best supported language'},
+        {'header': 'ar-SA', 'expected': 'ar', 'message': 'The generic language of a variant'},
+        {'header': 'pt', 'expected': 'pt-br', 'message': 'A supported variant of a generic language'},
+        {'header': 'EN', 'expected': 'en', 'message': 'Case insensitive'},
+        {'header': 'fr,de', 'expected': 'eo', 'message': 'The default if nothing is supported'},
+        {'header': '', 'expected': 'eo', 'message': 'The default if there is no header'},
+    )
+    def test_negotiate_language(self, header, expected, message):
+        """
+        The negotiation should pick the browser's most preferred supported language.
+        """
+        assert negotiate_language(header, ('en', 'ar', 'pt-br'), 'eo') == expected, message
+
+    def test_negotiation_cache(self):
+        """
+        Repeated headers should not be parsed again.
+        """
+        header = 'de-AT,de;q=0.9,en;q=0.8'
+        assert negotiate_language(header, ('en', 'ar'), 'ar') == 'en'
+
+        with patch('localizerx.helpers.parse_accept_language', wraps=parse_accept_language) as parse:
+            assert negotiate_language(header, ('en', 'ar'), 'ar') == 'en'
+            assert not parse.called
+
+            assert negotiate_language(header, ('de', 'ar'), 'ar') == 'de', 'Cached per supported languages'
+            assert parse.called
+
+    @ddt.unpack
+    @ddt.data(
+        {'header': 'en,ar', 'max_length': 5, 'expected': 'en,ar'},
+        {'header': 'en,ar,fr', 'max_length': 6, 'expected': 'en,ar'},
+        {'header': 'en,ar,fr', 'max_length': 5, 'expected': 'en,ar'},
+        {'header': 'en,ar,fr', 'max_length': 4, 'expected': 'en'},
+        {'header': 'en-US', 'max_length': 2, 'expected': ''},
+    )
+    def test_truncate_accept_language(self, header, max_length, expected):
+        """
+        The long headers should be cut after their last complete entry.
+        """
+        assert truncate_accept_language(header, max_length) == expected
+
+    @override_settings(ENV_TOKENS={
+        'LOCALIZERX_ACCEPT_LANGUAGE_MAX_LENGTH': 20,
+        'LOCALIZERX_ACCEPT_LANGUAGE_MAX_ENTRIES': 2,
+    })
+    def test_pathological_header(self):
+        """
+        Only the first entries of a pathologically long header should be parsed and negotiated.
+        """
+        assert parse_accept_language('fr,de,ar,en') == [('fr', 1.0), ('de', 1.0)]
+        assert parse_accept_language('fr;q=0.1,de;q=0.2,ar') == [('de', 0.2), ('fr', 0.1)], 'Truncated to 20 chars'
+        assert negotiate_language('fr,de,ar', ('ar', 'en'), 'en') == 'en', 'Beyond the maximum entries'
+
+        header = 'fr,' * 10000 + 'ar'
+        assert negotiate_language(header, ('ar', 'en'), 'en') == 'en'
+
+    @override_settings(
+        LANGUAGE_CODE='eo',
+        FEATURES={'ENABLE_LOCALIZERX': True},
+        ENV_TOKENS={'LOCALIZERX_ACCEPT_LANGUAGE_MAX_LENGTH': 5},
+    )
+    def test_middleware_preserves_truncated_header(self):
+        """
+        The middleware should only preserve the entries of the browser's header that fit in the maximum length.
+        """
+        req = RequestFactory().get('/dummy/', HTTP_ACCEPT_LANGUAGE='en,ar,fr')
+        DefaultLocaleMiddleware().process_request(req)
+        assert req.META['HTTP_ACCEPT_LANGUAGE'] == 'eo'
+        assert req.META['_HTTP_ACCEPT_LANGUAGE'] == 'en,ar'
+
+    @override_settings(
+        LANGUAGE_CODE='eo',
+        FEATURES={'ENABLE_LOCALIZERX': True},
+        MOCK_SITE_CONFIGS={'LOCALIZERX_SUPPORTED_LANGUAGES': ['en', 'ar']},
+    )
+    @ddt.unpack
+    @ddt.data(
+        {'browser_language': 'fr,ar;q=0.9,en;q=0.8', 'expected': 'ar'},
+        {'browser_language': 'fr', 'expected': 'eo'},
+    )
+    def test_middleware_negotiation(self, browser_language, expected):
+        """
+        The middleware should negotiate the language when the site declares its supported languages.
+        """
+        req = RequestFactory().get('/dummy/', HTTP_ACCEPT_LANGUAGE=browser_language)
+        DefaultLocaleMiddleware().process_request(req)
+
+        assert req.META['HTTP_ACCEPT_LANGUAGE'] == expected
+        assert req.META['_HTTP_ACCEPT_LANGUAGE'] == browser_language
+
 
 @ddt.ddt
 class MiddlewareAdderHelperTest(TestCase):
@@ -343,6 +850,18 @@ class MiddlewareAdderHelperTest(TestCase):
         with self.assertRaises(ValueError):
             add_locale_middleware(middleware_classes)
 
+    def test_sites_by_host_without_site_middleware(self):
+        """
+        The sites middleware isn't required when the sites are resolved by their host.
+        """
+        middleware_classes = tuple(
+            class_name for class_name in UNMODIFIED_MIDDLEWARE_CLASSES
+            if class_name != SITE_MIDDLEWARE
+        )
+
+        new_middleware_classes = add_locale_middleware(middleware_classes, sites_by_host=True)
+        assert 'localizerx.middleware.DefaultLocaleMiddleware' in new_middleware_classes
+
     def test_incorrect_site_middleware_location(self):
         """
         Ensure the helper complains about bizarre middleware configs.
@@ -386,6 +905,14 @@ class MiddlewareAdderHelperTest(TestCase):
         twice = add_locale_middleware(add_locale_middleware(UNMODIFIED_MIDDLEWARE_CLASSES))
         assert once == twice
 
+    @override_settings(MIDDLEWARE=UNMODIFIED_MIDDLEWARE_CLASSES)
+    def test_ready_new_style_middleware(self):
+        """
+        The app should patch the new-style `MIDDLEWARE` setting when it's used.
+        """
+        apps.get_app_config('localizerx').ready()
+        assert LOCALIZERX_MIDDLEWARE in settings.MIDDLEWARE
+
     @ddt.data(
         UNMODIFIED_MIDDLEWARE_CLASSES,
         tuple(UNMODIFIED_MIDDLEWARE_CLASSES),